@@ -1,10 +1,13 @@
 import streamlit as st
 import os
 import time
-from src.document_processor import DocumentProcessor
-from src.summarizer import Summarizer
+from config import Config
+from src.corpus_index import document_facets, get_corpus_index, saved_documents
+from src.document_processor import compute_pdf_hash
+from src.ingestion import IngestionPipeline
+from src.metrics import get_metrics
+from src.resources import get_answer_cache, get_document_processor, get_rag_chain, get_summarizer
 from src.vector_store import MultiVectorStore
-from src.rag_chain import SummarizedRAGChain
 from src.utils import *
 
 # Page configuration
@@ -282,8 +285,14 @@ def main():
             else:
                 st.session_state.current_pdf = uploaded_file.name
                 
+                # Optional metadata used to filter corpus-wide queries
+                student = st.text_input("Student (optional)")
+                year = st.text_input("Year (optional)")
+                
                 if st.button("Process Document", type="primary"):
-                    process_document(uploaded_file)
+                    with get_metrics().trace("ingest", document=uploaded_file.name) as run:
+                        process_document(uploaded_file, student=student or None, year=year or None)
+                    st.session_state.last_runs["ingest"] = run
         
         # Display system info
         if st.session_state.processed_docs:
@@ -293,6 +302,29 @@ def main():
                 store_info = st.session_state.vector_store.get_store_info()
                 st.write("**Vector Stores:**")
                 st.json(store_info)
+            
+            answer_cache = get_answer_cache(st.session_state.doc_hash)
+            if answer_cache:
+                st.write("**Answer Cache:**")
+                st.json(answer_cache.get_stats())
+        
+        # Corpus-wide queries over every processed document; the index itself loads on the first query
+        corpus_documents = saved_documents()
+        if corpus_documents:
+            st.header("Corpus")
+            st.caption(f"{len(corpus_documents)} documents indexed")
+            st.session_state.corpus_mode = st.checkbox("Search across all documents",
+                                                       value=st.session_state.corpus_mode)
+            if st.session_state.corpus_mode:
+                facets = document_facets(corpus_documents)
+                student = st.selectbox("Student", ["Any"] + facets["student"])
+                year = st.selectbox("Year", ["Any"] + facets["year"])
+                section = st.text_input("Section contains")
+                st.session_state.corpus_filters = {
+                    key: value for key, value in
+                    (("student", student), ("year", year), ("section", section))
+                    if value and value != "Any"
+                }
     
     # Main content area
     col1, col2 = st.columns([2, 1])
@@ -304,7 +336,7 @@ def main():
         display_chat_history()
         
         # Chat input
-        if st.session_state.processed_docs:
+        if st.session_state.processed_docs or st.session_state.corpus_mode:
             if question := st.chat_input("Ask a question about your document..."):
                 # Add user message to chat
                 user_message = format_chat_message("user", question)
@@ -319,26 +351,56 @@ def main():
                     </div>
                     """, unsafe_allow_html=True)
                 
-                # Generate assistant response
+                # Generate assistant response, rendering tokens as they stream in
                 with st.chat_message("assistant"):
-                    with st.spinner("🔍 Searching document..."):
-                        response = query_document(question)
+                    placeholder = st.empty()
+                    placeholder.markdown("🔍 Searching document...")
                     
-                    st.markdown(f"""
+                    answer = ""
+                    response = None
+                    with get_metrics().trace("query") as run:
+                        for event in stream_query_document(question):
+                            if event["type"] == "token":
+                                answer += event["content"]
+                                placeholder.markdown(f"""
+                                <div class="assistant-message">
+                                    <div class="message-sender">Assistant</div>
+                                    <div class="message-content">{answer}▌</div>
+                                </div>
+                                """, unsafe_allow_html=True)
+                            else:
+                                response = event
+                    st.session_state.last_runs["query"] = run
+                    
+                    placeholder.markdown(f"""
                     <div class="assistant-message">
                         <div class="message-sender">Assistant</div>
                         <div class="message-content">{response["answer"]}</div>
                     </div>
                     """, unsafe_allow_html=True)
                     
+                    if response.get("cached"):
+                        st.caption(f"Answered from cache in {response['total_seconds']:.2f}s")
+                    elif response.get("ttft_seconds") is not None:
+                        st.caption(f"First token in {response['ttft_seconds']:.2f}s · "
+                                   f"complete in {response['total_seconds']:.2f}s")
+                    
                     # Display sources if available
                     if response.get("sources"):
                         with st.expander("📚 View Sources"):
                             st.markdown('<div class="sources-expander">', unsafe_allow_html=True)
                             for i, source in enumerate(response["sources"]):
+                                origin = " · ".join(
+                                    str(part) for part in (
+                                        source.metadata.get("filename"),
+                                        source.metadata.get("section_path"),
+                                        f"p. {source.metadata['page_start']}" if "page_start" in source.metadata else None,
+                                    ) if part
+                                )
+                                header = f"Source {i+1} — {origin}" if origin else f"Source {i+1}"
                                 st.markdown(f"""
                                 <div class="source-item">
-                                    <div class="source-header">Source {i+1}</div>
+                                    <div class="source-header">{header}</div>
                                     <div class="source-content">
                                         {source.page_content[:500] + "..." if len(source.page_content) > 500 else source.page_content}
                                     </div>
@@ -378,59 +440,131 @@ def main():
             if st.button("Clear Chat History"):
                 st.session_state.chat_history = []
                 st.rerun()
+    
+    # Where the time went in this session's last runs; rendered last so it includes this run's query or ingest
+    if Config.METRICS_ENABLED:
+        with st.sidebar:
+            with st.expander("⏱️ Performance"):
+                display_metrics_panel(st.session_state.last_runs)
 
-def process_document(uploaded_file):
-    """Process the uploaded PDF document"""
+def process_document(uploaded_file, student: str = None, year: str = None):
+    """Process the uploaded PDF document and add it to the corpus"""
     try:
         with st.spinner("Processing document..."):
-            # Step 1: Document processing
-            doc_processor = DocumentProcessor()
-            chunks = doc_processor.process_pdf(uploaded_file)
-            
-            if not chunks:
-                st.error("No content extracted from PDF")
-                return
-            
-            # Step 2: Summarization
-            summarizer = Summarizer()
-            summarized_chunks = summarizer.create_summarized_chunks(chunks)
-            
-            # Step 3: Vector store initialization
             vector_store = MultiVectorStore()
             
-            # Create memory store with summarized chunks
-            memory_store = vector_store.create_memory_store(summarized_chunks, "summarized_chunks")
+            # Documents processed before (in any session) are reopened from disk
+            doc_hash = compute_pdf_hash(uploaded_file)
+            # Revised uploads of the same report sync into the same Chroma collection
+            collection_name = vector_store.chroma_collection_name(
+                "/".join(part for part in (student, uploaded_file.name) if part)
+            )
+            retriever = vector_store.load_document_index(doc_hash)
+            memory_stats = {}
             
-            # Also store original chunks in Chroma for reference
-            vector_store.add_to_chroma(chunks, "original_chunks")
+            if retriever is not None:
+                chunk_count = len(vector_store.docstore)
+                summary_count = vector_store.memory_store.index.ntotal
+            elif Config.STREAMING_INGESTION:
+                # Extraction, summarization and embedding overlap page batch by page batch
+                progress = st.empty()
+                pipeline = IngestionPipeline(get_document_processor(), get_summarizer(), vector_store)
+                uploaded_file.seek(0)
+                retriever = pipeline.run(
+                    uploaded_file,
+                    on_progress=lambda stats, _: progress.caption(
+                        f"Indexed {stats['chunks']} chunks ({stats['summaries']} summaries)..."
+                    )
+                )
+                progress.empty()
+                vector_store.save_document_index(doc_hash)
+                
+                chunk_count = pipeline.stats["chunks"]
+                summary_count = pipeline.stats["summaries"] + pipeline.stats.get("tree_nodes", 0)
+                memory_stats = pipeline.stats
+                
+                if Config.CHROMA_STORE_ORIGINALS:
+                    vector_store.add_to_chroma(
+                        [vector_store.docstore.get(i) for i in range(chunk_count)], collection_name
+                    )
+                    vector_store.persist_chroma()
+            else:
+                # Step 1: Document processing
+                doc_processor = get_document_processor()
+                chunks = doc_processor.process_pdf(uploaded_file, stats=memory_stats)
+                
+                if not chunks:
+                    st.error("No content extracted from PDF")
+                    return
+                
+                # Step 2: Summarization
+                summarizer = get_summarizer()
+                if Config.SUMMARY_TREE_ENABLED:
+                    # Chunk summaries plus the higher levels of the summary tree
+                    summarized_chunks = summarizer.summarize_chunks(chunks, vector_store.embedding_model)
+                else:
+                    summarized_chunks = summarizer.create_summarized_chunks(chunks)
+                
+                # Step 3: Summary vectors find the match, original chunks are returned for the answer
+                retriever = vector_store.create_multi_vector_retriever(summarized_chunks, chunks)
+                vector_store.save_document_index(doc_hash)
+                
+                # Optional durable copy of the originals in a per-document Chroma collection
+                if Config.CHROMA_STORE_ORIGINALS:
+                    vector_store.add_to_chroma(chunks, collection_name)
+                    vector_store.persist_chroma()
+                
+                chunk_count = len(chunks)
+                summary_count = len(summarized_chunks)
+            
+            # Documents stay queryable together with every other processed report
+            get_corpus_index().add_and_save(doc_hash, vector_store, filename=uploaded_file.name,
+                                            student=student, year=year)
             
             # Step 4: RAG chain setup
-            rag_system = SummarizedRAGChain()
-            qa_chain = rag_system.create_retrieval_chain(memory_store)
+            rag_system = get_rag_chain()
+            qa_chain = rag_system.create_retrieval_chain(retriever)
             
             # Store in session state
             st.session_state.vector_store = vector_store
             st.session_state.rag_chain = qa_chain
+            st.session_state.retriever = retriever
+            st.session_state.doc_hash = doc_hash
             st.session_state.processed_docs = True
             
-            st.success(f"✅ Successfully processed {len(chunks)} chunks with {len(summarized_chunks)} summaries")
+            st.success(f"✅ Successfully processed {chunk_count} chunks with {summary_count} summaries")
+            if memory_stats:
+                st.caption(f"{memory_stats['upload_mb']} MB upload: RSS {memory_stats['rss_before_mb']} MB → "
+                           f"peak {memory_stats['rss_peak_mb']} MB while processing → "
+                           f"{memory_stats['rss_after_mb']} MB")
             
     except Exception as e:
         st.error(f"Error processing document: {str(e)}")
 
-def query_document(question: str):
-    """Query the processed document"""
+def stream_query_document(question: str):
+    """Stream the answer for a question about the processed document or the whole corpus"""
+    if st.session_state.corpus_mode:
+        filters = st.session_state.corpus_filters
+        retriever = get_corpus_index().as_retriever(filters)
+        cache_id = "corpus:" + "&".join(f"{key}={value}" for key, value in sorted(filters.items()))
+    else:
+        retriever = st.session_state.retriever
+        cache_id = st.session_state.doc_hash
+    
+    if not retriever:
+        yield {"type": "done", "answer": "System not initialized. Please process a document first.", "sources": []}
+        return
+    
     try:
-        if not st.session_state.rag_chain:
-            return {"answer": "System not initialized. Please process a document first.", "sources": []}
-        
-        rag_system = SummarizedRAGChain()
-        response = rag_system.query_documents(question, st.session_state.rag_chain)
-        
-        return response
-        
+        rag_system = get_rag_chain()
+        answer_cache = get_answer_cache(cache_id)
+        for event in rag_system.stream_query(question, retriever, answer_cache):
+            if event["type"] == "done":
+                event["sources"] = event.get("source_documents", [])
+            yield event
+            
     except Exception as e:
-        return {"answer": f"Error querying document: {str(e)}", "sources": []}
+        yield {"type": "done", "answer": f"Error querying document: {str(e)}", "sources": []}
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""Run every pipeline stage in-process on synthetic PDFs against FakeChatGroq.
+
+Usage: python -m benchmarks.bench_end_to_end --pages 300 --documents 2 --queries 100 --output results.json
+       python -m benchmarks.bench_end_to_end --baseline results.json --tolerance 0.2
+
+Each document goes through extraction, chunking, summarization, the summary
+tree and indexing exactly as the app runs them, with the LLM replaced by a
+deterministic fake of fixed latency and token rate; queries then stream
+answers through SummarizedRAGChain. Per-stage wall time and peak RSS, LLM
+calls and tokens, embeddings per second and query latency percentiles are
+printed and written as JSON. With --baseline, stages and query p95 that got
+slower than the baseline by more than --tolerance fail the run; a baseline
+run with other settings (pages, documents, fake LLM latency, models...) is
+refused unless --ignore-settings is given.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+from config import Config
+from benchmarks.synthetic_pdf import WORDS, make_pdf
+from src.document_processor import DocumentProcessor
+from src.fakes import FakeChatGroq
+from src.rag_chain import SummarizedRAGChain
+from src.rate_limiter import RateLimiter
+from src.resource_usage import RSSSampler, peak_rss_bytes
+from src.summarizer import Summarizer
+from src.summary_tree import SummaryTreeBuilder
+from src.vector_store import MultiVectorStore
+
+class _TimedEmbeddings(Embeddings):
+    """Counts texts embedded and time spent embedding, for embeddings per second"""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.texts = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _timed(self, function, texts: int):
+        start = time.perf_counter()
+        result = function()
+        with self._lock:
+            self.seconds += time.perf_counter() - start
+            self.texts += texts
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._timed(lambda: self.embeddings.embed_documents(texts), len(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._timed(lambda: self.embeddings.embed_query(text), 1)
+
+    def __getattr__(self, name):
+        return getattr(self.embeddings, name)
+
+class _StageTimer:
+    """Wall time and the highest RSS sampled while each stage ran, over all its runs"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = defaultdict(lambda: {"seconds": 0.0, "peak_rss_mb": 0.0})
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        # Sampled rather than ru_maxrss, which stays at an earlier stage's peak once it was higher
+        sampler = RSSSampler()
+        try:
+            with sampler:
+                yield
+        finally:
+            row = self.stages[name]
+            row["seconds"] += time.perf_counter() - start
+            row["peak_rss_mb"] = max(row["peak_rss_mb"], round(sampler.peak / 2 ** 20, 1))
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+    }
+
+def make_questions(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    templates = ("What does the report say about {} and {}?", "How was the {} {} evaluated?",
+                 "Summarize the {} results for the {}.", "Which {} was used for {}?")
+    return [rng.choice(templates).format(rng.choice(WORDS), rng.choice(WORDS)) for _ in range(count)]
+
+def run(args) -> Dict[str, Any]:
+    Config.EMBEDDING_CACHE_ENABLED = args.embedding_cache
+    llm = FakeChatGroq(latency=args.latency, tokens_per_second=args.tokens_per_second)
+    summarizer = Summarizer(llm=llm, max_concurrency=args.concurrency,
+                            rate_limiter=RateLimiter(10 ** 6, 10 ** 9), use_cache=False)
+    chain = SummarizedRAGChain(llm=llm)
+    processor = DocumentProcessor(Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+    timer = _StageTimer()
+    embeddings = None
+    documents = []
+    retrievers = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for number in range(args.documents):
+            path = make_pdf(os.path.join(tmp, f"report-{number}.pdf"), args.pages, seed=number)
+            with timer.stage("extract"):
+                elements = processor.extract_text_from_pdf(path, workers=args.workers)
+            with timer.stage("chunk"):
+                chunks = processor.chunk_document(elements)
+            with timer.stage("summarize"):
+                summaries = summarizer.create_summarized_chunks(chunks)
+
+            vector_store = MultiVectorStore()
+            if embeddings is None:
+                embeddings = _TimedEmbeddings(vector_store.embedding_model)
+            vector_store.embedding_model = embeddings
+            with timer.stage("summary_tree"):
+                nodes = (SummaryTreeBuilder(summarizer, embeddings).build(summaries)
+                         if Config.SUMMARY_TREE_ENABLED else [])
+            with timer.stage("index"):
+                retrievers.append(vector_store.create_multi_vector_retriever(summaries + nodes, chunks))
+            documents.append({"pages": args.pages, "elements": len(elements), "chunks": len(chunks),
+                              "summaries": len(summaries), "tree_nodes": len(nodes)})
+            print(f"document {number + 1}/{args.documents}: {len(chunks)} chunks, "
+                  f"{len(summaries) + len(nodes)} summary vectors", flush=True)
+
+    ingest_llm = {"calls": llm.calls, "prompt_tokens": llm.prompt_tokens,
+                  "completion_tokens": llm.completion_tokens}
+    ingest_embeddings = {"texts": embeddings.texts, "seconds": embeddings.seconds}
+
+    retrieval_seconds, query_seconds, ttft_seconds = [], [], []
+    not_found = 0
+    with timer.stage("query"):
+        for i, question in enumerate(make_questions(args.queries)):
+            retriever = retrievers[i % len(retrievers)]
+            start = time.perf_counter()
+            retriever.get_relevant_documents(question)
+            retrieval_seconds.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            first_token = None
+            for event in chain.stream_query(question, retriever):
+                if event["type"] == "token" and first_token is None:
+                    first_token = time.perf_counter()
+                elif event["type"] == "done":
+                    if not event["success"]:
+                        raise RuntimeError(event["answer"])
+                    not_found += not event["source_documents"]
+            end = time.perf_counter()
+            query_seconds.append(end - start)
+            ttft_seconds.append((first_token or end) - start)
+
+    query_embeddings = embeddings.texts - ingest_embeddings["texts"]
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "settings": {**vars(args), "embedding_model": Config.EMBEDDING_MODEL, "chunk_size": Config.CHUNK_SIZE,
+                     "chunking_strategy": Config.CHUNKING_STRATEGY, "summary_batch_mode": Config.SUMMARY_BATCH_MODE,
+                     "summary_tree": Config.SUMMARY_TREE_ENABLED, "hybrid_retrieval": Config.HYBRID_RETRIEVAL,
+                     "faiss_index_type": Config.FAISS_INDEX_TYPE},
+        "documents": documents,
+        "stages": {name: {"seconds": round(row["seconds"], 3), "peak_rss_mb": row["peak_rss_mb"]}
+                   for name, row in timer.stages.items()},
+        "peak_rss_mb": round(peak_rss_bytes() / 2 ** 20, 1),
+        "llm": {
+            "ingest": ingest_llm,
+            "query": {"calls": llm.calls - ingest_llm["calls"],
+                      "prompt_tokens": llm.prompt_tokens - ingest_llm["prompt_tokens"],
+                      "completion_tokens": llm.completion_tokens - ingest_llm["completion_tokens"]},
+        },
+        "embeddings": {
+            "ingest_texts": ingest_embeddings["texts"],
+            "ingest_per_second": round(ingest_embeddings["texts"] / max(ingest_embeddings["seconds"], 1e-9), 1),
+            "query_texts": query_embeddings,
+            "query_per_second": round(query_embeddings / max(embeddings.seconds - ingest_embeddings["seconds"],
+                                                            1e-9), 1),
+        },
+        "queries": {
+            "not_found": not_found,
+            "retrieval": percentiles(retrieval_seconds),
+            "end_to_end": percentiles(query_seconds),
+            "time_to_first_token": percentiles(ttft_seconds),
+        },
+    }
+
+# Arguments that change how a run is reported, not what it measures
+REPORTING_ARGUMENTS = ("output", "baseline", "tolerance", "ignore_settings")
+
+def settings_mismatches(results: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Settings that differ from the baseline's, which makes their timings incomparable"""
+    current, previous = results["settings"], baseline.get("settings", {})
+    return [f"{key}: {previous.get(key)!r} -> {current.get(key)!r}"
+            for key in sorted(set(current) | set(previous))
+            if key not in REPORTING_ARGUMENTS and current.get(key) != previous.get(key)]
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Metrics slower than the baseline by more than `tolerance` (a fraction)"""
+    pairs = [(f"stage {name}", row["seconds"], baseline["stages"].get(name, {}).get("seconds"))
+             for name, row in results["stages"].items()]
+    for kind in ("retrieval", "end_to_end"):
+        pairs.append((f"query {kind} p95", results["queries"][kind].get("p95_ms"),
+                      baseline["queries"].get(kind, {}).get("p95_ms")))
+    regressions = []
+    for name, current, previous in pairs:
+        if current is None or not previous:
+            continue
+        change = current / previous - 1
+        marker = "  REGRESSION" if change > tolerance else ""
+        print(f"{name:<24} {previous:>10.3f} -> {current:>10.3f} {change:>+8.1%}{marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--documents", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake LLM seconds per request")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0, help="Fake LLM generation speed")
+    parser.add_argument("--concurrency", type=int, default=Config.SUMMARY_MAX_CONCURRENCY)
+    parser.add_argument("--workers", type=int, default=None, help="PDF extraction processes")
+    parser.add_argument("--embedding-cache", action="store_true",
+                        help="Use the persistent embedding cache (off, so repeated runs measure embedding)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before failing")
+    parser.add_argument("--ignore-settings", action="store_true",
+                        help="Compare against a baseline run with different settings anyway")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(f"\n{'stage':<14} {'seconds':>9} {'peak_rss_mb':>12}")
+    for name, row in results["stages"].items():
+        print(f"{name:<14} {row['seconds']:>9.3f} {row['peak_rss_mb']:>12.1f}")
+    for phase, usage in results["llm"].items():
+        print(f"LLM {phase}: {usage['calls']} calls, {usage['prompt_tokens']} prompt / "
+              f"{usage['completion_tokens']} completion tokens")
+    print(f"embeddings: {results['embeddings']['ingest_per_second']}/s ingest, "
+          f"{results['embeddings']['query_per_second']}/s query")
+    for kind in ("retrieval", "end_to_end", "time_to_first_token"):
+        row = results["queries"][kind]
+        if not row["count"]:
+            continue
+        print(f"{kind:<20} p50 {row['p50_ms']:>8.1f} ms  p95 {row['p95_ms']:>8.1f} ms  p99 {row['p99_ms']:>8.1f} ms")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        mismatches = settings_mismatches(results, baseline)
+        if mismatches:
+            print(f"baseline {args.baseline} was run with different settings:")
+            for mismatch in mismatches:
+                print(f"  {mismatch}")
+            if not args.ignore_settings:
+                print("not comparing; re-run with the baseline's settings or pass --ignore-settings")
+                return 2
+            print("comparing anyway (--ignore-settings)\n")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Time PDF extraction with different process-pool sizes.
+
+Usage: python -m benchmarks.bench_extraction --pages 400 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from config import Config
+from benchmarks.synthetic_pdf import make_pdf
+from src.document_processor import DocumentProcessor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--pdf", help="Use an existing PDF instead of a synthetic one")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--min-pages-per-worker", type=int, default=Config.PDF_MIN_PAGES_PER_WORKER)
+    args = parser.parse_args()
+    
+    Config.PDF_MIN_PAGES_PER_WORKER = args.min_pages_per_worker
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = args.pdf or make_pdf(os.path.join(tmp, "sample.pdf"), args.pages)
+        processor = DocumentProcessor()
+        
+        baseline = None
+        reference = None
+        print(f"{'workers':>7} {'elements':>9} {'seconds':>8} {'speedup':>8}")
+        for workers in args.workers:
+            start = time.perf_counter()
+            elements = processor.extract_text_from_pdf(pdf_path, workers=workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            
+            texts = [(elem['page_number'], elem['text']) for elem in elements]
+            if reference is None:
+                reference = texts
+            elif texts != reference:
+                print(f"warning: {workers} workers produced different elements")
+            print(f"{workers:>7} {len(elements):>9} {elapsed:>8.2f} {baseline / elapsed:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare FAISS index types: recall@k against flat search, QPS and bytes per vector.
+
+Usage: python -m benchmarks.bench_faiss_index --vectors 100000 --types flat hnsw ivf_sq8 ivf_pq
+"""
+import argparse
+import time
+import faiss
+import numpy as np
+from config import Config
+from src.faiss_index import INDEX_TYPES, build_index, bytes_per_vector, choose_index_type, index_type_of
+
+def make_vectors(count: int, dimension: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random topic centres, closer to real embeddings than pure noise"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension), dtype=np.float32)
+    vectors = centres[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dimension), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=list(INDEX_TYPES) + ["auto"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[Config.FAISS_IVF_NPROBE])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[Config.FAISS_HNSW_EF_SEARCH])
+    args = parser.parse_args()
+
+    data = make_vectors(args.vectors + args.queries, args.dimension, args.clusters)
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+    print(f"{args.vectors} vectors, {args.queries} queries, d={args.dimension}, "
+          f"auto choice: {choose_index_type(args.vectors)}")
+
+    exact = faiss.IndexFlatL2(args.dimension)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"{'type':>8} {'param':>12} {'build s':>8} {f'recall@{args.k}':>10} {'QPS':>9} {'bytes/vec':>10}")
+    for index_type in args.types:
+        start = time.perf_counter()
+        index = build_index(vectors, index_type)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+        size = bytes_per_vector(index)
+
+        if isinstance(index, faiss.IndexIVF):
+            settings = [("nprobe", value) for value in args.nprobe]
+        elif isinstance(index, faiss.IndexHNSW):
+            settings = [("efSearch", value) for value in args.ef_search]
+        else:
+            settings = [(None, None)]
+
+        for name, value in settings:
+            if name:
+                faiss.ParameterSpace().set_index_parameter(index, name, value)
+            start = time.perf_counter()
+            _, found = index.search(queries, args.k)
+            qps = len(queries) / (time.perf_counter() - start)
+            recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+            param = f"{name}={value}" if name else "-"
+            print(f"{index_type_of(index):>8} {param:>12} {build_seconds:>8.2f} {recall:>10.3f} "
+                  f"{qps:>9.0f} {size:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Time BM25 indexing and hybrid (BM25 + vector, RRF) queries at corpus scale.
+
+Usage: python -m benchmarks.bench_lexical --chunks 10000 100000 --queries 200
+"""
+import argparse
+import random
+import time
+import faiss
+import numpy as np
+from langchain.schema import Document
+from benchmarks.synthetic_pdf import WORDS
+from src.lexical_index import BM25Index
+from src.retrievers import ChunkDocStore, HybridRetriever
+
+class _VectorSearch:
+    """Flat inner-product search over random unit vectors, standing in for the summary index"""
+
+    def __init__(self, count: int, dimension: int, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        vectors = rng.standard_normal((count, dimension), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.index = faiss.IndexFlatIP(dimension)
+        self.index.add(vectors)
+        self.rng = rng
+        self.dimension = dimension
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs):
+        vector = self.rng.standard_normal((1, self.dimension), dtype=np.float32)
+        scores, ids = self.index.search(vector / np.linalg.norm(vector), k)
+        # Reported as squared L2 distances, like the langchain FAISS store
+        return [(Document(page_content="", metadata={"original_chunk_id": int(i)}), 2 - 2 * float(score))
+                for score, i in zip(scores[0], ids[0]) if i >= 0]
+
+def make_chunks(count: int, words_per_chunk: int, seed: int = 0):
+    rng = random.Random(seed)
+    # A long tail of rare identifiers (dataset names, figure/roll numbers) on top of common words
+    rare = [f"ds-{i}" for i in range(count // 10)] + [f"fig-{i}.{j}" for i in range(50) for j in range(20)]
+    chunks = []
+    for i in range(count):
+        words = [rng.choice(WORDS) for _ in range(words_per_chunk)]
+        words[rng.randrange(words_per_chunk)] = rng.choice(rare)
+        chunks.append(Document(page_content=" ".join(words), metadata={"chunk_id": i}))
+    return chunks, rare
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--words-per-chunk", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--dimension", type=int, default=384)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>7} {'postings':>9} {'index s':>8} {'compile s':>9} "
+          f"{'bm25 p50':>9} {'bm25 p95':>9} {'hybrid p50':>10} {'hybrid p95':>10} {'rare hit':>8}")
+    for count in args.chunks:
+        chunks, rare = make_chunks(count, args.words_per_chunk)
+        index = BM25Index()
+        start = time.perf_counter()
+        index.add_documents(chunks)
+        index_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        index._compile()
+        compile_seconds = time.perf_counter() - start
+
+        retriever = HybridRetriever(
+            vectorstore=_VectorSearch(count, args.dimension),
+            docstore=ChunkDocStore(chunks),
+            lexical_index=index,
+            search_kwargs={"k": args.k}
+        )
+        rng = random.Random(1)
+        queries = [f"{rng.choice(WORDS)} {rng.choice(rare)} {rng.choice(WORDS)}" for _ in range(args.queries)]
+
+        bm25_times, hybrid_times, rare_hits = [], [], 0
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, args.k)
+            bm25_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            results = retriever.get_relevant_documents(query)
+            hybrid_times.append(time.perf_counter() - start)
+            rare_hits += any(query.split()[1] in doc.page_content.split() for doc in results)
+
+        print(f"{count:>7} {index.get_stats()['postings']:>9} {index_seconds:>8.2f} {compile_seconds:>9.2f} "
+              f"{percentile(bm25_times, 50):>7.2f}ms {percentile(bm25_times, 95):>7.2f}ms "
+              f"{percentile(hybrid_times, 50):>8.2f}ms {percentile(hybrid_times, 95):>8.2f}ms "
+              f"{rare_hits / len(queries):>8.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Compare per-chunk and batched summarization against FakeChatGroq.
+
+Usage: python -m benchmarks.bench_summarization --chunks 200 --latency 0.3
+"""
+import argparse
+import random
+import time
+from langchain.schema import Document
+from src.fakes import FakeChatGroq
+from src.rate_limiter import RateLimiter
+from src.summarizer import Summarizer
+
+WORDS = (
+    "model data results method analysis training accuracy network students project "
+    "evaluation dataset experiment baseline report performance system design chapter"
+).split()
+
+def make_chunks(count: int, chunk_chars: int, seed: int = 0):
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(count):
+        words = []
+        while sum(len(w) + 1 for w in words) < chunk_chars:
+            words.append(rng.choice(WORDS))
+        chunks.append(Document(page_content=" ".join(words), metadata={"chunk_id": i}))
+    return chunks
+
+def run_mode(chunks, batch_mode: bool, args):
+    llm = FakeChatGroq(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                       malformed_rate=args.malformed_rate)
+    summarizer = Summarizer(
+        llm=llm,
+        max_concurrency=args.concurrency,
+        rate_limiter=RateLimiter(10 ** 6, 10 ** 9),
+        use_cache=False
+    )
+    start = time.perf_counter()
+    summaries = summarizer.create_summarized_chunks(chunks, batch_mode=batch_mode)
+    elapsed = time.perf_counter() - start
+    assert [d.metadata["original_chunk_id"] for d in summaries] == list(range(len(chunks)))
+    return {
+        "mode": "batched" if batch_mode else "per-chunk",
+        "requests": summarizer.usage["requests"],
+        "prompt_tokens": summarizer.usage["prompt_tokens"],
+        "completion_tokens": summarizer.usage["completion_tokens"],
+        "wall_seconds": round(elapsed, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+    
+    chunks = make_chunks(args.chunks, args.chunk_chars)
+    print(f"{'mode':<10} {'requests':>9} {'prompt_tok':>11} {'compl_tok':>10} {'wall_s':>8}")
+    for batch_mode in (False, True):
+        row = run_mode(chunks, batch_mode, args)
+        print(f"{row['mode']:<10} {row['requests']:>9} {row['prompt_tokens']:>11} "
+              f"{row['completion_tokens']:>10} {row['wall_seconds']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Write synthetic multi-page text PDFs without any PDF library."""
+import random
+from typing import List
+
+WORDS = (
+    "model data results method analysis training accuracy network students project "
+    "evaluation dataset experiment baseline report performance system design chapter "
+    "learning classification regression validation feature transformer attention loss"
+).split()
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def page_lines(page: int, rng: random.Random, lines_per_page: int = 45) -> List[str]:
+    lines = []
+    if page % 10 == 0:
+        lines.append(f"Chapter {page // 10 + 1} Experiments and Results")
+    lines.append(f"{page // 10 + 1}.{page % 10 + 1} Section on {rng.choice(WORDS)} {rng.choice(WORDS)}")
+    while len(lines) < lines_per_page:
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(12)) + ".")
+    return lines
+
+def make_pdf(path: str, pages: int, seed: int = 0) -> str:
+    """Write a `pages`-page PDF of pseudo-academic text to `path`"""
+    rng = random.Random(seed)
+    objects: List[bytes] = []
+    
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+    
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    content_ids = []
+    for page in range(pages):
+        ops = ["BT /F1 10 Tf 50 800 Td 16 TL"]
+        ops.extend(f"({_escape(line)}) Tj T*" for line in page_lines(page, rng))
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content_ids.append(add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+    
+    pages_id = len(objects) + pages + 1
+    page_ids = [
+        add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content_id, font_id))
+        for content_id in content_ids
+    ]
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref)
+    
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
@@ -7,21 +7,130 @@ class Config:
     # Groq API Configuration
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GROQ_MODEL = "llama-3.3-70b-versatile"  #"llama3-70b-8192"  # or "mixtral-8x7b-32768"
+    # "groq", or "fake" for a local stub LLM (API server, ingest.py, benchmarks)
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()
+    FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.2"))
+    FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "200"))
     
     # Embedding Configuration
     EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+    EMBEDDING_NORMALIZE = True
+    EMBEDDING_BATCH_SIZE = 32
+    EMBEDDING_MAX_BATCH_TEXTS = 256
+    EMBEDDING_MAX_WAIT_MS = 5
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_DIR = "./vector_stores/embedding_cache"
+    EMBEDDING_CACHE_CAPACITY = 100000
     
     # Vector Store Configuration
     CHROMA_PERSIST_DIR = "./vector_stores/chroma"
+    FAISS_INDEX_DIR = "./vector_stores/faiss"
+    # Multi-document corpus index queried across all processed reports
+    CORPUS_DIR = "./vector_stores/corpus"
+    # FAISS index type: auto, flat, hnsw, sq8, ivf, ivf_sq8 or ivf_pq
+    FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+    FAISS_AUTO_FLAT_MAX = 20000
+    FAISS_AUTO_SQ_MAX = 2000000
+    FAISS_IVF_NLIST = None  # None: ~4*sqrt(n)
+    FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+    FAISS_HNSW_M = 32
+    FAISS_HNSW_EF_CONSTRUCTION = 80
+    FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+    FAISS_PQ_M = None  # None: dimension / 4 sub-quantizers
+    FAISS_PQ_NBITS = 8
+    CHROMA_STORE_ORIGINALS = os.getenv("CHROMA_STORE_ORIGINALS", "false").lower() == "true"
+    CHROMA_BATCH_SIZE = 256
+    CHROMA_PERSIST_EVERY = 5000
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
+    # "structured" packs whole elements per section by tokens; "character" is the flat splitter
+    CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "structured")
+    CHUNK_TOKEN_BUDGET = 350
+    CHUNK_OVERLAP_TOKENS = 50
+    PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PDF_MIN_PAGES_PER_WORKER = 20
+    UPLOAD_SPILL_THRESHOLD_MB = 20
+    UPLOAD_SPILL_DIR = os.getenv("UPLOAD_SPILL_DIR")
+    
+    # Streaming Ingestion Configuration
+    STREAMING_INGESTION = os.getenv("STREAMING_INGESTION", "true").lower() == "true"
+    PIPELINE_PAGES_PER_BATCH = 10
+    PIPELINE_QUEUE_SIZE = 64
+    PIPELINE_GROUP_SIZE = 16
+    # Job queue of the headless batch ingestion CLI (ingest.py)
+    INGEST_QUEUE_PATH = "./vector_stores/ingest_jobs.sqlite3"
     
     # Summarization Configuration
     SUMMARY_LENGTH = 300
     SUMMARY_CHUNK_SIZE = 3000
+    SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+    TOKENIZER_ENCODING = "cl100k_base"
+    SUMMARY_BATCH_MODE = os.getenv("SUMMARY_BATCH_MODE", "false").lower() == "true"
+    SUMMARY_BATCH_TOKEN_BUDGET = 3000
+    SUMMARY_BATCH_MAX_CHUNKS = 8
+    SUMMARY_CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "true").lower() == "true"
+    SUMMARY_CACHE_PATH = "./vector_stores/summary_cache.sqlite3"
+    SUMMARY_CACHE_MAX_ENTRIES = 200000
+    # Hierarchical summary tree built over the chunk summaries; about one more
+    # LLM call per SUMMARY_TREE_CLUSTER_SIZE - 1 chunks, so opt-in
+    SUMMARY_TREE_ENABLED = os.getenv("SUMMARY_TREE_ENABLED", "false").lower() == "true"
+    SUMMARY_TREE_CLUSTER_SIZE = 8
+    SUMMARY_TREE_MAX_LEVELS = 4
+    
+    # LLM Rate Limiting Configuration
+    GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+    GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+    LLM_MAX_RETRIES = 5
+    LLM_RETRY_BASE_DELAY = 1.0
+    LLM_RETRY_MAX_DELAY = 30.0
     
     # Retrieval Configuration
     TOP_K_RETRIEVAL = 3
-    SIMILARITY_THRESHOLD = 0.7
+    # Cosine similarity a summary hit needs to be used as context at all. For
+    # all-mpnet-base-v2, relevant question/summary pairs mostly score 0.4-0.7
+    # and unrelated text 0.0-0.25, so 0.7 would reject most real matches
+    SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.3"))
+    # Hits this far below the best one are dropped (adaptive k)
+    SIMILARITY_DROP_OFF = 0.2
+    RETRIEVAL_CONTEXT_TOKEN_BUDGET = 1200
+    # Hybrid retrieval: BM25 over original chunks fused with summary vectors
+    HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+    HYBRID_DENSE_WEIGHT = 1.0
+    HYBRID_LEXICAL_WEIGHT = 1.0
+    HYBRID_RRF_K = 60
+    HYBRID_FETCH_K = 20
+    # BM25-only hits skip SIMILARITY_THRESHOLD when they reach this fraction of the best possible score
+    HYBRID_LEXICAL_MIN_SCORE = 0.3
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    # Optional cross-encoder re-ranking of a wider candidate set
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES = 30
+    RERANK_BATCH_SIZE = 8
+    RERANK_WORKERS = 2
+    RERANK_LATENCY_BUDGET_MS = 1500
+    RERANK_CACHE_MAX_ENTRIES = 20000
+    
+    # Answer Cache Configuration
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_MAX_ENTRIES = 256
+    ANSWER_CACHE_MAX_DOCUMENTS = 64
+    ANSWER_CACHE_TTL_SECONDS = 24 * 3600
+    ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.92
+    
+    # Metrics Configuration (stage timings, LLM/cache counters, latency histograms)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+    
+    # API Server Configuration (server.py)
+    SERVER_MAX_CONCURRENT_QUERIES = int(os.getenv("SERVER_MAX_CONCURRENT_QUERIES", "8"))
+    SERVER_MAX_QUEUED_QUERIES = int(os.getenv("SERVER_MAX_QUEUED_QUERIES", "32"))
+    SERVER_MAX_CONCURRENT_INGESTS = 1
+    SERVER_MAX_QUEUED_INGESTS = 4
+    SERVER_QUEUE_TIMEOUT_SECONDS = 30
+    SERVER_MAX_OPEN_DOCUMENTS = 32
+    # Larger PDF uploads are rejected with 413 before they are read into memory
+    SERVER_MAX_UPLOAD_MB = int(os.getenv("SERVER_MAX_UPLOAD_MB", "100"))
 
 config = Config()
\ No newline at end of file
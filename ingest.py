@@ -0,0 +1,151 @@
+"""Index a directory of PDFs without the UI.
+
+Usage: python ingest.py reports/ [--workers 4] [--metadata students.csv] [--student NAME --year 2024]
+
+PDFs are queued in a SQLite job queue, extracted and chunked in a process
+pool, then summarized, embedded and saved one document at a time through
+the same shared summarizer (and rate limiter) the app uses. Each finished
+document is saved under FAISS_INDEX_DIR by its content hash and added to
+the corpus, so the Streamlit app reopens it without re-processing.
+Interrupted runs resume where they stopped: re-run the same command. The
+summaries of an interrupted document are recovered from the summary cache,
+so this refuses to run with SUMMARY_CACHE_ENABLED=false.
+"""
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List
+from langchain.schema import Document
+from config import Config
+from src.corpus_index import get_corpus_index
+from src.document_processor import DocumentProcessor, compute_pdf_hash, process_pool_context
+from src.job_queue import JobQueue
+from src.resources import get_summarizer
+from src.summary_tree import SummaryTreeBuilder
+from src.vector_store import MultiVectorStore
+
+def extract_chunks(path: str) -> List[Document]:
+    """Runs in a pool worker: one document per process, so no nested pool"""
+    processor = DocumentProcessor()
+    elements = processor.extract_text_from_pdf(path, workers=1)
+    if not elements:
+        raise Exception("No text content found in PDF")
+    return processor.chunk_document(elements)
+
+def load_metadata(path: str) -> Dict[str, Dict[str, str]]:
+    """filename -> {student, year} from a CSV with filename, student and year columns"""
+    with open(path, newline="") as f:
+        return {row["filename"]: row for row in csv.DictReader(f)}
+
+def index_document(job: Dict[str, Any], chunks: List[Document], summarizer) -> Dict[str, Any]:
+    """Summarize, embed, save and add one document to the corpus"""
+    with open(job["path"], "rb") as f:
+        doc_hash = compute_pdf_hash(f)
+    vector_store = MultiVectorStore()
+    summaries_before = summarizer.usage["requests"]
+
+    if vector_store.load_document_index(doc_hash) is None:
+        # Summaries cached by an interrupted run are reused, not regenerated
+        summaries = summarizer.create_summarized_chunks(chunks)
+        if Config.SUMMARY_TREE_ENABLED:
+            summaries += SummaryTreeBuilder(summarizer, vector_store.embedding_model).build(summaries)
+        vector_store.create_multi_vector_retriever(summaries, chunks)
+        vector_store.save_document_index(doc_hash)
+
+    # Merged under the corpus lock, so documents saved meanwhile by the app or server are kept
+    get_corpus_index().add_and_save(doc_hash, vector_store, filename=os.path.basename(job["path"]),
+                                    student=job["student"], year=job["year"])
+    return {
+        "doc_hash": doc_hash,
+        "chunks": len(vector_store.docstore),
+        "summaries": vector_store.memory_store.index.ntotal,
+        "llm_requests": summarizer.usage["requests"] - summaries_before,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        epilog="Requires the summary cache (SUMMARY_CACHE_ENABLED=true): resumed jobs take the summaries of "
+               "chunks finished before the interruption from it instead of calling the LLM again."
+    )
+    parser.add_argument("paths", nargs="*", help="PDF files or directories (searched recursively)")
+    parser.add_argument("--workers", type=int, default=Config.PDF_EXTRACTION_WORKERS,
+                        help="Extraction processes")
+    parser.add_argument("--queue", default=Config.INGEST_QUEUE_PATH, help="Job queue database")
+    parser.add_argument("--metadata", help="CSV with filename, student and year columns")
+    parser.add_argument("--student", help="Student for every PDF given (overridden by --metadata)")
+    parser.add_argument("--year", help="Year for every PDF given (overridden by --metadata)")
+    parser.add_argument("--force", action="store_true", help="Requeue PDFs that were already processed")
+    parser.add_argument("--retry-failed", action="store_true", help="Requeue jobs that failed before")
+    args = parser.parse_args()
+    if not Config.SUMMARY_CACHE_ENABLED:
+        # Without it a resumed job would summarize every chunk again
+        parser.error("the summary cache is disabled (SUMMARY_CACHE_ENABLED=false); interrupted documents "
+                     "could not resume, enable it to run batch ingestion")
+
+    queue = JobQueue(args.queue)
+    metadata = load_metadata(args.metadata) if args.metadata else {}
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True)))
+        else:
+            files.append(path)
+    for path in files:
+        row = metadata.get(os.path.basename(path), {})
+        queue.enqueue(path, student=row.get("student") or args.student, year=row.get("year") or args.year,
+                      force=args.force)
+
+    recovered = queue.recover(retry_failed=args.retry_failed)
+    counts = queue.counts()
+    total = counts["pending"]
+    print(f"{total} to process ({counts['done']} already done, {recovered} resumed)", flush=True)
+
+    summarizer = get_summarizer()
+    start = time.perf_counter()
+    finished = chunk_total = 0
+    # Extraction runs ahead of summarization by at most `workers` documents
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=process_pool_context()) as executor:
+        in_flight = {}
+        while True:
+            while len(in_flight) < args.workers:
+                job = queue.claim()
+                if job is None:
+                    break
+                in_flight[executor.submit(extract_chunks, job["path"])] = job
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = in_flight.pop(future)
+                name = os.path.basename(job["path"])
+                job_start = time.perf_counter()
+                try:
+                    stats = index_document(job, future.result(), summarizer)
+                except Exception as e:
+                    queue.fail(job["id"], str(e))
+                    print(f"FAILED {name}: {e}", file=sys.stderr, flush=True)
+                    continue
+                seconds = time.perf_counter() - job_start
+                queue.complete(job["id"], stats["doc_hash"], stats["chunks"], stats["summaries"], seconds)
+
+                finished += 1
+                chunk_total += stats["chunks"]
+                elapsed = time.perf_counter() - start
+                print(f"[{finished}/{total}] {name}: {stats['chunks']} chunks, {stats['summaries']} vectors, "
+                      f"{stats['llm_requests']} LLM calls in {seconds:.1f}s | "
+                      f"{finished / elapsed * 60:.1f} docs/min, {chunk_total / elapsed:.1f} chunks/s", flush=True)
+
+    counts = queue.counts()
+    print(f"Done in {time.perf_counter() - start:.1f}s: {counts['done']} done, {counts['failed']} failed")
+    for failure in queue.failures():
+        print(f"  {failure['path']}: {failure['error']}")
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
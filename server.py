@@ -0,0 +1,340 @@
+"""Async HTTP API over the summarized RAG pipeline, alongside the Streamlit UI.
+
+Run: uvicorn server:app --port 8000
+     LLM_PROVIDER=fake uvicorn server:app   # offline, against a local stub LLM
+
+Endpoints:
+  GET  /health               liveness plus concurrency and cache state
+  GET  /documents            documents in the corpus
+  POST /documents            ingest a PDF (raw body up to SERVER_MAX_UPLOAD_MB, ?filename=&student=&year=)
+  POST /query                {"question", "doc_id"} or {"question", "filters"} -> answer JSON
+  POST /query/stream         same body, answer streamed as NDJSON events
+  GET  /metrics              Prometheus text (stage timings, LLM/cache counters, latencies)
+  GET  /metrics/json         the same metrics plus the last ingest breakdown as JSON
+
+Models, indexes and LLM clients are shared by every request in the process.
+Queries beyond SERVER_MAX_CONCURRENT_QUERIES wait in a bounded queue and
+get 503 + Retry-After once it is full, and identical questions asked while
+one is being answered share that single LLM call.
+"""
+import asyncio
+import io
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from config import Config
+from src.corpus_index import get_corpus_index, saved_documents
+from src.document_processor import compute_pdf_hash, is_pdf_hash
+from src.ingestion import IngestionPipeline
+from src.metrics import get_metrics
+from src.resources import get_answer_cache, get_document_processor, get_rag_chain, get_summarizer
+from src.vector_store import MultiVectorStore
+
+app = FastAPI(title="Academic RAG with Summarized Chain")
+
+class QueryRequest(BaseModel):
+    question: str
+    # One document by its content hash; without it the whole corpus is searched
+    doc_id: Optional[str] = None
+    filters: Optional[Dict[str, Any]] = None
+
+class ConcurrencyLimiter:
+    """At most `limit` requests run at once and at most `max_waiting` queue for a slot.
+
+    Requests beyond that, or that wait longer than `timeout`, are rejected
+    with 503 and Retry-After instead of piling up behind a slow LLM.
+    """
+
+    def __init__(self, limit: int, max_waiting: int, timeout: float):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.waiting = 0
+        self.active = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        raise HTTPException(status_code=503, detail=reason, headers={"Retry-After": "1"})
+
+    async def acquire(self):
+        if not self._semaphore.locked():
+            # A free slot is taken without suspending, so it never counts as waiting
+            await self._semaphore.acquire()
+            self.active += 1
+            return
+        if self.waiting >= self.max_waiting:
+            self._reject("Server busy, too many queued requests")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._reject("Server busy, timed out waiting for a slot")
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def get_stats(self):
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting, "rejected": self.rejected}
+
+class _SlotStreamingResponse(StreamingResponse):
+    """Releases a limiter slot once the response is over, however it ended.
+
+    Releasing from the body generator would leak the slot when the client
+    disconnects before the generator is first iterated: it never starts,
+    so its cleanup never runs.
+    """
+
+    def __init__(self, content, limiter: ConcurrencyLimiter, **kwargs):
+        super().__init__(content, **kwargs)
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+class _Flight:
+    """One answer being generated; every identical request replays and follows its events"""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.followers = 0
+        self._updated = asyncio.Event()
+
+    def publish(self, event: Dict[str, Any]):
+        # Called on the event loop thread only
+        self.events.append(event)
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[Dict[str, Any]]:
+        position = 0
+        while True:
+            updated = self._updated
+            if position == len(self.events):
+                await updated.wait()
+                continue
+            event = self.events[position]
+            position += 1
+            yield event
+            if event["type"] == "done":
+                return
+
+class _OpenDocuments:
+    """LRU of per-document retrievers loaded from their saved indexes"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._retrievers: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, doc_id: str, retriever):
+        with self._lock:
+            self._retrievers[doc_id] = retriever
+            self._retrievers.move_to_end(doc_id)
+            while len(self._retrievers) > self.capacity:
+                self._retrievers.popitem(last=False)
+
+    def get(self, doc_id: str):
+        with self._lock:
+            retriever = self._retrievers.get(doc_id)
+            if retriever is not None:
+                self._retrievers.move_to_end(doc_id)
+                return retriever
+        retriever = MultiVectorStore().load_document_index(doc_id)
+        if retriever is not None:
+            self.put(doc_id, retriever)
+        return retriever
+
+    def __len__(self) -> int:
+        return len(self._retrievers)
+
+query_limiter = ConcurrencyLimiter(Config.SERVER_MAX_CONCURRENT_QUERIES, Config.SERVER_MAX_QUEUED_QUERIES,
+                                   Config.SERVER_QUEUE_TIMEOUT_SECONDS)
+ingest_limiter = ConcurrencyLimiter(Config.SERVER_MAX_CONCURRENT_INGESTS, Config.SERVER_MAX_QUEUED_INGESTS,
+                                    Config.SERVER_QUEUE_TIMEOUT_SECONDS)
+open_documents = _OpenDocuments(Config.SERVER_MAX_OPEN_DOCUMENTS)
+_flights: Dict[tuple, _Flight] = {}
+single_flight_stats = {"leaders": 0, "followers": 0}
+
+def _serialize(event: Dict[str, Any]) -> Dict[str, Any]:
+    event = dict(event)
+    if "source_documents" in event:
+        event["sources"] = [{"content": doc.page_content, "metadata": doc.metadata}
+                            for doc in event.pop("source_documents")]
+    return event
+
+def _scope(request: QueryRequest):
+    """(answer cache id, retriever) for a single document or a filtered corpus query"""
+    if request.doc_id:
+        if not is_pdf_hash(request.doc_id):
+            raise HTTPException(status_code=404, detail=f"Unknown document {request.doc_id}")
+        retriever = open_documents.get(request.doc_id)
+        if retriever is None:
+            raise HTTPException(status_code=404, detail=f"Unknown document {request.doc_id}")
+        return request.doc_id, retriever
+    filters = request.filters or {}
+    scope = "corpus:" + "&".join(f"{key}={value}" for key, value in sorted(filters.items()))
+    return scope, get_corpus_index().as_retriever(filters)
+
+def _answer(flight: _Flight, loop: asyncio.AbstractEventLoop, request: QueryRequest):
+    """Runs in a worker thread: stream the answer into the flight"""
+    try:
+        scope, retriever = _scope(request)
+        events = get_rag_chain().stream_query(request.question, retriever, get_answer_cache(scope))
+        for event in events:
+            loop.call_soon_threadsafe(flight.publish, _serialize(event))
+    except HTTPException as e:
+        loop.call_soon_threadsafe(flight.publish, {"type": "done", "answer": e.detail, "sources": [],
+                                                   "success": False, "status_code": e.status_code})
+    except Exception as e:
+        loop.call_soon_threadsafe(flight.publish, {"type": "done", "answer": f"Error processing query: {e}",
+                                                   "sources": [], "success": False})
+
+async def _run_flight(key: tuple, flight: _Flight, request: QueryRequest):
+    try:
+        await asyncio.to_thread(_answer, flight, asyncio.get_running_loop(), request)
+    finally:
+        _flights.pop(key, None)
+
+def _join_flight(request: QueryRequest) -> Tuple[_Flight, bool]:
+    """(flight, joined an existing one) for this question and scope, starting one if there is none"""
+    question = " ".join(request.question.lower().split())
+    key = (request.doc_id, json.dumps(request.filters or {}, sort_keys=True, default=str), question)
+    flight = _flights.get(key)
+    if flight is not None:
+        flight.followers += 1
+        single_flight_stats["followers"] += 1
+        return flight, True
+    flight = _flights[key] = _Flight()
+    single_flight_stats["leaders"] += 1
+    # Not tied to the request: followers still get the answer if the leader disconnects
+    asyncio.get_running_loop().create_task(_run_flight(key, flight, request))
+    return flight, False
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "llm_provider": Config.LLM_PROVIDER,
+        "open_documents": len(open_documents),
+        "in_flight_questions": len(_flights),
+        "single_flight": single_flight_stats,
+        "queries": query_limiter.get_stats(),
+        "ingests": ingest_limiter.get_stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_prometheus():
+    return PlainTextResponse(get_metrics().to_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/json")
+async def metrics_json():
+    return get_metrics().snapshot()
+
+@app.get("/documents")
+def list_documents():
+    # Read from the saved registry in the threadpool: no corpus load, no blocked event loop
+    return {"documents": saved_documents()}
+
+def _ingest(data: bytes, filename: Optional[str], student: Optional[str], year: Optional[str]) -> Dict[str, Any]:
+    upload = io.BytesIO(data)
+    doc_hash = compute_pdf_hash(upload)
+    vector_store = MultiVectorStore()
+    retriever = vector_store.load_document_index(doc_hash)
+    cached = retriever is not None
+    memory = {}
+    if not cached:
+        pipeline = IngestionPipeline(get_document_processor(), get_summarizer(), vector_store)
+        retriever = pipeline.run(upload)
+        vector_store.save_document_index(doc_hash)
+        memory = {key: value for key, value in pipeline.stats.items() if key.startswith("rss_") or key == "upload_mb"}
+    open_documents.put(doc_hash, retriever)
+
+    get_corpus_index().add_and_save(doc_hash, vector_store, filename=filename, student=student, year=year)
+    return {
+        "doc_id": doc_hash,
+        "already_indexed": cached,
+        "chunks": len(vector_store.docstore),
+        "summary_vectors": vector_store.memory_store.index.ntotal,
+        # Upload size and sampled RSS of this ingest; empty when it was already indexed
+        "memory": memory,
+    }
+
+def _upload_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds {Config.SERVER_MAX_UPLOAD_MB} MB")
+
+async def _read_upload(request: Request) -> bytes:
+    """The request body, rejected as soon as it exceeds SERVER_MAX_UPLOAD_MB"""
+    limit = Config.SERVER_MAX_UPLOAD_MB * 2 ** 20
+    data = bytearray()
+    # Chunked uploads have no Content-Length, so the limit is checked while reading
+    async for chunk in request.stream():
+        data += chunk
+        if len(data) > limit:
+            raise _upload_too_large()
+    return bytes(data)
+
+@app.post("/documents")
+async def ingest_document(request: Request, filename: Optional[str] = None, student: Optional[str] = None,
+                          year: Optional[str] = None):
+    if int(request.headers.get("content-length") or 0) > Config.SERVER_MAX_UPLOAD_MB * 2 ** 20:
+        raise _upload_too_large()
+    # The body is read while holding the slot, so queued uploads are not all buffered at once
+    await ingest_limiter.acquire()
+    try:
+        data = await _read_upload(request)
+        if not data.startswith(b"%PDF"):
+            raise HTTPException(status_code=400, detail="Request body must be a PDF file")
+        # Ingests run one at a time by default, so the trace is this document's breakdown alone
+        with get_metrics().trace("ingest", document=filename):
+            return await asyncio.to_thread(_ingest, data, filename, student, year)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing document: {e}")
+    finally:
+        ingest_limiter.release()
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    await query_limiter.acquire()
+    try:
+        flight, shared = _join_flight(request)
+        async for event in flight.follow():
+            if event["type"] == "done":
+                if "status_code" in event:
+                    raise HTTPException(status_code=event["status_code"], detail=event["answer"])
+                response = {key: value for key, value in event.items() if key != "type"}
+                return {**response, "cached": response.get("cached", False), "shared": shared}
+    finally:
+        query_limiter.release()
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    # The slot is taken before responding so a full server answers 503, not an empty stream
+    await query_limiter.acquire()
+    try:
+        flight, shared = _join_flight(request)
+    except BaseException:
+        query_limiter.release()
+        raise
+
+    async def events():
+        async for event in flight.follow():
+            if event["type"] == "done":
+                event = {**event, "shared": shared}
+            yield json.dumps(event, default=str) + "\n"
+
+    return _SlotStreamingResponse(events(), query_limiter, media_type="application/x-ndjson")
@@ -0,0 +1,115 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from config import Config
+from src.metrics import get_metrics
+
+class _Entry:
+    def __init__(self, question: str, embedding: np.ndarray, chunk_ids: Tuple, response: Dict[str, Any]):
+        self.question = question
+        self.embedding = embedding
+        self.chunk_ids = chunk_ids
+        self.response = response
+        self.created_at = time.time()
+
+class AnswerCache:
+    """Answers to earlier questions about one document.
+
+    A lookup matches the normalized question exactly first, then by cosine
+    similarity of question embeddings. Either way the cached answer is only
+    returned if the current retrieval produced the same chunk ids, so a
+    similar-sounding question about different content is not answered from
+    cache. Entries are evicted LRU and expire after a TTL.
+    """
+
+    def __init__(self, embed_fn: Callable[[str], Sequence[float]], max_entries: int = None,
+                 ttl_seconds: float = None, similarity_threshold: float = None):
+        self.embed_fn = embed_fn
+        self.max_entries = max_entries or Config.ANSWER_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or Config.ANSWER_CACHE_TTL_SECONDS
+        self.similarity_threshold = similarity_threshold or Config.ANSWER_CACHE_SIMILARITY_THRESHOLD
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def normalize(question: str) -> str:
+        return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+    
+    @staticmethod
+    def chunk_ids_of(documents: List[Any]) -> Tuple:
+        return tuple(sorted(
+            f"{doc.metadata.get('doc_id', '')}:{doc.metadata.get('chunk_id', doc.metadata.get('node_id'))}"
+            for doc in documents
+        ))
+    
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embed_fn(self.normalize(question)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        for key in [k for k, entry in self._entries.items() if entry.created_at < cutoff]:
+            del self._entries[key]
+    
+    def lookup(self, question: str, chunk_ids: Tuple) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """Return (cached response or None, question embedding if one was computed)"""
+        key = self.normalize(question)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None and entry.chunk_ids == chunk_ids:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                get_metrics().inc("cache_hits_total", cache="answer")
+                return dict(entry.response), None
+            candidates = [(k, e) for k, e in self._entries.items() if e.chunk_ids == chunk_ids]
+        
+        if not candidates:
+            with self._lock:
+                self.misses += 1
+            get_metrics().inc("cache_misses_total", cache="answer")
+            return None, None
+        
+        embedding = self._embed(question)
+        similarities = np.stack([e.embedding for _, e in candidates]) @ embedding
+        best = int(np.argmax(similarities))
+        with self._lock:
+            if similarities[best] >= self.similarity_threshold:
+                best_key, best_entry = candidates[best]
+                if best_key in self._entries:
+                    self._entries.move_to_end(best_key)
+                self.semantic_hits += 1
+                get_metrics().inc("cache_hits_total", cache="answer")
+                return dict(best_entry.response), embedding
+            self.misses += 1
+        get_metrics().inc("cache_misses_total", cache="answer")
+        return None, embedding
+    
+    def store(self, question: str, chunk_ids: Tuple, response: Dict[str, Any], embedding: np.ndarray = None):
+        if embedding is None:
+            embedding = self._embed(question)
+        key = self.normalize(question)
+        with self._lock:
+            self._entries[key] = _Entry(question, embedding, chunk_ids, dict(response))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,98 @@
+import re
+from typing import Any, Dict, Iterable, Iterator, List
+from langchain.schema import Document
+from config import Config
+from src.tokens import count_tokens, split_by_tokens
+
+_NUMBERED_HEADING = re.compile(r"^(\d+(?:\.\d+)*)\.?\s+\S")
+_TOP_LEVEL_HEADING = re.compile(r"^(chapter|part|appendix)\b", re.IGNORECASE)
+
+class StructuredChunker:
+    """Pack extracted elements into token-budgeted chunks along section lines.
+
+    Title elements open a new section; a chunk never spans two sections,
+    and elements (paragraphs, list items, tables) are only split when a
+    single one exceeds the budget. Each chunk records its section path,
+    page range and token count.
+    """
+
+    def __init__(self, max_tokens: int = None, overlap_tokens: int = None):
+        self.max_tokens = max_tokens or Config.CHUNK_TOKEN_BUDGET
+        self.overlap_tokens = Config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    
+    @staticmethod
+    def heading_level(title: str, current_depth: int) -> int:
+        """Depth of a heading: "2.1 Methods" -> 2, "Chapter 3" -> 1"""
+        numbered = _NUMBERED_HEADING.match(title)
+        if numbered:
+            return numbered.group(1).count(".") + 1
+        if _TOP_LEVEL_HEADING.match(title):
+            return 1
+        # Unnumbered headings are treated as siblings of the current section
+        return max(1, current_depth)
+    
+    def _make_chunk(self, parts: List[Dict[str, Any]], path: List[str], chunk_id: int) -> Document:
+        metadata = {
+            "source": "pdf",
+            "chunk_id": chunk_id,
+            "section_path": " > ".join(path),
+            "token_count": sum(part["tokens"] for part in parts),
+        }
+        pages = [part["page_number"] for part in parts if part.get("page_number") is not None]
+        if pages:
+            metadata["page_start"] = min(pages)
+            metadata["page_end"] = max(pages)
+        return Document(page_content="\n\n".join(part["text"] for part in parts), metadata=metadata)
+    
+    def _overlap(self, parts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Trailing body elements that fit in the overlap budget"""
+        carried, used = [], 0
+        for part in reversed(parts):
+            if part["is_title"] or used + part["tokens"] > self.overlap_tokens:
+                break
+            carried.insert(0, part)
+            used += part["tokens"]
+        return carried
+    
+    def _pieces(self, elem: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        text = elem["text"]
+        tokens = count_tokens(text)
+        texts = [text] if tokens <= self.max_tokens else split_by_tokens(text, self.max_tokens)
+        for piece in texts:
+            yield {
+                "text": piece,
+                "tokens": tokens if len(texts) == 1 else count_tokens(piece),
+                "page_number": elem.get("page_number"),
+                "is_title": elem.get("type") == "Title",
+            }
+    
+    def iter_chunks(self, elements: Iterable[Dict[str, Any]]) -> Iterator[Document]:
+        """Chunk a stream of element dicts (as produced by extraction)"""
+        path: List[str] = []
+        parts: List[Dict[str, Any]] = []
+        used = 0
+        chunk_id = 0
+        
+        for elem in elements:
+            if elem.get("type") == "Title":
+                has_body = any(not part["is_title"] for part in parts)
+                if has_body:
+                    yield self._make_chunk(parts, path, chunk_id)
+                    chunk_id += 1
+                    parts, used = [], 0
+                level = self.heading_level(elem["text"], len(path))
+                path = path[:level - 1] + [elem["text"]]
+            
+            for piece in self._pieces(elem):
+                if parts and used + piece["tokens"] > self.max_tokens:
+                    yield self._make_chunk(parts, path, chunk_id)
+                    chunk_id += 1
+                    parts = self._overlap(parts)
+                    used = sum(part["tokens"] for part in parts)
+                    if used + piece["tokens"] > self.max_tokens:
+                        parts, used = [], 0
+                parts.append(piece)
+                used += piece["tokens"]
+        
+        if parts:
+            yield self._make_chunk(parts, path, chunk_id)
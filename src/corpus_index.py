@@ -0,0 +1,312 @@
+import json
+import os
+import pickle
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from langchain.schema import Document
+from config import Config
+from src.embedding_cache import get_cached_embeddings
+from src.faiss_index import apply_search_params, build_index, index_type_of, rebuild_for_size, search_parameters
+from src.metrics import timed
+from src.retrievers import CorpusDocStore, SummaryParentRetriever
+from src.vector_store import selection_settings
+from src.versioned_dir import current_version, locked, publish_version
+
+# Filters matched against the per-document registry; "section" is matched per vector
+DOCUMENT_FILTERS = ("doc_id", "filename", "student", "year")
+
+def document_facets(documents: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Distinct filter values present in a document registry"""
+    return {key: sorted({str(doc[key]) for doc in documents if doc.get(key) is not None})
+            for key in ("student", "year")}
+
+def saved_documents(directory: str = None) -> List[Dict[str, Any]]:
+    """Current documents of the saved corpus, read without loading its index or the embedding model"""
+    version = current_version(directory or Config.CORPUS_DIR)
+    if version is None:
+        return []
+    try:
+        with open(os.path.join(version, "documents.json")) as f:
+            return [doc for doc in json.load(f) if not doc.get("replaced_by")]
+    except OSError:
+        return []
+
+def _matches(value: Any, wanted: Any) -> bool:
+    if isinstance(wanted, (list, tuple, set)):
+        return any(_matches(value, w) for w in wanted)
+    return value is not None and str(value).strip().lower() == str(wanted).strip().lower()
+
+class CorpusIndex:
+    """Summary vectors of many documents in one FAISS index, searchable with pre-filters.
+
+    Each document's vectors are added as one contiguous id range, and the
+    document code and section of every vector are kept in flat arrays. A
+    filter (doc_id, filename, student, year, section) is turned into a
+    faiss IDSelector — an id range for a single document, a bitmap
+    otherwise — and applied inside the search, so filtered queries only
+    score the vectors they can return.
+
+    Several processes (the app, ingest.py, the API server) add to the same
+    saved corpus; `add_and_save` holds a file lock across reloading,
+    adding and saving, so none of them overwrites another's documents.
+
+    A revised upload has a new content hash and so is a new document. The
+    earlier revision with the same filename and student is marked
+    `replaced_by` it: its vectors stay in the index but are left out of
+    every search.
+    """
+
+    def __init__(self, directory: str = None, embeddings=None):
+        self.directory = directory or Config.CORPUS_DIR
+        self._embeddings = embeddings
+        self.index: Optional[faiss.Index] = None
+        self.documents: List[Dict[str, Any]] = []
+        self.summaries: List[Document] = []
+        self.parents = CorpusDocStore()
+        self._doc_positions: Dict[str, int] = {}
+        self._doc_codes = array("i")
+        self._section_codes = array("i")
+        self._section_names: List[str] = []
+        self._section_lookup: Dict[str, int] = {}
+        self._version: Optional[str] = None
+        self._lock = threading.RLock()
+
+    @property
+    def embeddings(self):
+        # Loaded on first add or search, not when only the registry is read
+        if self._embeddings is None:
+            self._embeddings = get_cached_embeddings()
+        return self._embeddings
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_positions
+
+    def is_current(self, doc_id: str) -> bool:
+        """In the corpus and not replaced by a later revision"""
+        code = self._doc_positions.get(doc_id)
+        return code is not None and not self.documents[code].get("replaced_by")
+
+    def _make_current(self, code: int) -> bool:
+        """Replace other revisions of document `code` with it; True if anything changed"""
+        doc = self.documents[code]
+        changed = doc.pop("replaced_by", None) is not None
+        if doc.get("filename") is None:
+            return changed
+        for other in self.documents:
+            if (other is not doc and not other.get("replaced_by") and other.get("filename") == doc["filename"]
+                    and other.get("student") == doc.get("student")):
+                other["replaced_by"] = doc["doc_id"]
+                changed = True
+        return changed
+
+    def _section_code(self, section: str) -> int:
+        code = self._section_lookup.get(section)
+        if code is None:
+            code = self._section_lookup[section] = len(self._section_names)
+            self._section_names.append(section)
+        return code
+
+    @timed("corpus_add")
+    def add_document(self, doc_id: str, summaries: List[Document], originals: List[Document],
+                     filename: str = None, student: str = None, year: Any = None) -> bool:
+        """Add one document's summary vectors and original chunks.
+
+        False if it is already in and current. Checked before embedding, so
+        reopening an indexed document costs no embedding calls.
+        """
+        with self._lock:
+            if doc_id in self._doc_positions:
+                # A re-uploaded earlier revision becomes the current one again
+                return self._make_current(self._doc_positions[doc_id])
+        attributes = {"doc_id": doc_id, "filename": filename, "student": student, "year": year}
+        stamp = {key: value for key, value in attributes.items() if value is not None}
+        summaries = [Document(page_content=d.page_content, metadata={**d.metadata, **stamp}) for d in summaries]
+        originals = [Document(page_content=d.page_content, metadata={**d.metadata, **stamp}) for d in originals]
+        vectors = np.asarray(self.embeddings.embed_documents([d.page_content for d in summaries]),
+                             dtype=np.float32)
+
+        with self._lock:
+            if doc_id in self._doc_positions:
+                return self._make_current(self._doc_positions[doc_id])
+            if self.index is None:
+                self.index = build_index(vectors)
+            start = self.index.ntotal
+            self.index.add(vectors)
+
+            code = len(self.documents)
+            self._doc_positions[doc_id] = code
+            self.documents.append({**attributes, "start": start, "end": self.index.ntotal,
+                                   "chunks": len(originals), "added_at": time.time()})
+            self.summaries.extend(summaries)
+            self.parents.add_document(doc_id, originals)
+            self._doc_codes.extend([code] * len(summaries))
+            self._section_codes.extend(self._section_code(d.metadata.get("section_path", "")) for d in summaries)
+            self._make_current(code)
+        return True
+
+    def add_from_store(self, doc_id: str, vector_store, **attributes) -> bool:
+        """Add a document from a MultiVectorStore built (or loaded) for it"""
+        store = vector_store.memory_store
+        summaries = [store.docstore.search(store.index_to_docstore_id[i]) for i in range(store.index.ntotal)]
+        return self.add_document(doc_id, summaries, vector_store.docstore.documents(), **attributes)
+
+    def add_and_save(self, doc_id: str, vector_store, **attributes) -> bool:
+        """Add a document from a MultiVectorStore and save, on top of what other processes saved"""
+        if self.is_current(doc_id):
+            # Reopened, not new: skip the file lock, the reload and the save
+            return False
+        with locked(self.directory):
+            self.reload_if_changed()
+            added = self.add_from_store(doc_id, vector_store, **attributes)
+            if added:
+                self.save()
+        return added
+
+    def _selector(self, filters: Dict[str, Any]) -> Tuple[Optional[faiss.IDSelector], Any, bool]:
+        """(selector, buffer to keep alive during the search, whether anything can match)"""
+        document_filters = {key: filters[key] for key in DOCUMENT_FILTERS if filters.get(key) not in (None, "")}
+        section = (filters.get("section") or "").strip().lower()
+        current = [code for code, doc in enumerate(self.documents) if not doc.get("replaced_by")]
+        if not document_filters and not section and len(current) == len(self.documents):
+            return None, None, True
+
+        codes = [code for code in current
+                 if all(_matches(self.documents[code].get(key), wanted) for key, wanted in document_filters.items())]
+        if not codes:
+            return None, None, False
+        if len(codes) == 1 and not section:
+            doc = self.documents[codes[0]]
+            selector = faiss.IDSelectorRange(doc["start"], doc["end"])
+            # Ids are added in increasing order, so IVF lists can be range-searched
+            selector.assume_sorted = True
+            return selector, None, True
+
+        mask = np.isin(np.frombuffer(self._doc_codes, dtype=np.int32), codes)
+        if section:
+            sections = [code for code, name in enumerate(self._section_names) if section in name.lower()]
+            mask &= np.isin(np.frombuffer(self._section_codes, dtype=np.int32), sections)
+        if not mask.any():
+            return None, None, False
+        bits = np.packbits(mask, bitorder="little")
+        return faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits)), bits, True
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Dict[str, Any] = None,
+                                     **kwargs) -> List[Tuple[Document, float]]:
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return []
+            selector, _keepalive, possible = self._selector(filter or {})
+            if not possible:
+                return []
+            distances, ids = self.index.search(vector, k, params=search_parameters(self.index, selector))
+            return [(self.summaries[i], float(d)) for d, i in zip(distances[0], ids[0]) if i >= 0]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Dict[str, Any] = None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def as_retriever(self, filters: Dict[str, Any] = None) -> SummaryParentRetriever:
+        search_kwargs = {"k": Config.TOP_K_RETRIEVAL}
+        if filters:
+            search_kwargs["filter"] = filters
+        return SummaryParentRetriever(
+            vectorstore=self,
+            docstore=self.parents,
+            search_kwargs=search_kwargs,
+            **selection_settings()
+        )
+
+    def facets(self) -> Dict[str, List[Any]]:
+        """Distinct filter values present in the corpus"""
+        return document_facets([doc for doc in self.documents if not doc.get("replaced_by")])
+
+    @timed("corpus_save")
+    def save(self):
+        """Write the corpus as a new version; use add_and_save when other processes may write too"""
+        with self._lock:
+            if self.index is None:
+                return
+            rebuilt = rebuild_for_size(self.index)
+            if rebuilt is not None:
+                self.index = rebuilt
+
+            tmp_dir = f"{self.directory}.tmp-{os.getpid()}-{time.time_ns()}"
+            os.makedirs(tmp_dir, exist_ok=True)
+            faiss.write_index(self.index, os.path.join(tmp_dir, "corpus.faiss"))
+            with open(os.path.join(tmp_dir, "corpus.pkl"), "wb") as f:
+                pickle.dump({
+                    "documents": self.documents,
+                    "summaries": self.summaries,
+                    "parents": self.parents,
+                    "doc_codes": self._doc_codes,
+                    "section_codes": self._section_codes,
+                    "section_names": self._section_names,
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(os.path.join(tmp_dir, "documents.json"), "w") as f:
+                json.dump(self.documents, f, default=str)
+            # Written last: its presence marks a complete corpus
+            with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+                json.dump({
+                    "embedding_model": Config.EMBEDDING_MODEL,
+                    "documents": len(self.documents),
+                    "summary_vectors": self.index.ntotal,
+                    "index_type": index_type_of(self.index),
+                    "saved_at": time.time(),
+                }, f)
+
+            self._version = os.path.realpath(publish_version(tmp_dir, self.directory))
+
+    def load(self) -> bool:
+        """Load the saved corpus; False if there is none for this embedding model"""
+        version = current_version(self.directory)
+        if version is None or not os.path.exists(os.path.join(version, "manifest.json")):
+            return False
+        with open(os.path.join(version, "manifest.json")) as f:
+            if json.load(f).get("embedding_model") != Config.EMBEDDING_MODEL:
+                return False
+
+        with self._lock:
+            self.index = apply_search_params(faiss.read_index(os.path.join(version, "corpus.faiss")))
+            with open(os.path.join(version, "corpus.pkl"), "rb") as f:
+                state = pickle.load(f)
+            self.documents = state["documents"]
+            self.summaries = state["summaries"]
+            self.parents = state["parents"]
+            self._doc_codes = state["doc_codes"]
+            self._section_codes = state["section_codes"]
+            self._section_names = state["section_names"]
+            self._section_lookup = {name: code for code, name in enumerate(self._section_names)}
+            self._doc_positions = {doc["doc_id"]: code for code, doc in enumerate(self.documents)}
+            self._version = version
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """Pick up documents another process (e.g. ingest.py) saved since we last loaded"""
+        version = current_version(self.directory)
+        if version is None or version == self._version:
+            return False
+        return self.load()
+
+    def get_stats(self):
+        return {
+            "documents": len(self.documents),
+            "summary_vectors": self.index.ntotal if self.index is not None else 0,
+            "original_chunks": len(self.parents),
+            "index_type": index_type_of(self.index) if self.index is not None else None,
+        }
+
+_shared_corpus: Optional[CorpusIndex] = None
+_shared_lock = threading.Lock()
+
+def get_corpus_index() -> CorpusIndex:
+    """The process-wide corpus, (re)loaded from disk when it changed there"""
+    global _shared_corpus
+    with _shared_lock:
+        if _shared_corpus is None:
+            _shared_corpus = CorpusIndex()
+        _shared_corpus.reload_if_changed()
+        return _shared_corpus
@@ -1,45 +1,258 @@
+import hashlib
+import io
+import multiprocessing
 import os
+import re
 import tempfile
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator
+from PyPDF2 import PdfReader, PdfWriter
 from unstructured.partition.pdf import partition_pdf
 # from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema import Document
+from config import Config
+from src.metrics import get_metrics, timed
+from src.chunking import StructuredChunker
+from src.resource_usage import RSSSampler
+
+def as_binary_file(pdf_file):
+    """The upload itself when it is a BytesIO, else a BytesIO over its bytes"""
+    if hasattr(pdf_file, "getbuffer"):
+        return pdf_file
+    return io.BytesIO(pdf_file.getvalue())
+
+def _spill_dir() -> str:
+    if Config.UPLOAD_SPILL_DIR:
+        return Config.UPLOAD_SPILL_DIR
+    # tmpfs keeps the spilled copy in RAM-backed pages instead of on disk
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+def process_pool_context():
+    """Start method for PDF extraction worker processes.
+
+    The app and the API server call this from threaded processes (Streamlit
+    sessions, the embedding service, uvicorn), and a forked child inherits
+    locks other threads held at the time. Workers are started from a clean
+    forkserver or spawned interpreter instead.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def compute_pdf_hash(pdf_file) -> str:
+    """SHA-256 of an uploaded or opened PDF, used as its document id"""
+    if hasattr(pdf_file, "getbuffer") or hasattr(pdf_file, "getvalue"):
+        # getbuffer() exposes BytesIO-backed uploads without copying them
+        data = pdf_file.getbuffer() if hasattr(pdf_file, "getbuffer") else pdf_file.getvalue()
+        return hashlib.sha256(data).hexdigest()
+    digest = hashlib.sha256()
+    for block in iter(lambda: pdf_file.read(2 ** 20), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+def is_pdf_hash(value) -> bool:
+    """Whether `value` has the form of a compute_pdf_hash id, and so is safe in a path"""
+    return isinstance(value, str) and re.fullmatch(r"[0-9a-f]{64}", value) is not None
+
+def _to_text_elements(elements, page_offset: int = 0) -> List[Dict[str, Any]]:
+    """Non-empty elements as dicts with absolute page numbers and stable ids"""
+    text_elements = []
+    position_on_page = {}
+    for element in elements:
+        if hasattr(element, 'text') and element.text.strip():
+            page_number = page_offset + (getattr(element.metadata, "page_number", None) or 1)
+            position = position_on_page.get(page_number, 0)
+            position_on_page[page_number] = position + 1
+            text_elements.append({
+                'element_id': f"p{page_number}-e{position}",
+                'text': element.text.strip(),
+                'type': type(element).__name__,
+                'page_number': page_number
+            })
+    return text_elements
+
+def _pages_as_pdf(reader: PdfReader, start: int, end: int) -> bytes:
+    """Pages [start, end) of an open PDF as a small PDF of their own"""
+    writer = PdfWriter()
+    for page in reader.pages[start:end]:
+        writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def _partition_page_pdf(data: bytes, start: int, end: int) -> List[Dict[str, Any]]:
+    """Partition a PDF made by _pages_as_pdf; also run in pool workers"""
+    try:
+        elements = partition_pdf(file=io.BytesIO(data), strategy="fast", extract_images=False)
+    except Exception as e:
+        raise Exception(f"Error extracting text from PDF pages {start + 1}-{end}: {str(e)}")
+    
+    return _to_text_elements(elements, page_offset=start)
+
+def _partition_pages(reader: PdfReader, start: int, end: int) -> List[Dict[str, Any]]:
+    """Partition pages [start, end) of an open PDF into element dicts"""
+    return _partition_page_pdf(_pages_as_pdf(reader, start, end), start, end)
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Process-pool worker: partition one page range of a PDF file"""
+    return _partition_pages(PdfReader(pdf_path), start, end)
+
+def _use_pool(page_count: int, workers: int) -> bool:
+    # Below this, starting worker processes costs more than partitioning in-process
+    return workers > 1 and page_count > Config.PDF_MIN_PAGES_PER_WORKER
+
+def _page_ranges(page_count: int, workers: int, min_pages: int) -> List[tuple]:
+    pages_per_range = max(min_pages, -(-page_count // max(1, workers)))
+    return [(start, min(start + pages_per_range, page_count)) for start in range(0, page_count, pages_per_range)]
 
 class DocumentProcessor:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, chunking_strategy: str = None):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.chunking_strategy = chunking_strategy or Config.CHUNKING_STRATEGY
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             length_function=len,
         )
+        self.chunker = StructuredChunker()
     
-    def extract_text_from_pdf(self, pdf_path: str) -> List[Dict[str, Any]]:
-        """Extract text from PDF using Unstructured library"""
+    @timed("extract")
+    def extract_text_from_pdf(self, pdf_path, workers: int = None) -> List[Dict[str, Any]]:
+        """Extract text from PDF using Unstructured library.
+
+        `pdf_path` may also be a binary file object. With more than one
+        worker, the PDF is split into page ranges of at least
+        PDF_MIN_PAGES_PER_WORKER pages that are partitioned in a process pool
+        and merged back in page order: paths are reopened by each worker,
+        the pages of a file object are sent to it as a small PDF.
+        """
+        workers = workers or Config.PDF_EXTRACTION_WORKERS
         try:
-            elements = partition_pdf(
-                filename=pdf_path,
-                strategy="fast",
-                extract_images=False,
-            )
+            is_path = isinstance(pdf_path, (str, os.PathLike))
+            if not is_path:
+                pdf_path.seek(0)
+            reader = PdfReader(pdf_path)
+            ranges = _page_ranges(len(reader.pages), workers, Config.PDF_MIN_PAGES_PER_WORKER)
+            
+            if not _use_pool(len(reader.pages), workers) or len(ranges) <= 1:
+                if is_path:
+                    elements = partition_pdf(filename=pdf_path, strategy="fast", extract_images=False)
+                else:
+                    pdf_path.seek(0)
+                    elements = partition_pdf(file=pdf_path, strategy="fast", extract_images=False)
+                text_elements = _to_text_elements(elements)
+            else:
+                with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=process_pool_context()) as pool:
+                    if is_path:
+                        results = pool.map(
+                            _extract_page_range,
+                            [pdf_path] * len(ranges),
+                            [start for start, _ in ranges],
+                            [end for _, end in ranges]
+                        )
+                    else:
+                        futures = [pool.submit(_partition_page_pdf, _pages_as_pdf(reader, start, end), start, end)
+                                   for start, end in ranges]
+                        results = (future.result() for future in futures)
+                    text_elements = [elem for result in results for elem in result]
             
-            text_elements = []
-            for i, element in enumerate(elements):
-                if hasattr(element, 'text') and element.text.strip():
-                    text_elements.append({
-                        'id': i,
-                        'text': element.text.strip(),
-                        'type': type(element).__name__
-                    })
+            for i, elem in enumerate(text_elements):
+                elem['id'] = i
             
             return text_elements
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
     
+    def iter_page_batches(self, pdf_source, pages_per_batch: int = None,
+                          workers: int = None) -> Iterator[List[Dict[str, Any]]]:
+        """Extract text elements a few pages at a time, in page order.
+
+        `pdf_source` is a path or a seekable binary file. Each batch of pages
+        is copied into a small in-memory PDF and partitioned on its own.
+        Documents of more than PDF_MIN_PAGES_PER_WORKER pages are partitioned
+        by a pool of PDF_EXTRACTION_WORKERS processes, with at most two
+        batches per worker in flight, so memory stays bounded; shorter ones
+        in the calling process.
+        """
+        pages_per_batch = pages_per_batch or Config.PIPELINE_PAGES_PER_BATCH
+        workers = workers or Config.PDF_EXTRACTION_WORKERS
+        reader = PdfReader(pdf_source)
+        page_count = len(reader.pages)
+        ranges = [(start, min(start + pages_per_batch, page_count)) for start in range(0, page_count, pages_per_batch)]
+        element_id = 0
+        
+        def numbered(batch):
+            nonlocal element_id
+            for elem in batch:
+                elem['id'] = element_id
+                element_id += 1
+            return batch
+        
+        if not _use_pool(page_count, workers) or len(ranges) <= 1:
+            for start, end in ranges:
+                with get_metrics().span("extract"):
+                    batch = _partition_pages(reader, start, end)
+                yield numbered(batch)
+            return
+        
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=process_pool_context())
+        pending = deque()
+        try:
+            for start, end in ranges:
+                pending.append(pool.submit(_partition_page_pdf, _pages_as_pdf(reader, start, end), start, end))
+                if len(pending) >= 2 * workers:
+                    with get_metrics().span("extract"):
+                        batch = pending.popleft().result()
+                    yield numbered(batch)
+            while pending:
+                with get_metrics().span("extract"):
+                    batch = pending.popleft().result()
+                yield numbered(batch)
+        finally:
+            # A consumer that stops early does not wait for the batches still queued
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    def iter_chunks(self, element_batches: Iterable[List[Dict[str, Any]]]) -> Iterator[Document]:
+        """Chunk element batches as they arrive.
+
+        The last chunk of each batch is held back and re-split together with
+        the next batch, so no chunk is cut at a page-batch boundary and the
+        overlap carries across batches.
+        """
+        if self.chunking_strategy == "structured":
+            # The structured chunker only buffers the current section
+            yield from self.chunker.iter_chunks(elem for batch in element_batches for elem in batch)
+            return
+        
+        carry = ""
+        chunk_id = 0
+        for batch in element_batches:
+            texts = [carry] if carry else []
+            texts.extend(elem['text'] for elem in batch)
+            if not texts:
+                continue
+            pieces = self.text_splitter.split_text("\n\n".join(texts))
+            if not pieces:
+                continue
+            carry = pieces.pop()
+            for piece in pieces:
+                yield Document(page_content=piece, metadata={"source": "pdf", "chunk_id": chunk_id})
+                chunk_id += 1
+        
+        if carry:
+            yield Document(page_content=carry, metadata={"source": "pdf", "chunk_id": chunk_id})
+    
+    @timed("chunk")
     def chunk_document(self, text_elements: List[Dict[str, Any]]) -> List[Document]:
         """Split document into chunks for processing"""
+        if self.chunking_strategy == "structured":
+            chunks = list(self.chunker.iter_chunks(text_elements))
+            for chunk in chunks:
+                chunk.metadata["total_chunks"] = len(chunks)
+            return chunks
+        
         full_text = "\n\n".join([elem['text'] for elem in text_elements])
         
         # Create LangChain documents
@@ -57,26 +270,47 @@ class DocumentProcessor:
         
         return chunks
     
-    def process_pdf(self, pdf_file) -> List[Document]:
-        """Main method to process PDF file"""
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            tmp_path = tmp_file.name
+    def process_pdf(self, pdf_file, stats: Dict[str, Any] = None) -> List[Document]:
+        """Main method to process PDF file.
+
+        Uploads up to UPLOAD_SPILL_THRESHOLD_MB are partitioned straight from
+        the in-memory upload. Larger ones are written once from the upload's
+        buffer to tmpfs so the process pool can read them by path. If a
+        `stats` dict is given it receives the upload size, the mode used and
+        the RSS before, at its sampled peak during and after processing.
+        """
+        pdf_file = as_binary_file(pdf_file)
+        size = pdf_file.getbuffer().nbytes
+        spill = size > Config.UPLOAD_SPILL_THRESHOLD_MB * 2 ** 20
+        sampler = RSSSampler()
+        tmp_path = None
         
         try:
-            # Extract text
-            text_elements = self.extract_text_from_pdf(tmp_path)
-            
-            if not text_elements:
-                raise Exception("No text content found in PDF")
-            
-            # Chunk document
-            chunks = self.chunk_document(text_elements)
+            with sampler:
+                if spill:
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=_spill_dir()) as tmp_file:
+                        # Writing the memoryview avoids a bytes copy of the upload
+                        tmp_file.write(pdf_file.getbuffer())
+                        tmp_path = tmp_file.name
+                    text_elements = self.extract_text_from_pdf(tmp_path)
+                else:
+                    text_elements = self.extract_text_from_pdf(pdf_file)
+                
+                if not text_elements:
+                    raise Exception("No text content found in PDF")
+                
+                # Chunk document
+                chunks = self.chunk_document(text_elements)
             
             return chunks
             
         finally:
             # Clean up temporary file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
\ No newline at end of file
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            if stats is not None:
+                stats.update({
+                    "upload_mb": round(size / 2 ** 20, 2),
+                    "mode": "spill" if spill else "memory",
+                    **sampler.to_stats(),
+                })
\ No newline at end of file
@@ -0,0 +1,243 @@
+import fcntl
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Union
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+from config import Config
+from src.embeddings import SharedEmbeddings, get_embeddings
+from src.metrics import get_metrics
+
+# One fixed-width record per write: sha1 of (model, text) and the vector slot
+INDEX_RECORD = np.dtype([("key", "S20"), ("slot", "<u4")])
+
+class EmbeddingCache:
+    """Persistent text -> vector cache for one embedding model.
+
+    Vectors live in a preallocated float32 file opened with np.memmap and
+    used as a ring of `capacity` slots; when it is full the oldest slot is
+    overwritten. Once the ring is full, hits in its older half are written
+    again at the head, so vectors still in use survive the wrap-around and
+    eviction approximates least-recently-used. A separate append-only index
+    of (key, slot) records maps hashes to slots, so lookups never unpickle
+    anything; it is rewritten with live entries only whenever it grows past
+    twice the capacity. Writers take an exclusive flock on a lock file next
+    to the index and readers a shared one; both replay records appended by
+    other processes first, and re-read an index another process compacted.
+    """
+
+    def __init__(self, model_name: str, dimension: int, directory: str = None, capacity: int = None):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.capacity = capacity or Config.EMBEDDING_CACHE_CAPACITY
+        directory = directory or Config.EMBEDDING_CACHE_DIR
+        os.makedirs(directory, exist_ok=True)
+        
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.vectors_path = os.path.join(directory, f"{slug}.f32")
+        self.index_path = os.path.join(directory, f"{slug}.idx")
+        
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._slots: Dict[bytes, int] = {}
+        self._slot_keys: Dict[int, bytes] = {}
+        self._next_slot = 0
+        self._index_offset = 0
+        self._index_inode = None
+        
+        with self._locked_index():
+            self._open_vectors()
+            self._replay_index()
+            self._compact_if_grown()
+    
+    def _locked_index(self, shared: bool = False):
+        # Not the index itself: compaction replaces that file, and a lock on the old one would exclude nobody
+        return _FileLock(f"{self.index_path}.lock", shared)
+    
+    def _open_vectors(self):
+        expected = self.capacity * self.dimension * 4
+        if not os.path.exists(self.vectors_path) or os.path.getsize(self.vectors_path) != expected:
+            # New cache, or capacity/dimension changed: start over
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="w+",
+                                      shape=(self.capacity, self.dimension))
+            open(self.index_path, "wb").close()
+        else:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                                      shape=(self.capacity, self.dimension))
+    
+    def _apply_records(self, records: np.ndarray):
+        for key, slot in zip(records["key"].tolist(), records["slot"].tolist()):
+            previous = self._slot_keys.get(slot)
+            if previous is not None and self._slots.get(previous) == slot:
+                del self._slots[previous]
+            self._slots[key] = slot
+            self._slot_keys[slot] = key
+            self._next_slot = (slot + 1) % self.capacity
+    
+    def _replay_index(self):
+        """Apply index records appended since the last read (by any process)"""
+        stat = os.stat(self.index_path)
+        size = stat.st_size
+        if stat.st_ino != self._index_inode or size < self._index_offset:
+            # New, reset, or compacted by another process: rebuild from scratch
+            self._slots.clear()
+            self._slot_keys.clear()
+            self._index_offset = 0
+            self._index_inode = stat.st_ino
+        if size == self._index_offset:
+            return
+        usable = (size - self._index_offset) // INDEX_RECORD.itemsize
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            records = np.fromfile(f, dtype=INDEX_RECORD, count=usable)
+        self._apply_records(records)
+        self._index_offset += len(records) * INDEX_RECORD.itemsize
+    
+    def _compact_if_grown(self):
+        """Rewrite the index with live entries only, oldest slot first, once it passes twice the capacity.
+
+        The caller holds the exclusive index lock and has replayed the index.
+        """
+        if self._index_offset <= 2 * self.capacity * INDEX_RECORD.itemsize:
+            return
+        order = sorted(self._slot_keys, key=lambda slot: (slot - self._next_slot) % self.capacity)
+        records = np.array([(self._slot_keys[slot], slot) for slot in order], dtype=INDEX_RECORD)
+        tmp_path = self.index_path + ".tmp"
+        records.tofile(tmp_path)
+        os.replace(tmp_path, self.index_path)
+        self._index_offset = records.nbytes
+        self._index_inode = os.stat(self.index_path).st_ino
+    
+    def make_key(self, text: str) -> bytes:
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+    
+    def get_many(self, keys: List[bytes]) -> Dict[int, np.ndarray]:
+        """Return {position: vector} for cached keys.
+
+        Vectors are copied out of the mapped file, so later writes that
+        recycle their slots, in this process or another, cannot change them.
+        """
+        with self._lock:
+            with self._locked_index(shared=True):
+                self._replay_index()
+                positions = [position for position, key in enumerate(keys) if key in self._slots]
+                slots = [self._slots[keys[position]] for position in positions]
+                rows = np.array(self._vectors[slots]) if slots else np.empty((0, self.dimension), np.float32)
+            
+            if len(self._slot_keys) == self.capacity:
+                # Age 0 is the newest slot; refresh hits the ring will reach within half a turn
+                stale = [i for i, slot in enumerate(slots)
+                         if (self._next_slot - slot - 1) % self.capacity >= self.capacity // 2]
+                if stale:
+                    self._append([keys[positions[i]] for i in stale], rows[stale])
+            
+            self.hits += len(positions)
+            self.misses += len(keys) - len(positions)
+        get_metrics().inc("cache_hits_total", len(positions), cache="embedding")
+        get_metrics().inc("cache_misses_total", len(keys) - len(positions), cache="embedding")
+        return dict(zip(positions, rows))
+    
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        if not keys:
+            return
+        with self._lock:
+            self._append(keys, vectors)
+    
+    def _append(self, keys: List[bytes], vectors: np.ndarray):
+        """Write vectors into the next ring slots; the caller holds self._lock"""
+        with self._locked_index():
+            self._replay_index()
+            records = np.empty(len(keys), dtype=INDEX_RECORD)
+            for i, key in enumerate(keys):
+                slot = self._next_slot
+                self._vectors[slot] = vectors[i]
+                records[i] = (key, slot)
+                self._next_slot = (slot + 1) % self.capacity
+            # Vectors reach the file before the index records that point at them
+            self._vectors.flush()
+            with open(self.index_path, "ab") as f:
+                records.tofile(f)
+            self._apply_records(records)
+            self._index_offset += records.nbytes
+            # A long-running process would otherwise grow the index without bound
+            self._compact_if_grown()
+    
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class _FileLock:
+    """Exclusive (or shared) flock on a file for the duration of a with-block"""
+
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.shared = shared
+    
+    def __enter__(self):
+        self._file = open(self.path, "ab")
+        fcntl.flock(self._file, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+    
+    def __exit__(self, *exc):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves document vectors from an EmbeddingCache.
+
+    FAISS accepts the float32 rows as returned; Chroma validates that each
+    embedding is a Python list, so it needs `as_lists=True`.
+    """
+
+    def __init__(self, inner: SharedEmbeddings, cache: EmbeddingCache, as_lists: bool = False):
+        self.inner = inner
+        self.cache = cache
+        self.as_lists = as_lists
+        self.model_name = inner.model_name
+    
+    def embed_documents(self, texts: List[str]) -> List[Union[np.ndarray, List[float]]]:
+        keys = [self.cache.make_key(text) for text in texts]
+        vectors: List[np.ndarray] = [None] * len(texts)
+        for position, vector in self.cache.get_many(keys).items():
+            vectors[position] = vector
+        
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.inner.embed_array([texts[i] for i in missing])
+            self.cache.put_many([keys[i] for i in missing], computed)
+            for row, i in enumerate(missing):
+                vectors[i] = computed[row]
+        
+        if self.as_lists:
+            return [vector.tolist() for vector in vectors]
+        return vectors
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _shared_cache
+    inner = get_embeddings()
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache(inner.model_name, inner.service.dimension)
+        return _shared_cache
+
+def get_cached_embeddings(as_lists: bool = False) -> Embeddings:
+    """Shared embeddings, served through the persistent cache when enabled"""
+    inner = get_embeddings()
+    if not Config.EMBEDDING_CACHE_ENABLED:
+        return inner
+    return CachedEmbeddings(inner, get_embedding_cache(), as_lists=as_lists)
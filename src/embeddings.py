@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+from config import Config
+from src.resource_usage import current_rss_bytes
+
+class _EncodeRequest:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future = Future()
+
+class EmbeddingService:
+    """A single loaded embedding model per process.
+
+    Callers from any thread put their texts on a queue; one worker thread
+    drains whatever is waiting and encodes it in a single forward pass, so
+    concurrent sessions share both the weights and the batches.
+    """
+
+    def __init__(self, model_name: str = None, max_batch_texts: int = None, max_wait_ms: float = None):
+        self.model_name = model_name or Config.EMBEDDING_MODEL
+        self.max_batch_texts = max_batch_texts or Config.EMBEDDING_MAX_BATCH_TEXTS
+        self.max_wait = (Config.EMBEDDING_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        
+        rss_before = current_rss_bytes()
+        start = time.perf_counter()
+        self.model = SentenceTransformer(self.model_name)
+        self.load_seconds = time.perf_counter() - start
+        self.load_rss_bytes = current_rss_bytes() - rss_before
+        self.parameter_bytes = sum(p.numel() * p.element_size() for p in self.model.parameters())
+        
+        self.requests = 0
+        self.forward_passes = 0
+        self.texts_encoded = 0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+        self._worker.start()
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as a float32 array of shape (len(texts), dim)"""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        request = _EncodeRequest(list(texts))
+        self._queue.put(request)
+        return request.future.result()
+    
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+    
+    def _collect_batch(self) -> List[_EncodeRequest]:
+        batch = [self._queue.get()]
+        total = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while total < self.max_batch_texts:
+            try:
+                request = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            batch.append(request)
+            total += len(request.texts)
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = self.model.encode(
+                    texts,
+                    batch_size=Config.EMBEDDING_BATCH_SIZE,
+                    normalize_embeddings=Config.EMBEDDING_NORMALIZE,
+                    convert_to_numpy=True,
+                ).astype(np.float32, copy=False)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            
+            self.requests += len(batch)
+            self.forward_passes += 1
+            self.texts_encoded += len(texts)
+            
+            offset = 0
+            for request in batch:
+                request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "load_seconds": round(self.load_seconds, 2),
+            "load_rss_mb": round(self.load_rss_bytes / 2 ** 20, 1),
+            "parameter_mb": round(self.parameter_bytes / 2 ** 20, 1),
+            "requests": self.requests,
+            "forward_passes": self.forward_passes,
+            "texts_encoded": self.texts_encoded,
+        }
+
+class SharedEmbeddings(Embeddings):
+    """LangChain embeddings backed by the process-wide EmbeddingService"""
+
+    def __init__(self, service: EmbeddingService):
+        self.service = service
+        self.model_name = service.model_name
+    
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        return self.service.encode(texts)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.service.encode(texts).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.service.encode([text])[0].tolist()
+
+_shared_service = None
+_shared_embeddings = None
+_shared_lock = threading.Lock()
+
+def get_embedding_service() -> EmbeddingService:
+    """Load the embedding model on first use and reuse it afterwards"""
+    global _shared_service
+    with _shared_lock:
+        if _shared_service is None:
+            _shared_service = EmbeddingService()
+        return _shared_service
+
+def get_embeddings() -> SharedEmbeddings:
+    global _shared_embeddings
+    service = get_embedding_service()
+    with _shared_lock:
+        if _shared_embeddings is None:
+            _shared_embeddings = SharedEmbeddings(service)
+        return _shared_embeddings
@@ -0,0 +1,128 @@
+import logging
+import math
+from typing import Optional
+import faiss
+import numpy as np
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "sq8", "ivf", "ivf_sq8", "ivf_pq")
+
+def choose_index_type(count: int) -> str:
+    """Exact search while it is cheap, then compressed IVF variants as the corpus grows.
+
+    PQ is only chosen once SQ8 codes no longer fit comfortably in memory:
+    it is ~3x smaller again but loses noticeably more recall.
+    """
+    if count <= Config.FAISS_AUTO_FLAT_MAX:
+        return "flat"
+    if count <= Config.FAISS_AUTO_SQ_MAX:
+        return "ivf_sq8"
+    return "ivf_pq"
+
+def _nlist(count: int) -> int:
+    # ~4*sqrt(n) lists, but at least 39 training points per centroid
+    return Config.FAISS_IVF_NLIST or max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+def _pq_subquantizers(dimension: int) -> int:
+    m = Config.FAISS_PQ_M or dimension // 4
+    while dimension % m:
+        m -= 1
+    return m
+
+def _factory_string(index_type: str, count: int, dimension: int) -> str:
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{Config.FAISS_HNSW_M}"
+    if index_type == "sq8":
+        return "SQ8"
+    nlist = _nlist(count)
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_sq8":
+        return f"IVF{nlist},SQ8"
+    if index_type == "ivf_pq":
+        return f"IVF{nlist},PQ{_pq_subquantizers(dimension)}x{Config.FAISS_PQ_NBITS}"
+    raise ValueError(f"Unknown FAISS index type {index_type!r}; expected 'auto' or one of {INDEX_TYPES}")
+
+def _min_training_points(index_type: str, count: int) -> int:
+    # k-means needs ~39 points per centroid for usable centroids
+    if index_type == "ivf_pq":
+        return 39 * max(_nlist(count), 2 ** Config.FAISS_PQ_NBITS)
+    if index_type.startswith("ivf"):
+        return 39 * _nlist(count)
+    return 1
+
+def apply_search_params(index: faiss.Index) -> faiss.Index:
+    """Set the recall/latency knobs that are not stored in the index file"""
+    params = faiss.ParameterSpace()
+    if isinstance(index, faiss.IndexIVF):
+        params.set_index_parameter(index, "nprobe", min(Config.FAISS_IVF_NPROBE, index.nlist))
+    elif isinstance(index, faiss.IndexHNSW):
+        params.set_index_parameter(index, "efSearch", Config.FAISS_HNSW_EF_SEARCH)
+    return index
+
+def build_index(vectors: np.ndarray, index_type: str = None) -> faiss.Index:
+    """Create and train an empty L2 index for vectors like `vectors`.
+
+    `index_type` defaults to Config.FAISS_INDEX_TYPE; "auto" picks one by
+    corpus size. Types that need training fall back to flat when there are
+    too few vectors to train them.
+    """
+    count, dimension = vectors.shape
+    index_type = index_type or Config.FAISS_INDEX_TYPE
+    if index_type == "auto":
+        index_type = choose_index_type(count)
+    if count < _min_training_points(index_type, count):
+        logger.info("Only %d vectors, too few to train %s; using a flat index", count, index_type)
+        index_type = "flat"
+
+    index = faiss.index_factory(dimension, _factory_string(index_type, count, dimension))
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = Config.FAISS_HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+    return apply_search_params(index)
+
+def rebuild_for_size(index: faiss.Index) -> Optional[faiss.Index]:
+    """A copy of a flat index as the type configured (or chosen) for its size; None if it should stay"""
+    target = Config.FAISS_INDEX_TYPE
+    if target == "auto":
+        target = choose_index_type(index.ntotal)
+    if index_type_of(index) != "flat" or target == "flat" or index.ntotal == 0:
+        return None
+    vectors = index.reconstruct_n(0, index.ntotal)
+    rebuilt = build_index(vectors, target)
+    if index_type_of(rebuilt) == "flat":
+        return None
+    rebuilt.add(vectors)
+    return rebuilt
+
+def search_parameters(index: faiss.Index, selector: Optional[faiss.IDSelector]) -> Optional[faiss.SearchParameters]:
+    """Search parameters that restrict the search to `selector`, keeping the index's own tuning"""
+    if selector is None:
+        return None
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFScalarQuantizer):
+        return "ivf_sq8"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8"
+    return "flat"
+
+def bytes_per_vector(index: faiss.Index) -> float:
+    """Serialized size per stored vector, including ids, graph links and codebooks"""
+    return len(faiss.serialize_index(index)) / max(index.ntotal, 1)
@@ -0,0 +1,99 @@
+import json
+import random
+import re
+import threading
+import time
+from src.tokens import count_tokens
+
+class FakeRateLimitError(Exception):
+    """Mimics the Groq client's 429 error"""
+    status_code = 429
+
+class FakeServerError(Exception):
+    """Mimics a Groq 5xx error"""
+    status_code = 503
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+class FakeChatGroq:
+    """Local stand-in for ChatGroq with latency and injected failures"""
+
+    def __init__(self, latency: float = 0.05, rate_limit_rate: float = 0.0,
+                 server_error_rate: float = 0.0, malformed_rate: float = 0.0,
+                 tokens_per_second: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.malformed_rate = malformed_rate
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+    
+    def _summarize(self, text: str) -> str:
+        return "Summary: " + " ".join(text.split()[:30])
+    
+    def _respond(self, prompt: str) -> str:
+        # Batch prompts wrap each chunk in <chunk id="N"> tags and expect JSON back
+        chunks = re.findall(r'<chunk id="(\d+)">(.*?)</chunk>', prompt, re.DOTALL)
+        if chunks:
+            with self._lock:
+                malformed = self._random.random() < self.malformed_rate
+            items = [{"chunk_id": int(i), "summary": self._summarize(text)} for i, text in chunks]
+            if malformed:
+                # Leave out the last chunk, as a model that lost track of one would
+                return json.dumps(items[:-1])
+            return json.dumps(items)
+        words = prompt.split()
+        return self._summarize(" ".join(words[-40:-1]))
+    
+    def _call(self, prompt: str) -> str:
+        """Apply latency and injected failures, then build the reply"""
+        prompt_tokens = count_tokens(str(prompt))
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            roll = self._random.random()
+        try:
+            time.sleep(self.latency)
+            if roll < self.rate_limit_rate:
+                with self._lock:
+                    self.failures += 1
+                raise FakeRateLimitError("Rate limit reached")
+            if roll < self.rate_limit_rate + self.server_error_rate:
+                with self._lock:
+                    self.failures += 1
+                raise FakeServerError("Service unavailable")
+            content = self._respond(str(prompt))
+            completion_tokens = count_tokens(content)
+            with self._lock:
+                self.completion_tokens += completion_tokens
+            return content
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+    
+    def _token_delay(self, words: int) -> float:
+        # Roughly 0.75 words per token for generated text
+        return words / 0.75 / self.tokens_per_second if self.tokens_per_second else 0.0
+    
+    def invoke(self, prompt, **kwargs) -> FakeMessage:
+        content = self._call(prompt)
+        time.sleep(self._token_delay(len(content.split())))
+        return FakeMessage(content)
+    
+    def stream(self, prompt, **kwargs):
+        """Yield the reply word by word, like a streaming chat model"""
+        words = self._call(prompt).split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self._token_delay(1))
+            yield FakeMessage(word if i == 0 else " " + word)
@@ -0,0 +1,157 @@
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from langchain.schema import Document
+from config import Config
+from src.document_processor import DocumentProcessor, as_binary_file
+from src.metrics import bind_traces
+from src.resource_usage import RSSSampler
+from src.retrievers import SummaryParentRetriever
+from src.summarizer import Summarizer
+from src.summary_tree import SummaryTreeBuilder
+from src.vector_store import MultiVectorStore
+
+_DONE = object()
+
+class _StageError:
+    def __init__(self, error: Exception):
+        self.error = error
+
+class IngestionPipeline:
+    """Extract, chunk, summarize and embed a PDF as overlapping stages.
+
+    Page batches are extracted and chunked in one thread, chunk groups are
+    summarized in a second, and the calling thread embeds and indexes each
+    group as it arrives; the summary tree levels are added once every leaf
+    is in. Stages are joined by bounded queues, so memory
+    stays flat however large the PDF is, and the index is searchable (via
+    `on_progress`) as soon as the first group lands.
+    """
+
+    def __init__(self, processor: DocumentProcessor, summarizer: Summarizer, vector_store: MultiVectorStore,
+                 group_size: int = None, queue_size: int = None):
+        self.processor = processor
+        self.summarizer = summarizer
+        self.vector_store = vector_store
+        self.group_size = group_size or Config.PIPELINE_GROUP_SIZE
+        self.queue_size = queue_size or Config.PIPELINE_QUEUE_SIZE
+        self.stats = {"chunks": 0, "summaries": 0, "groups": 0}
+    
+    def _put(self, out: queue.Queue, item, stop: threading.Event):
+        # Re-check `stop` so a failed downstream stage cannot leave us blocked
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    
+    def _get(self, source: queue.Queue, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+    
+    def _extract_and_chunk(self, pdf_source, out: queue.Queue, stop: threading.Event):
+        try:
+            for chunk in self.processor.iter_chunks(self.processor.iter_page_batches(pdf_source)):
+                if stop.is_set():
+                    return
+                self._put(out, chunk, stop)
+            self._put(out, _DONE, stop)
+        except Exception as e:
+            self._put(out, _StageError(e), stop)
+    
+    def _summarize(self, source: queue.Queue, out: queue.Queue, stop: threading.Event):
+        try:
+            group: List[Document] = []
+            while not stop.is_set():
+                item = self._get(source, stop)
+                if isinstance(item, _StageError):
+                    self._put(out, item, stop)
+                    return
+                if item is not _DONE:
+                    group.append(item)
+                if group and (item is _DONE or len(group) >= self.group_size):
+                    summaries = self.summarizer.create_summarized_chunks(group)
+                    self._put(out, (summaries, group), stop)
+                    group = []
+                if item is _DONE:
+                    self._put(out, _DONE, stop)
+                    return
+        except Exception as e:
+            self._put(out, _StageError(e), stop)
+    
+    def run(self, pdf_source, on_progress: Optional[Callable[[Dict[str, Any], SummaryParentRetriever], None]] = None
+            ) -> SummaryParentRetriever:
+        """Ingest a PDF (path or binary file) and return the retriever over it.
+
+        `stats` also gets the upload size and the RSS before, at its sampled
+        peak during and after the whole ingestion, summary tree included.
+        Uploads are read in place from their buffer, never spilled to disk.
+        """
+        if not isinstance(pdf_source, (str, os.PathLike)):
+            pdf_source = as_binary_file(pdf_source)
+            pdf_source.seek(0)
+            self.stats.update({"upload_mb": round(pdf_source.getbuffer().nbytes / 2 ** 20, 2), "mode": "stream"})
+        sampler = RSSSampler()
+        try:
+            with sampler:
+                return self._run(pdf_source, on_progress)
+        finally:
+            self.stats.update(sampler.to_stats())
+    
+    def _run(self, pdf_source, on_progress) -> SummaryParentRetriever:
+        chunk_queue = queue.Queue(maxsize=self.queue_size)
+        summary_queue = queue.Queue(maxsize=max(1, self.queue_size // self.group_size))
+        stop = threading.Event()
+        
+        workers = [
+            threading.Thread(target=bind_traces(self._extract_and_chunk), args=(pdf_source, chunk_queue, stop), daemon=True),
+            threading.Thread(target=bind_traces(self._summarize), args=(chunk_queue, summary_queue, stop), daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+        
+        retriever = None
+        originals: List[Document] = []
+        leaves: List[Document] = []
+        try:
+            while True:
+                item = self._get(summary_queue, stop)
+                if item is _DONE:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.error
+                
+                summaries, group = item
+                retriever = self.vector_store.add_summaries(summaries, group)
+                originals.extend(group)
+                leaves.extend(summaries)
+                self.stats["chunks"] += len(group)
+                self.stats["summaries"] += len(summaries)
+                self.stats["groups"] += 1
+                if on_progress:
+                    on_progress(dict(self.stats), retriever)
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+        
+        if retriever is None:
+            raise Exception("No text content found in PDF")
+        
+        # Higher summary levels need every leaf, so they are built last
+        if Config.SUMMARY_TREE_ENABLED:
+            nodes = SummaryTreeBuilder(self.summarizer, self.vector_store.embedding_model).build(leaves)
+            if nodes:
+                retriever = self.vector_store.add_summaries(nodes, [])
+            self.stats["tree_nodes"] = len(nodes)
+        
+        # The total is only known once extraction has finished
+        for doc in originals:
+            doc.metadata["total_chunks"] = len(originals)
+        return retriever
@@ -0,0 +1,161 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from config import Config
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+def _process_start(pid: int) -> Optional[str]:
+    """Start time of process `pid` in clock ticks since boot, or None if it is not running.
+
+    Together with the pid it names one process: a pid reused by a later
+    process has a different start time.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Field 22; the command name (field 2) may contain spaces, so count from its closing parenthesis
+    return stat[stat.rindex(")") + 2:].split()[19]
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _worker_alive(host: Optional[str], pid: Optional[int], started: Optional[str]) -> bool:
+    """Whether the process that claimed a job is still running it"""
+    if host is not None and host != socket.gethostname():
+        # Its pid means nothing here; the job is left to that host to recover
+        return True
+    if not _pid_alive(pid):
+        return False
+    # Without /proc (not Linux) no start time was recorded and the pid alone decides
+    return started is None or _process_start(pid) == started
+
+class JobQueue:
+    """Persistent queue of PDFs to ingest, one row per file, in SQLite.
+
+    Jobs are claimed atomically (BEGIN IMMEDIATE), so several ingest
+    processes can share one queue file. A job left `running` by a process
+    that no longer exists is put back to `pending` by `recover()`. The
+    worker is identified by host, pid and process start time, so a pid
+    reused by an unrelated process does not keep its job running. The
+    chunk summaries of a resumed job are already in the summary cache, so
+    it does not call the LLM again for them.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.INGEST_QUEUE_PATH
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT UNIQUE NOT NULL, status TEXT NOT NULL, "
+            "student TEXT, year TEXT, doc_hash TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "worker_pid INTEGER, error TEXT, chunks INTEGER, summaries INTEGER, seconds REAL, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)")
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("worker_host", "worker_started"):
+            if column not in columns:
+                # Queues created before workers were identified by more than their pid
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+
+    def enqueue(self, path: str, student: str = None, year: Any = None, force: bool = False) -> bool:
+        """Add a PDF; an existing job is only reset when `force` is set. True if it will run"""
+        path = os.path.abspath(path)
+        year = str(year) if year is not None else None
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (path, status, student, year, created_at) VALUES (?, ?, ?, ?, ?)",
+                (path, PENDING, student, year, time.time())
+            )
+            if cursor.rowcount:
+                return True
+            if force:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, student = ?, year = ?, error = NULL WHERE path = ? AND status != ?",
+                    (PENDING, student, year, path, RUNNING)
+                )
+                return True
+        return False
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest pending job running for this process and return it"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (PENDING,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker_pid = ?, worker_host = ?, worker_started = ?, "
+                        "attempts = attempts + 1, started_at = ? WHERE id = ?",
+                        (RUNNING, os.getpid(), socket.gethostname(), _process_start(os.getpid()), time.time(),
+                         row["id"])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(row) if row is not None else None
+
+    def complete(self, job_id: int, doc_hash: str, chunks: int, summaries: int, seconds: float):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, doc_hash = ?, chunks = ?, summaries = ?, seconds = ?, "
+                "error = NULL, finished_at = ? WHERE id = ?",
+                (DONE, doc_hash, chunks, summaries, seconds, time.time(), job_id)
+            )
+
+    def fail(self, job_id: int, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (FAILED, error, time.time(), job_id)
+            )
+
+    def recover(self, retry_failed: bool = False) -> int:
+        """Requeue jobs whose worker process died (and failed ones if asked); returns the count"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, worker_pid, worker_host, worker_started FROM jobs WHERE status = ?", (RUNNING,)
+            ).fetchall()
+            stale = [row["id"] for row in rows
+                     if not _worker_alive(row["worker_host"], row["worker_pid"], row["worker_started"])]
+            if retry_failed:
+                stale += [row["id"] for row in self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ?", (FAILED,)
+                )]
+            self._conn.executemany("UPDATE jobs SET status = ? WHERE id = ?", [(PENDING, i) for i in stale])
+        return len(stale)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0, **{status: count for status, count in rows}}
+
+    def failures(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT path, error FROM jobs WHERE status = ?", (FAILED,)).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,149 @@
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import List, Tuple
+import numpy as np
+from langchain.schema import Document
+from config import Config
+
+# Keeps dotted/hyphenated identifiers such as "3.2", "eq-4" or "resnet-50" whole
+_TOKEN_RE = re.compile(r"\w+(?:[.\-/]\w+)*")
+
+# Question words and function words; dropped from queries so they never make a lexical hit
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him
+his how i if in into is it its itself just me more most my no nor not of off on once only or other our ours
+out over own same she should so some such than that the their theirs them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with would you
+your yours
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+def query_terms(query: str) -> List[str]:
+    """Distinct query tokens other than stopwords, in order"""
+    return list(dict.fromkeys(t for t in tokenize(query) if t not in STOPWORDS))
+
+class BM25Index:
+    """Okapi BM25 over the original chunks, for exact-term matches dense search misses.
+
+    Postings are appended to flat typed arrays (term id, chunk id, term
+    frequency) at ingest and compiled on the first query after a change into
+    a CSR layout: postings sorted by term with one offsets array. A query
+    term then scores all of its chunks with a single vectorized slice.
+    """
+
+    def __init__(self, k1: float = None, b: float = None):
+        self.k1 = k1 if k1 is not None else Config.BM25_K1
+        self.b = b if b is not None else Config.BM25_B
+        self.vocabulary = {}
+        self._terms = array("I")
+        self._chunks = array("I")
+        self._freqs = array("I")
+        self._lengths = array("I")
+        self._indexed = set()
+        self._document_count = 0
+        self._lock = threading.Lock()
+        self._compiled = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_compiled"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "_indexed" not in state:
+            # Saved before indexed ids were tracked; chunks without terms have no postings to tell
+            self._indexed = set(self._chunks)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._document_count
+
+    def add_documents(self, documents: List[Document]):
+        """Index chunks by their chunk_id; ids already indexed are skipped, so re-adds never double-count"""
+        with self._lock:
+            for doc in documents:
+                chunk_id = doc.metadata["chunk_id"]
+                if chunk_id in self._indexed:
+                    continue
+                self._indexed.add(chunk_id)
+                counts = Counter(tokenize(doc.page_content))
+                if chunk_id >= len(self._lengths):
+                    self._lengths.extend([0] * (chunk_id + 1 - len(self._lengths)))
+                self._lengths[chunk_id] = sum(counts.values())
+                self._document_count += 1
+                for term, freq in counts.items():
+                    term_id = self.vocabulary.setdefault(term, len(self.vocabulary))
+                    self._terms.append(term_id)
+                    self._chunks.append(chunk_id)
+                    self._freqs.append(freq)
+            self._compiled = None
+
+    def _compile(self):
+        with self._lock:
+            if self._compiled is not None:
+                return self._compiled
+            terms = np.array(self._terms, dtype=np.uint32)
+            order = np.argsort(terms, kind="stable")
+            term_counts = np.bincount(terms, minlength=len(self.vocabulary))
+            offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+            np.cumsum(term_counts, out=offsets[1:])
+
+            chunks = np.array(self._chunks, dtype=np.uint32)[order]
+            freqs = np.array(self._freqs, dtype=np.float32)[order]
+            lengths = np.array(self._lengths, dtype=np.float32)
+
+            n = max(self._document_count, 1)
+            idf = np.log1p((n - term_counts + 0.5) / (term_counts + 0.5)).astype(np.float32)
+            average_length = lengths.sum() / n or 1.0
+            length_norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+
+            self._compiled = (offsets, chunks, freqs, idf, length_norm)
+            return self._compiled
+
+    def best_possible_score(self, query: str) -> float:
+        """Upper bound of a chunk's score for `query`, to normalize scores into [0, 1).
+
+        Query terms missing from the index count at the highest idf, so a
+        question whose key terms appear nowhere scores low even when some
+        of its other words match.
+        """
+        n = max(self._document_count, 1)
+        _, _, _, idf, _ = self._compiled or self._compile()
+        unseen = np.log1p((n + 0.5) / 0.5)
+        weights = [idf[self.vocabulary[t]] if t in self.vocabulary else unseen for t in query_terms(query)]
+        return float(sum(weights)) * (self.k1 + 1)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to k (chunk_id, score) pairs, best first"""
+        term_ids = {self.vocabulary[t] for t in query_terms(query) if t in self.vocabulary}
+        if not term_ids or k <= 0:
+            return []
+        offsets, chunks, freqs, idf, length_norm = self._compiled or self._compile()
+
+        scores = np.zeros(len(length_norm), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = offsets[term_id], offsets[term_id + 1]
+            hit_chunks = chunks[start:end]
+            tf = freqs[start:end]
+            # A chunk appears once per term, so the fancy-indexed add is safe
+            scores[hit_chunks] += idf[term_id] * tf * (self.k1 + 1) / (tf + length_norm[hit_chunks])
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(i), float(scores[i])) for i in candidates]
+
+    def get_stats(self):
+        return {
+            "documents": self._document_count,
+            "terms": len(self.vocabulary),
+            "postings": len(self._terms),
+        }
@@ -0,0 +1,243 @@
+import contextvars
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config import Config
+
+# Prefix of every exported metric name
+NAMESPACE = "rag"
+
+HELP = {
+    "stage_seconds": "Time spent in each pipeline stage",
+    "llm_requests_total": "LLM requests sent, including retried attempts",
+    "llm_prompt_tokens_total": "Prompt tokens sent to the LLM",
+    "llm_completion_tokens_total": "Completion tokens received from the LLM",
+    "llm_retries_total": "LLM requests retried after a rate limit or server error",
+    "llm_failures_total": "LLM requests that failed after all retries",
+    "llm_request_seconds": "Latency of one LLM request",
+    "cache_hits_total": "Cache lookups that found an entry",
+    "cache_misses_total": "Cache lookups that found nothing",
+    "query_seconds": "End-to-end query latency",
+    "query_ttft_seconds": "Time from question to first answer token",
+    "query_errors_total": "Queries that ended in an error",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Traces open in the current context, innermost last
+_current_runs: contextvars.ContextVar[Tuple[Dict[str, Any], ...]] = contextvars.ContextVar("metrics_runs",
+                                                                                            default=())
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as Prometheus exposes it"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate by linear interpolation inside the bucket holding the q-th value"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class MetricsRegistry:
+    """Process-wide counters, latency histograms and the breakdown of the last runs.
+
+    `span(stage)` times a block into the `stage_seconds` histogram. While a
+    `trace(kind)` is open (one ingest or one query), the spans and counter
+    changes of its context are also summed into it, and the finished trace
+    is kept as the last run of that kind. The open traces are held in a
+    ContextVar, so concurrent requests and sessions each record their own
+    breakdown; work handed to other threads is counted in the trace when
+    the function is wrapped with `bind_traces`.
+    """
+
+    def __init__(self, enabled: bool = None, buckets: Tuple[float, ...] = None):
+        self.enabled = Config.METRICS_ENABLED if enabled is None else enabled
+        self.buckets = tuple(buckets or Config.METRICS_HISTOGRAM_BUCKETS)
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._last_runs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled or not value:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            for run in _current_runs.get():
+                counters = run["counters"]
+                counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("stage_seconds", seconds, stage=stage)
+            with self._lock:
+                for run in _current_runs.get():
+                    row = run["stages"].setdefault(stage, {"seconds": 0.0, "calls": 0})
+                    row["seconds"] += seconds
+                    row["calls"] += 1
+
+    @contextmanager
+    def trace(self, kind: str, **attributes) -> Iterator[Optional[Dict[str, Any]]]:
+        """Record the stage breakdown and counter changes of one run as the last `kind` run"""
+        if not self.enabled:
+            yield None
+            return
+        run = {"kind": kind, "started_at": time.time(), "attributes": attributes, "stages": {}, "counters": {}}
+        token = _current_runs.set(_current_runs.get() + (run,))
+        start = time.perf_counter()
+        try:
+            yield run
+        finally:
+            run["total_seconds"] = time.perf_counter() - start
+            _current_runs.reset(token)
+            with self._lock:
+                run["counters"] = {name + _format_labels(labels): value
+                                   for (name, labels), value in run["counters"].items()}
+                self._last_runs[kind] = run
+
+    def last_run(self, kind: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._last_runs.get(kind)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, histogram summaries and the last runs as JSON-serializable data"""
+        with self._lock:
+            counters: Dict[str, List[Dict[str, Any]]] = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+            histograms: Dict[str, List[Dict[str, Any]]] = {}
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                histograms.setdefault(name, []).append({
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                })
+            return {"counters": counters, "histograms": histograms, "last_runs": dict(self._last_runs)}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), default=str)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            described = set()
+
+            def describe(name: str, kind: str):
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {NAMESPACE}_{name} {HELP.get(name, name)}")
+                    lines.append(f"# TYPE {NAMESPACE}_{name} {kind}")
+
+            for (name, labels), value in sorted(self._counters.items()):
+                describe(name, "counter")
+                lines.append(f"{NAMESPACE}_{name}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                describe(name, "histogram")
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                    lines.append(f"{NAMESPACE}_{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{NAMESPACE}_{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{NAMESPACE}_{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._last_runs.clear()
+
+_shared_metrics: Optional[MetricsRegistry] = None
+_shared_lock = threading.Lock()
+
+def get_metrics() -> MetricsRegistry:
+    """The process-wide metrics registry"""
+    global _shared_metrics
+    with _shared_lock:
+        if _shared_metrics is None:
+            _shared_metrics = MetricsRegistry()
+        return _shared_metrics
+
+def bind_traces(function):
+    """`function` counting toward the traces open here, wherever it is called.
+
+    Threads do not inherit context variables; wrap what is handed to a
+    thread or executor so its spans and counters land in the caller's trace.
+    """
+    runs = _current_runs.get()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _current_runs.set(runs)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current_runs.reset(token)
+    return wrapper
+
+def timed(stage: str):
+    """Decorator form of `span` for a whole function or method"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with get_metrics().span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -1,14 +1,25 @@
-from typing import List, Dict, Any
-from langchain.schema import Document
+import logging
+import time
+from typing import List, Dict, Any, Iterator, Optional
+from langchain.schema import BaseRetriever, Document
 from langchain.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
 # from langchain_community.llms import Groq
 from langchain_groq import ChatGroq
 from config import Config
+from src.answer_cache import AnswerCache
+from src.metrics import get_metrics
+from src.rate_limiter import call_with_retry
+from src.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Returned without an LLM call when no chunk passes the similarity threshold
+NOT_FOUND_ANSWER = "I couldn't find information about this in the document."
 
 class SummarizedRAGChain:
-    def __init__(self):
-        self.llm = ChatGroq(
+    def __init__(self, llm=None):
+        self.llm = llm or ChatGroq(
             groq_api_key=Config.GROQ_API_KEY,
             model_name=Config.GROQ_MODEL,
             temperature=0.1
@@ -37,11 +48,14 @@ class SummarizedRAGChain:
         )
     
     def create_retrieval_chain(self, vector_store, store_type: str = "memory"):
-        """Create retrieval QA chain"""
-        retriever = vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": Config.TOP_K_RETRIEVAL}
-        )
+        """Create retrieval QA chain from a vector store or a ready-made retriever"""
+        if isinstance(vector_store, BaseRetriever):
+            retriever = vector_store
+        else:
+            retriever = vector_store.as_retriever(
+                search_type="similarity",
+                search_kwargs={"k": Config.TOP_K_RETRIEVAL}
+            )
         
         qa_chain = RetrievalQA.from_chain_type(
             llm=self.llm,
@@ -53,22 +67,182 @@ class SummarizedRAGChain:
         
         return qa_chain
     
-    def query_documents(self, question: str, qa_chain) -> Dict[str, Any]:
+    def _generate(self, qa_chain, source_documents: List[Document], question: str, prompt: str) -> str:
+        """Run the answer chain, retrying 429/5xx errors as summaries do"""
+        metrics = get_metrics()
+        prompt_tokens = count_tokens(prompt)
+
+        def attempt():
+            metrics.inc("llm_requests_total", purpose="answer")
+            metrics.inc("llm_prompt_tokens_total", prompt_tokens, purpose="answer")
+            start = time.perf_counter()
+            try:
+                return qa_chain.combine_documents_chain.run(input_documents=source_documents, question=question)
+            finally:
+                metrics.observe("llm_request_seconds", time.perf_counter() - start, purpose="answer")
+
+        try:
+            answer = call_with_retry(attempt, purpose="answer")
+        except Exception:
+            metrics.inc("llm_failures_total", purpose="answer")
+            raise
+        metrics.inc("llm_completion_tokens_total", count_tokens(answer), purpose="answer")
+        return answer
+
+    def _stream_llm(self, prompt: str) -> Iterator[Any]:
+        """Stream the answer's chunks, retrying 429/5xx errors until the first chunk arrives.
+
+        After that the caller already has part of the answer, so an error
+        ends the request as a failure instead of starting it again.
+        """
+        metrics = get_metrics()
+        prompt_tokens = count_tokens(prompt)
+
+        def attempt():
+            metrics.inc("llm_requests_total", purpose="answer")
+            metrics.inc("llm_prompt_tokens_total", prompt_tokens, purpose="answer")
+            start = time.perf_counter()
+            try:
+                stream = iter(self.llm.stream(prompt))
+                return start, stream, next(stream, None)
+            except Exception:
+                metrics.observe("llm_request_seconds", time.perf_counter() - start, purpose="answer")
+                raise
+
+        try:
+            start, stream, first = call_with_retry(attempt, purpose="answer")
+        except Exception:
+            metrics.inc("llm_failures_total", purpose="answer")
+            raise
+        try:
+            if first is not None:
+                yield first
+                yield from stream
+        except Exception:
+            metrics.inc("llm_failures_total", purpose="answer")
+            raise
+        finally:
+            metrics.observe("llm_request_seconds", time.perf_counter() - start, purpose="answer")
+
+    def query_documents(self, question: str, qa_chain, answer_cache: Optional[AnswerCache] = None) -> Dict[str, Any]:
         """Query the RAG system"""
+        metrics = get_metrics()
+        start = time.perf_counter()
         try:
-            result = qa_chain({"query": question})
+            # Retrieve first so empty results and cached answers skip the LLM call
+            with metrics.span("retrieve"):
+                source_documents = qa_chain.retriever.get_relevant_documents(question)
+            if not source_documents:
+                metrics.observe("query_seconds", time.perf_counter() - start, answered_by="not_found")
+                return {"answer": NOT_FOUND_ANSWER, "source_documents": [], "success": True}
+            
+            embedding = None
+            if answer_cache is not None:
+                chunk_ids = AnswerCache.chunk_ids_of(source_documents)
+                with metrics.span("answer_cache"):
+                    cached, embedding = answer_cache.lookup(question, chunk_ids)
+                if cached is not None:
+                    metrics.observe("query_seconds", time.perf_counter() - start, answered_by="cache")
+                    return cached
             
+            context = "\n\n".join(doc.page_content for doc in source_documents)
+            prompt = self.qa_prompt.format(context=context, question=question)
+            with metrics.span("generate"):
+                answer = self._generate(qa_chain, source_documents, question, prompt)
+            metrics.observe("query_seconds", time.perf_counter() - start, answered_by="llm")
             response = {
-                "answer": result["result"],
-                "source_documents": result["source_documents"],
+                "answer": answer,
+                "source_documents": source_documents,
                 "success": True
             }
+            if answer_cache is not None:
+                answer_cache.store(question, chunk_ids, response, embedding)
             
             return response
             
         except Exception as e:
+            metrics.inc("query_errors_total")
             return {
                 "answer": f"Error processing query: {str(e)}",
                 "source_documents": [],
                 "success": False
+            }
+    
+    def stream_query(self, question: str, retriever,
+                     answer_cache: Optional[AnswerCache] = None) -> Iterator[Dict[str, Any]]:
+        """Stream the answer token by token.
+
+        Yields {"type": "token", "content": ...} events while the LLM
+        generates, then one {"type": "done", ...} event carrying the full
+        answer, the source documents and timings. A cache hit is yielded as
+        a single token event.
+        """
+        metrics = get_metrics()
+        start = time.perf_counter()
+        first_token_at = None
+        parts = []
+        try:
+            with metrics.span("retrieve"):
+                source_documents = retriever.get_relevant_documents(question)
+            if not source_documents:
+                total_seconds = time.perf_counter() - start
+                logger.info("No context passed the similarity threshold: total=%.3fs", total_seconds)
+                metrics.observe("query_seconds", total_seconds, answered_by="not_found")
+                yield {"type": "token", "content": NOT_FOUND_ANSWER}
+                yield {"type": "done", "answer": NOT_FOUND_ANSWER, "source_documents": [], "success": True,
+                       "ttft_seconds": total_seconds, "total_seconds": total_seconds}
+                return
+            
+            embedding = None
+            if answer_cache is not None:
+                chunk_ids = AnswerCache.chunk_ids_of(source_documents)
+                with metrics.span("answer_cache"):
+                    cached, embedding = answer_cache.lookup(question, chunk_ids)
+                if cached is not None:
+                    total_seconds = time.perf_counter() - start
+                    logger.info("Query answered from cache: total=%.3fs", total_seconds)
+                    metrics.observe("query_seconds", total_seconds, answered_by="cache")
+                    yield {"type": "token", "content": cached["answer"]}
+                    yield {**cached, "type": "done", "cached": True,
+                           "ttft_seconds": total_seconds, "total_seconds": total_seconds}
+                    return
+            
+            context = "\n\n".join(doc.page_content for doc in source_documents)
+            prompt = self.qa_prompt.format(context=context, question=question)
+            
+            # Includes the time the caller spends rendering each token
+            with metrics.span("generate"):
+                for chunk in self._stream_llm(prompt):
+                    token = getattr(chunk, "content", chunk)
+                    if not token:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(token)
+                    yield {"type": "token", "content": token}
+            
+            total_seconds = time.perf_counter() - start
+            ttft_seconds = (first_token_at - start) if first_token_at else total_seconds
+            logger.info("Query answered: ttft=%.3fs total=%.3fs", ttft_seconds, total_seconds)
+            metrics.inc("llm_completion_tokens_total", count_tokens("".join(parts)), purpose="answer")
+            metrics.observe("query_seconds", total_seconds, answered_by="llm")
+            metrics.observe("query_ttft_seconds", ttft_seconds)
+            
+            response = {
+                "answer": "".join(parts),
+                "source_documents": source_documents,
+                "success": True
+            }
+            if answer_cache is not None:
+                answer_cache.store(question, chunk_ids, response, embedding)
+            
+            yield {**response, "type": "done", "ttft_seconds": ttft_seconds, "total_seconds": total_seconds}
+            
+        except Exception as e:
+            metrics.inc("query_errors_total")
+            yield {
+                "type": "done",
+                "answer": f"Error processing query: {str(e)}",
+                "source_documents": [],
+                "success": False
             }
\ No newline at end of file
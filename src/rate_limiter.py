@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+from config import Config
+from src.metrics import get_metrics
+
+class TokenBucket:
+    """Thread-safe token bucket that refills continuously"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+        self._updated = now
+    
+    def acquire(self, amount: float = 1.0):
+        """Block until `amount` tokens are available, then take them"""
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.refill_per_second
+            time.sleep(wait)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one LLM account"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+    
+    def acquire(self, token_count: int):
+        """Wait for one request slot and `token_count` tokens"""
+        self.requests.acquire(1)
+        self.tokens.acquire(token_count)
+
+_shared_rate_limiter = None
+_shared_lock = threading.Lock()
+
+def get_shared_rate_limiter() -> RateLimiter:
+    """Rate limiter shared by every summarizer in the process"""
+    global _shared_rate_limiter
+    with _shared_lock:
+        if _shared_rate_limiter is None:
+            _shared_rate_limiter = RateLimiter(
+                Config.GROQ_REQUESTS_PER_MINUTE,
+                Config.GROQ_TOKENS_PER_MINUTE
+            )
+        return _shared_rate_limiter
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for rate-limit (429) and server-side (5xx) errors"""
+    status = _status_code(error)
+    if status is None:
+        # Connection errors and timeouts from the Groq client carry no status
+        return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+    return status == 429 or 500 <= status < 600
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def call_with_retry(fn: Callable[[], Any], max_retries: int = None,
+                    base_delay: float = None, max_delay: float = None, purpose: str = None) -> Any:
+    """Call `fn`, retrying retryable errors with full-jitter exponential backoff.
+
+    Retries are counted in `llm_retries_total`, labelled with `purpose` if given.
+    """
+    max_retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+    base_delay = Config.LLM_RETRY_BASE_DELAY if base_delay is None else base_delay
+    max_delay = Config.LLM_RETRY_MAX_DELAY if max_delay is None else max_delay
+    
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            get_metrics().inc("llm_retries_total", **({"purpose": purpose} if purpose else {}))
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+import numpy as np
+from langchain.schema import Document
+from sentence_transformers import CrossEncoder
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class CrossEncoderReranker:
+    """Re-score retrieval candidates with a small local cross-encoder.
+
+    Candidate pairs are split into batches scored concurrently on a thread
+    pool (the model releases the GIL during inference), and every score is
+    cached by question and chunk text. If scoring does not finish within
+    the latency budget, `rerank` returns None and the caller keeps the
+    vector order; batches still queued are cancelled so they do not delay
+    later requests, and those already running finish in the background
+    and land in the cache for the next time.
+    """
+
+    def __init__(self, model_name: str = None, batch_size: int = None, max_workers: int = None,
+                 latency_budget_ms: float = None, cache_size: int = None):
+        self.model_name = model_name or Config.RERANK_MODEL
+        self.batch_size = batch_size or Config.RERANK_BATCH_SIZE
+        self.latency_budget = (latency_budget_ms or Config.RERANK_LATENCY_BUDGET_MS) / 1000.0
+        self.cache_size = cache_size or Config.RERANK_CACHE_MAX_ENTRIES
+        self.model = CrossEncoder(self.model_name, device="cpu")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or Config.RERANK_WORKERS,
+                                            thread_name_prefix="reranker")
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "pairs_scored": 0, "cache_hits": 0, "fallbacks": 0}
+
+    @staticmethod
+    def _key(question: str, document: Document) -> str:
+        digest = hashlib.sha1(" ".join(question.lower().split()).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(document.page_content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _score_batch(self, question: str, documents: List[Document], keys: List[str]) -> np.ndarray:
+        pairs = [(question, doc.page_content) for doc in documents]
+        scores = np.asarray(self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False),
+                            dtype=np.float32)
+        with self._lock:
+            self.stats["pairs_scored"] += len(pairs)
+            for key, score in zip(keys, scores):
+                self._cache[key] = float(score)
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+
+    def rerank(self, question: str, documents: List[Document]) -> Optional[List[int]]:
+        """Indices of `documents`, best first; None if the latency budget ran out"""
+        deadline = time.perf_counter() + self.latency_budget
+        keys = [self._key(question, doc) for doc in documents]
+        scores: Dict[int, float] = {}
+        with self._lock:
+            self.stats["requests"] += 1
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+            self.stats["cache_hits"] += len(scores)
+
+        missing = [i for i in range(len(documents)) if i not in scores]
+        batches = [missing[start:start + self.batch_size] for start in range(0, len(missing), self.batch_size)]
+        futures = [
+            (batch, self._executor.submit(self._score_batch, question,
+                                          [documents[i] for i in batch], [keys[i] for i in batch]))
+            for batch in batches
+        ]
+        try:
+            for batch, future in futures:
+                batch_scores = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+                scores.update(zip(batch, batch_scores.tolist()))
+        except FutureTimeoutError:
+            self._give_up(futures)
+            logger.info("Re-ranking exceeded %.0fms budget, keeping vector order", self.latency_budget * 1000)
+            return None
+        except Exception as e:
+            self._give_up(futures)
+            logger.warning("Re-ranking failed, keeping vector order: %s", e)
+            return None
+
+        return sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+
+    def _give_up(self, futures):
+        for _, future in futures:
+            future.cancel()
+        with self._lock:
+            self.stats["fallbacks"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "cached_scores": len(self._cache)}
+
+_shared_reranker: Optional[CrossEncoderReranker] = None
+_shared_lock = threading.Lock()
+
+def get_reranker() -> CrossEncoderReranker:
+    """Load the cross-encoder on first use and reuse it afterwards"""
+    global _shared_reranker
+    with _shared_lock:
+        if _shared_reranker is None:
+            _shared_reranker = CrossEncoderReranker()
+        return _shared_reranker
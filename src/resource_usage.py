@@ -0,0 +1,57 @@
+import os
+import resource
+import sys
+import threading
+from typing import Dict
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process right now"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # No procfs (macOS); the peak is the best available figure
+        return peak_rss_bytes()
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class RSSSampler:
+    """Highest current RSS seen by a background thread while a with-block runs.
+
+    ru_maxrss never goes down, so once the process has peaked it says
+    nothing about one upload or stage; sampling the current RSS does.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.before = self.peak = self.after = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_bytes())
+    
+    def __enter__(self):
+        self.before = self.peak = current_rss_bytes()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.after = current_rss_bytes()
+        self.peak = max(self.peak, self.after)
+    
+    def to_stats(self) -> Dict[str, float]:
+        return {
+            "rss_before_mb": round(self.before / 2 ** 20, 1),
+            "rss_peak_mb": round(self.peak / 2 ** 20, 1),
+            "rss_after_mb": round(self.after / 2 ** 20, 1),
+        }
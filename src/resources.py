@@ -0,0 +1,92 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from langchain_groq import ChatGroq
+from config import Config
+from src.answer_cache import AnswerCache
+from src.document_processor import DocumentProcessor
+from src.fakes import FakeChatGroq
+from src.rag_chain import SummarizedRAGChain
+from src.summarizer import Summarizer
+
+# Process-wide objects shared by every Streamlit session and rerun. Each
+# ChatGroq keeps its own pooled HTTP client, so reusing it also reuses the
+# open TLS connections to the Groq API.
+_resources: Dict[Hashable, Any] = {}
+_lock = threading.RLock()
+
+def current_api_key() -> Optional[str]:
+    """Groq key from the environment (set by the sidebar) or the .env config"""
+    return os.environ.get("GROQ_API_KEY") or Config.GROQ_API_KEY
+
+def _key_fingerprint() -> str:
+    # Cache keys hold a hash, not the secret itself
+    return hashlib.sha256((current_api_key() or "").encode("utf-8")).hexdigest()[:16]
+
+def _get_or_create(key: Hashable, factory: Callable[[], Any]) -> Any:
+    with _lock:
+        resource = _resources.get(key)
+        if resource is None:
+            resource = factory()
+            _resources[key] = resource
+        return resource
+
+def _drop_stale_clients(fingerprint: str):
+    """Forget clients built for an API key that is no longer current"""
+    with _lock:
+        for key in [k for k in _resources if len(k) > 1 and k[1] not in (fingerprint, None)]:
+            del _resources[key]
+
+def get_llm(temperature: Optional[float] = None) -> ChatGroq:
+    """Shared ChatGroq client for the current API key, model and temperature"""
+    if Config.LLM_PROVIDER == "fake":
+        # Offline stub for the API server, batch ingestion and benchmarks
+        return _get_or_create(
+            ("llm", None, "fake", temperature),
+            lambda: FakeChatGroq(latency=Config.FAKE_LLM_LATENCY, tokens_per_second=Config.FAKE_LLM_TOKENS_PER_SECOND)
+        )
+    fingerprint = _key_fingerprint()
+    _drop_stale_clients(fingerprint)
+    
+    def build():
+        kwargs = {"groq_api_key": current_api_key(), "model_name": Config.GROQ_MODEL}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        return ChatGroq(**kwargs)
+    
+    return _get_or_create(("llm", fingerprint, Config.GROQ_MODEL, temperature), build)
+
+def get_summarizer() -> Summarizer:
+    fingerprint = _key_fingerprint()
+    return _get_or_create(("summarizer", fingerprint), lambda: Summarizer(llm=get_llm()))
+
+def get_rag_chain() -> SummarizedRAGChain:
+    fingerprint = _key_fingerprint()
+    return _get_or_create(("rag_chain", fingerprint), lambda: SummarizedRAGChain(llm=get_llm(0.1)))
+
+_answer_caches: "OrderedDict[str, AnswerCache]" = OrderedDict()
+
+def get_answer_cache(doc_id: str) -> Optional[AnswerCache]:
+    """Answer cache for one document, shared by every session querying it"""
+    if not Config.ANSWER_CACHE_ENABLED or not doc_id:
+        return None
+    # Imported here so the embedding model only loads when a cache is used
+    from src.embeddings import get_embeddings
+    with _lock:
+        cache = _answer_caches.get(doc_id)
+        if cache is None:
+            cache = AnswerCache(get_embeddings().embed_query)
+            _answer_caches[doc_id] = cache
+            while len(_answer_caches) > Config.ANSWER_CACHE_MAX_DOCUMENTS:
+                _answer_caches.popitem(last=False)
+        _answer_caches.move_to_end(doc_id)
+        return cache
+
+def get_document_processor(chunk_size: int = Config.CHUNK_SIZE,
+                           chunk_overlap: int = Config.CHUNK_OVERLAP) -> DocumentProcessor:
+    return _get_or_create(
+        ("document_processor", None, chunk_size, chunk_overlap),
+        lambda: DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    )
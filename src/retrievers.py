@@ -0,0 +1,243 @@
+from typing import Any, Dict, List, Optional, Tuple
+from langchain.schema import BaseRetriever, Document
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.pydantic_v1 import Field
+from src.metrics import get_metrics
+from src.tokens import count_tokens
+
+class ChunkDocStore:
+    """Original chunks stored in a flat list indexed by original_chunk_id"""
+
+    def __init__(self, documents: List[Document] = None):
+        self._documents: List[Optional[Document]] = []
+        if documents:
+            self.add_documents(documents)
+    
+    def add_documents(self, documents: List[Document]):
+        for doc in documents:
+            chunk_id = doc.metadata["chunk_id"]
+            if chunk_id >= len(self._documents):
+                self._documents.extend([None] * (chunk_id + 1 - len(self._documents)))
+            self._documents[chunk_id] = doc
+    
+    def get(self, chunk_id: int) -> Optional[Document]:
+        if 0 <= chunk_id < len(self._documents):
+            return self._documents[chunk_id]
+        return None
+    
+    def get_parents(self, summaries: List[Document]) -> List[Document]:
+        """Map summary hits to their original chunks, keeping first-hit order.
+
+        Summary tree nodes above the leaves have no single parent chunk and
+        are returned as they are.
+        """
+        seen = set()
+        parents = []
+        for summary in summaries:
+            if summary.metadata.get("tree_level", 0) > 0:
+                node_id = summary.metadata["node_id"]
+                if node_id not in seen:
+                    seen.add(node_id)
+                    parents.append(summary)
+                continue
+            chunk_id = summary.metadata.get("original_chunk_id")
+            if chunk_id is None or chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            parent = self.get(chunk_id)
+            if parent is not None:
+                parents.append(parent)
+        return parents
+    
+    def documents(self) -> List[Document]:
+        return [doc for doc in self._documents if doc is not None]
+    
+    def __len__(self) -> int:
+        return sum(doc is not None for doc in self._documents)
+
+class CorpusDocStore(ChunkDocStore):
+    """Original chunks of many documents, addressed by doc_id and chunk_id"""
+
+    def __init__(self):
+        super().__init__()
+        self._stores: Dict[str, ChunkDocStore] = {}
+    
+    def add_document(self, doc_id: str, documents: List[Document]):
+        self._stores[doc_id] = ChunkDocStore(documents)
+    
+    def get(self, chunk_id: int, doc_id: str = None) -> Optional[Document]:
+        store = self._stores.get(doc_id)
+        return store.get(chunk_id) if store is not None else None
+    
+    def get_parents(self, summaries: List[Document]) -> List[Document]:
+        seen = set()
+        parents = []
+        for summary in summaries:
+            doc_id = summary.metadata.get("doc_id")
+            if summary.metadata.get("tree_level", 0) > 0:
+                key = (doc_id, summary.metadata["node_id"])
+                parent = summary
+            else:
+                key = (doc_id, summary.metadata.get("original_chunk_id"))
+                parent = self.get(key[1], doc_id) if key[1] is not None else None
+            if parent is None or key in seen:
+                continue
+            seen.add(key)
+            parents.append(parent)
+        return parents
+    
+    def documents(self) -> List[Document]:
+        return [doc for store in self._stores.values() for doc in store.documents()]
+    
+    def __len__(self) -> int:
+        return sum(len(store) for store in self._stores.values())
+
+def _fusion_key(doc: Document):
+    # doc_id is only set in the multi-document corpus
+    if doc.metadata.get("tree_level", 0) > 0:
+        return "node", doc.metadata.get("doc_id"), doc.metadata["node_id"]
+    return "chunk", doc.metadata.get("doc_id"), doc.metadata.get("chunk_id")
+
+def _cosine_similarity(distance: float) -> float:
+    # FAISS returns squared L2 distances; embeddings are unit length
+    return 1.0 - distance / 2.0
+
+class SummaryParentRetriever(BaseRetriever):
+    """Search the summary vectors (all tree levels), return the original chunks they point to.
+
+    With `score_threshold` set, only parents whose best summary reaches
+    that cosine similarity are kept; `score_drop_off` also drops hits that
+    fall that far below the best one, and `context_token_budget` stops
+    adding documents once the context would exceed it. k is then an upper
+    bound rather than a fixed count, and an empty result means nothing in
+    the document is relevant. A `reranker` re-orders a wider candidate set
+    before that selection.
+    """
+
+    vectorstore: Any
+    docstore: ChunkDocStore
+    search_kwargs: Dict[str, Any] = Field(default_factory=dict)
+    # Extra summary hits fetched so that duplicates still leave k parents
+    fetch_multiplier: int = 2
+    score_threshold: Optional[float] = None
+    score_drop_off: Optional[float] = None
+    context_token_budget: Optional[int] = None
+    # Optional cross-encoder applied to the top `rerank_candidates` before selection
+    reranker: Any = None
+    rerank_candidates: int = 30
+
+    class Config:
+        arbitrary_types_allowed = True
+    
+    def _dense_hits(self, query: str, fetch_k: int) -> List[Tuple[Document, float]]:
+        """Parents of the best summary hits, each with its best summary's similarity"""
+        hits = self.vectorstore.similarity_search_with_score(
+            query, **{**self.search_kwargs, "k": fetch_k * self.fetch_multiplier}
+        )
+        seen = set()
+        parents = []
+        for summary, distance in hits:
+            for parent in self.docstore.get_parents([summary]):
+                key = _fusion_key(parent)
+                if key not in seen:
+                    seen.add(key)
+                    parents.append((parent, _cosine_similarity(distance)))
+        return parents[:fetch_k]
+    
+    def _candidate_count(self, k: int) -> int:
+        return max(k, self.rerank_candidates) if self.reranker is not None else k
+    
+    def _rerank(self, query: str, ranked: List[Tuple[Document, Optional[float]]]
+                ) -> List[Tuple[Document, Optional[float]]]:
+        if self.reranker is None or len(ranked) < 2:
+            return ranked
+        candidates = ranked[:self.rerank_candidates]
+        with get_metrics().span("rerank"):
+            order = self.reranker.rerank(query, [doc for doc, _ in candidates])
+        if order is None:
+            return ranked
+        return [candidates[i] for i in order] + ranked[self.rerank_candidates:]
+    
+    def _select(self, ranked: List[Tuple[Document, Optional[float]]], k: int) -> List[Document]:
+        """Adaptive k: apply the score threshold, drop-off and context budget in rank order.
+
+        A similarity of None marks a strong exact-term (lexical) hit, which
+        is kept regardless of its vector score.
+        """
+        scores = [score for _, score in ranked if score is not None]
+        best = max(scores) if scores else None
+        selected = []
+        used_tokens = 0
+        for doc, score in ranked:
+            if len(selected) >= k:
+                break
+            if score is not None:
+                if self.score_threshold is not None and score < self.score_threshold:
+                    continue
+                if self.score_drop_off is not None and score < best - self.score_drop_off:
+                    continue
+            tokens = doc.metadata.get("token_count") or count_tokens(doc.page_content)
+            if selected and self.context_token_budget and used_tokens + tokens > self.context_token_budget:
+                break
+            selected.append(doc)
+            used_tokens += tokens
+        return selected
+    
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        k = self.search_kwargs.get("k", 4)
+        ranked = self._dense_hits(query, self._candidate_count(k))
+        return self._select(self._rerank(query, ranked), k)
+
+class HybridRetriever(SummaryParentRetriever):
+    """Fuse summary-vector hits with BM25 hits on the original chunks.
+
+    Both lists are merged with weighted reciprocal rank fusion, so a chunk
+    that only matches on an exact term (a dataset name, an equation or
+    figure number) can still make the top k. Chunks keep their vector
+    similarity for the threshold; only a strong BM25 match, scoring at
+    least `lexical_min_score` of the best possible score for the query,
+    exempts a chunk from it. Chunks BM25 found weakly and the dense search
+    did not return are dropped.
+    """
+
+    lexical_index: Any
+    dense_weight: float = 1.0
+    lexical_weight: float = 1.0
+    rrf_k: int = 60
+    fetch_k: int = 20
+    lexical_min_score: float = 0.3
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        k = self.search_kwargs.get("k", 4)
+        fetch_k = max(self.fetch_k, self._candidate_count(k))
+        dense = self._dense_hits(query, fetch_k)
+        lexical_hits = self.lexical_index.search(query, fetch_k)
+        lexical = [self.docstore.get(chunk_id) for chunk_id, _ in lexical_hits]
+        floor = self.lexical_min_score * self.lexical_index.best_possible_score(query) if lexical_hits else 0.0
+        
+        scores: Dict[Any, float] = {}
+        documents: Dict[Any, Document] = {}
+        similarities: Dict[Any, Optional[float]] = {}
+        for doc, similarity in dense:
+            similarities[_fusion_key(doc)] = similarity
+        strong_lexical = set()
+        for doc, (_, score) in zip(lexical, lexical_hits):
+            if doc is not None and score >= floor:
+                strong_lexical.add(_fusion_key(doc))
+        
+        for weight, ranked in ((self.dense_weight, [doc for doc, _ in dense]), (self.lexical_weight, lexical)):
+            for rank, doc in enumerate(d for d in ranked if d is not None):
+                key = _fusion_key(doc)
+                documents.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + weight / (self.rrf_k + rank + 1)
+        
+        # A small document's dense hits include every chunk, so a strong exact-term match
+        # must exempt a chunk even with a vector score; weak matches never do
+        ranked_keys = [key for key in sorted(scores, key=scores.get, reverse=True)
+                       if key in similarities or key in strong_lexical]
+        ranked = [(documents[key], None if key in strong_lexical else similarities[key]) for key in ranked_keys]
+        return self._select(self._rerank(query, ranked), k)
@@ -1,32 +1,63 @@
-from typing import List, Dict
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple
 from langchain.schema import Document
-from langchain.chains.summarize import load_summarize_chain
 from langchain.prompts import PromptTemplate
 # from langchain_community.llms import Groq
 from langchain_groq import ChatGroq # Or just Groq, depending on your specific use case
 from config import Config
+from src.metrics import bind_traces, get_metrics, timed
+from src.rate_limiter import RateLimiter, call_with_retry, get_shared_rate_limiter
+from src.summary_cache import SummaryCache, get_shared_summary_cache
+from src.tokens import count_tokens
 
-class Summarizer:
-    def __init__(self):
-        self.llm = ChatGroq(
-            groq_api_key=Config.GROQ_API_KEY,
-            model_name=Config.GROQ_MODEL
-        )
-        
-        # Define summarization prompts
-        self.map_prompt = PromptTemplate(
-            template="""
+logger = logging.getLogger(__name__)
+
+# Per-chunk prompt used for the summary index
+CHUNK_PROMPT = PromptTemplate(
+    template="""
+            Summarize the following text chunk from an academic document in 2-3 sentences.
+            Focus on the core content and key information:
+            
+            {text}
+            
+            Summary:""",
+    input_variables=["text"]
+)
+
+# Multi-chunk prompt used in batch mode; one JSON object per chunk
+BATCH_PROMPT = PromptTemplate(
+    template="""
+            Summarize each of the following text chunks from an academic document in 2-3 sentences.
+            Focus on the core content and key information of each chunk.
+            
+            {chunks}
+            
+            Respond with ONLY a JSON array containing one object per chunk, in the form
+            [{{"chunk_id": <id>, "summary": "<summary>"}}]
+            
+            JSON:""",
+    input_variables=["chunks"]
+)
+
+# Define summarization prompts
+MAP_PROMPT = PromptTemplate(
+    template="""
             Write a concise summary of the following text excerpt from an academic document.
             Focus on the key points, findings, methodologies, and conclusions.
             
             TEXT: {text}
             
             CONCISE SUMMARY:""",
-            input_variables=["text"]
-        )
-        
-        self.combine_prompt = PromptTemplate(
-            template="""
+    input_variables=["text"]
+)
+
+COMBINE_PROMPT = PromptTemplate(
+    template="""
             Create a comprehensive summary by synthesizing the following excerpts and their summaries.
             The summary should capture the main themes, methodologies, results, and conclusions.
             
@@ -34,66 +65,251 @@ class Summarizer:
             {text}
             
             COMPREHENSIVE SUMMARY:""",
-            input_variables=["text"]
+    input_variables=["text"]
+)
+
+class Summarizer:
+    def __init__(self, llm=None, max_concurrency: int = None, rate_limiter: RateLimiter = None,
+                 cache: SummaryCache = None, use_cache: bool = None):
+        self.llm = llm or ChatGroq(
+            groq_api_key=Config.GROQ_API_KEY,
+            model_name=Config.GROQ_MODEL
         )
+        self.max_concurrency = max_concurrency or Config.SUMMARY_MAX_CONCURRENCY
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+        
+        if use_cache is None:
+            use_cache = Config.SUMMARY_CACHE_ENABLED
+        self.cache = (cache or get_shared_summary_cache()) if use_cache else None
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
+        
+        self.chunk_prompt = CHUNK_PROMPT
+        self.batch_prompt = BATCH_PROMPT
+        self.map_prompt = MAP_PROMPT
+        self.combine_prompt = COMBINE_PROMPT
     
-    def summarize_chunks(self, chunks: List[Document]) -> List[Document]:
-        """Summarize document chunks using LLM"""
+    def summarize_chunks(self, chunks: List[Document], embeddings=None) -> List[Document]:
+        """Summarize document chunks into a multi-level summary tree.
+
+        Returns the per-chunk summaries followed by every higher tree node,
+        level by level up to the root (or the top nodes of the last level
+        when SUMMARY_TREE_MAX_LEVELS is reached).
+        """
         try:
-            # Create summarization chain
-            summary_chain = load_summarize_chain(
-                llm=self.llm,
-                chain_type="map_reduce",
-                map_prompt=self.map_prompt,
-                combine_prompt=self.combine_prompt,
-                verbose=False
-            )
+            from src.summary_tree import SummaryTreeBuilder
+            if embeddings is None:
+                from src.embedding_cache import get_cached_embeddings
+                embeddings = get_cached_embeddings()
             
-            # Generate summaries
-            summary_result = summary_chain.run(chunks)
-            
-            # Create summary documents
-            summary_doc = Document(
-                page_content=summary_result,
-                metadata={"type": "summary", "source": "llm_summarization"}
-            )
-            
-            return [summary_doc]
+            leaves = self.create_summarized_chunks(chunks)
+            return leaves + SummaryTreeBuilder(self, embeddings).build(leaves)
             
         except Exception as e:
             raise Exception(f"Error in summarization: {str(e)}")
     
-    def create_summarized_chunks(self, chunks: List[Document]) -> List[Document]:
-        """Create summarized versions of chunks for embedding"""
-        summarized_chunks = []
+    def combine_summaries(self, texts: List[str]) -> str:
+        """Synthesize several summaries into one, falling back to their concatenation"""
+        text = "\n\n".join(texts)
+        key = SummaryCache.make_key(text, Config.GROQ_MODEL, self.combine_prompt.template)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        try:
+            summary = self._invoke_llm(self.combine_prompt.format(text=text))
+        except Exception:
+            return text
+        if self.cache is not None:
+            self.cache.put(key, summary)
+        return summary
+    
+    def _invoke_llm(self, prompt: str, summaries: int = 1) -> str:
+        """Invoke the LLM under the shared rate limit, retrying 429/5xx errors.
+        
+        The limiter reserves room for `summaries` completions, one per chunk
+        of a batch prompt.
+        """
+        prompt_tokens = count_tokens(prompt)
+        metrics = get_metrics()
+        
+        def attempt():
+            self.rate_limiter.acquire(prompt_tokens + summaries * Config.SUMMARY_LENGTH)
+            with self._usage_lock:
+                self.usage["requests"] += 1
+                self.usage["prompt_tokens"] += prompt_tokens
+            metrics.inc("llm_requests_total", purpose="summary")
+            metrics.inc("llm_prompt_tokens_total", prompt_tokens, purpose="summary")
+            start = time.perf_counter()
+            try:
+                return self.llm.invoke(prompt)
+            finally:
+                metrics.observe("llm_request_seconds", time.perf_counter() - start, purpose="summary")
+        
+        try:
+            response = call_with_retry(attempt, purpose="summary")
+        except Exception:
+            metrics.inc("llm_failures_total", purpose="summary")
+            raise
+        text = getattr(response, "content", response).strip()
+        completion_tokens = count_tokens(text)
+        with self._usage_lock:
+            self.usage["completion_tokens"] += completion_tokens
+        metrics.inc("llm_completion_tokens_total", completion_tokens, purpose="summary")
+        return text
+    
+    def _make_summary_doc(self, index: int, chunk: Document, summary: str) -> Document:
+        summary_doc = Document(
+            page_content=summary,
+            metadata=chunk.metadata.copy()
+        )
+        summary_doc.metadata["is_summary"] = True
+        summary_doc.metadata["original_chunk_id"] = index
+        return summary_doc
+    
+    def _cache_key(self, chunk: Document, prompt: PromptTemplate) -> str:
+        return SummaryCache.make_key(chunk.page_content, Config.GROQ_MODEL, prompt.template)
+    
+    def _lookup_cached(self, chunks: List[Document]) -> Dict[int, str]:
+        """Find cached summaries from either the single-chunk or the batch prompt"""
+        keys = {
+            i: [self._cache_key(chunk, self.chunk_prompt), self._cache_key(chunk, self.batch_prompt)]
+            for i, chunk in enumerate(chunks)
+        }
+        found = self.cache.get_many(key for chunk_keys in keys.values() for key in chunk_keys)
+        
+        cached = {}
+        for i, chunk_keys in keys.items():
+            for key in chunk_keys:
+                if key in found:
+                    cached[i] = found[key]
+                    break
+        
+        self.cache.record(hits=len(cached), misses=len(chunks) - len(cached))
+        return cached
+    
+    def _summarize_chunk(self, index: int, chunk: Document) -> Document:
+        """Summarize one chunk, falling back to the original text on failure"""
+        try:
+            summary = self._invoke_llm(self.chunk_prompt.format(text=chunk.page_content))
+            if self.cache:
+                self.cache.put(self._cache_key(chunk, self.chunk_prompt), summary)
+            return self._make_summary_doc(index, chunk, summary)
+            
+        except Exception as e:
+            logger.warning("Error summarizing chunk %s, keeping its original text: %s", index, e)
+            # Fallback: use original chunk
+            fallback_doc = Document(
+                page_content=chunk.page_content,
+                metadata=chunk.metadata.copy()
+            )
+            fallback_doc.metadata["is_summary"] = False
+            fallback_doc.metadata["original_chunk_id"] = index
+            return fallback_doc
+    
+    def _format_batch_chunk(self, index: int, chunk: Document) -> str:
+        return f'<chunk id="{index}">\n{chunk.page_content}\n</chunk>'
+    
+    def _pack_batches(self, chunks: List[Tuple[int, Document]]) -> List[List[Tuple[int, Document]]]:
+        """Greedily pack consecutive chunks into prompts under the token budget"""
+        overhead = count_tokens(self.batch_prompt.format(chunks=""))
+        batches, current, used = [], [], overhead
+        
+        for i, chunk in chunks:
+            tokens = count_tokens(self._format_batch_chunk(i, chunk)) + 2
+            if current and (used + tokens > Config.SUMMARY_BATCH_TOKEN_BUDGET
+                            or len(current) >= Config.SUMMARY_BATCH_MAX_CHUNKS):
+                batches.append(current)
+                current, used = [], overhead
+            current.append((i, chunk))
+            used += tokens
         
-        for i, chunk in enumerate(chunks):
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _parse_batch_response(self, text: str) -> Dict[int, str]:
+        """Parse a JSON array of {chunk_id, summary} objects; bad entries are skipped"""
+        match = re.search(r"\[.*\]", text, re.DOTALL)
+        if not match:
+            return {}
+        try:
+            items = json.loads(match.group(0))
+        except ValueError:
+            return {}
+        
+        summaries = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
             try:
-                # Create a prompt for chunk summarization
-                chunk_prompt = f"""
-                Summarize the following text chunk from an academic document in 2-3 sentences.
-                Focus on the core content and key information:
-                
-                {chunk.page_content}
-                
-                Summary:"""
-                
-                # Generate summary
-                summary = self.llm.invoke(chunk_prompt)
-                
-                # Create new document with summary
-                summary_doc = Document(
-                    page_content=summary.strip(),
-                    metadata=chunk.metadata.copy()
-                )
-                summary_doc.metadata["is_summary"] = True
-                summary_doc.metadata["original_chunk_id"] = i
-                
-                summarized_chunks.append(summary_doc)
-                
-            except Exception as e:
-                print(f"Error summarizing chunk {i}: {str(e)}")
-                # Fallback: use original chunk
-                summarized_chunks.append(chunk)
+                chunk_id = int(item.get("chunk_id"))
+            except (TypeError, ValueError):
+                continue
+            summary = item.get("summary")
+            if isinstance(summary, str) and summary.strip():
+                summaries[chunk_id] = summary.strip()
+        return summaries
+    
+    def _summarize_batch(self, batch: List[Tuple[int, Document]]) -> List[Document]:
+        """Summarize several chunks in one request; unparsed chunks are retried singly"""
+        if len(batch) == 1:
+            return [self._summarize_chunk(*batch[0])]
+        
+        try:
+            prompt = self.batch_prompt.format(
+                chunks="\n\n".join(self._format_batch_chunk(i, chunk) for i, chunk in batch)
+            )
+            summaries = self._parse_batch_response(self._invoke_llm(prompt, summaries=len(batch)))
+        except Exception as e:
+            logger.warning("Error summarizing batch of %d chunks, summarizing them one by one: %s", len(batch), e)
+            summaries = {}
+        
+        chunk_by_id = dict(batch)
+        if self.cache:
+            self.cache.put_many({
+                self._cache_key(chunk_by_id[i], self.batch_prompt): summary
+                for i, summary in summaries.items() if i in chunk_by_id
+            })
+        
+        return [
+            self._make_summary_doc(i, chunk, summaries[i]) if i in summaries
+            else self._summarize_chunk(i, chunk)
+            for i, chunk in batch
+        ]
+    
+    @timed("summarize")
+    def create_summarized_chunks(self, chunks: List[Document], max_concurrency: int = None,
+                                 batch_mode: bool = None) -> List[Document]:
+        """Create summarized versions of chunks for embedding"""
+        if batch_mode is None:
+            batch_mode = Config.SUMMARY_BATCH_MODE
+        
+        # original_chunk_id follows the chunk's own id, so chunks may arrive in groups
+        chunk_ids = [chunk.metadata.get("chunk_id", i) for i, chunk in enumerate(chunks)]
+        
+        # Unchanged chunks from earlier uploads skip the LLM entirely
+        cached = self._lookup_cached(chunks) if self.cache and chunks else {}
+        pending = [(chunk_ids[i], chunk) for i, chunk in enumerate(chunks) if i not in cached]
+        
+        if batch_mode:
+            tasks = self._pack_batches(pending)
+        else:
+            tasks = [[item] for item in pending]
+        
+        workers = min(max_concurrency or self.max_concurrency, len(tasks))
+        
+        if workers <= 1:
+            results = [self._summarize_batch(task) for task in tasks]
+        else:
+            # Bounded number of requests in flight
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(bind_traces(self._summarize_batch), tasks))
         
+        summarized_chunks = [
+            self._make_summary_doc(chunk_ids[i], chunks[i], summary) for i, summary in cached.items()
+        ]
+        summarized_chunks.extend(doc for batch in results for doc in batch)
+        summarized_chunks.sort(key=lambda doc: doc.metadata["original_chunk_id"])
         return summarized_chunks
\ No newline at end of file
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from config import Config
+from src.metrics import get_metrics
+
+class SummaryCache:
+    """Content-addressed chunk summary cache in SQLite with LRU eviction.
+
+    Keys hash the chunk text together with the model name and prompt template,
+    so a changed prompt or model never returns stale summaries. WAL mode lets
+    several Streamlit sessions (threads) and worker processes share one file.
+    """
+
+    EVICT_EVERY = 256
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or Config.SUMMARY_CACHE_PATH
+        self.max_entries = max_entries or Config.SUMMARY_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, summary TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON summaries(last_access)")
+    
+    @staticmethod
+    def make_key(text: str, model: str, prompt_template: str) -> str:
+        """Hash of chunk text, model name and prompt template"""
+        digest = hashlib.sha256()
+        for part in (model, prompt_template, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Look up several keys at once and refresh their LRU position"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, summary FROM summaries WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE summaries SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+        return found
+    
+    def get(self, key: str) -> Optional[str]:
+        return self.get_many([key]).get(key)
+    
+    def record(self, hits: int, misses: int):
+        """Count lookups; callers may try several keys for one chunk"""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        get_metrics().inc("cache_hits_total", hits, cache="summary")
+        get_metrics().inc("cache_misses_total", misses, cache="summary")
+    
+    def put_many(self, items: Dict[str, str]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO summaries (key, summary, last_access) VALUES (?, ?, ?)",
+                [(key, summary, now) for key, summary in items.items()]
+            )
+            self._puts_since_evict += len(items)
+            if self._puts_since_evict >= self.EVICT_EVERY:
+                self._evict()
+    
+    def put(self, key: str, summary: str):
+        self.put_many({key: summary})
+    
+    def _evict(self):
+        """Drop least recently used entries beyond max_entries"""
+        self._puts_since_evict = 0
+        count = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM summaries WHERE key IN "
+                "(SELECT key FROM summaries ORDER BY last_access ASC LIMIT ?)",
+                (excess,)
+            )
+    
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+def get_shared_summary_cache() -> SummaryCache:
+    """Summary cache shared by every session in the process"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = SummaryCache()
+        return _shared_cache
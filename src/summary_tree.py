@@ -0,0 +1,120 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Sequence
+import numpy as np
+from langchain.schema import Document
+from config import Config
+from src.metrics import bind_traces, timed
+
+def cluster_vectors(vectors: np.ndarray, n_clusters: int, iterations: int = 20, seed: int = 0) -> List[List[int]]:
+    """Spherical k-means over row vectors; returns the member rows of each non-empty cluster"""
+    count = len(vectors)
+    if n_clusters >= count:
+        return [[i] for i in range(count)]
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(count, n_clusters, replace=False)]
+
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        updated = centroids.copy()
+        for cluster in range(n_clusters):
+            members = vectors[assignment == cluster]
+            if len(members):
+                centroid = members.mean(axis=0)
+                updated[cluster] = centroid / (np.linalg.norm(centroid) or 1)
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+
+    clusters = [np.flatnonzero(assignment == cluster).tolist() for cluster in range(n_clusters)]
+    return [members for members in clusters if members]
+
+class SummaryTreeBuilder:
+    """Build RAPTOR-style summary levels on top of the per-chunk summaries.
+
+    Each level embeds the nodes below it, groups them by similarity and
+    summarizes every group into one parent node, until a single root is
+    left or `max_levels` levels were built. Groups of a level are summarized in parallel through the
+    summarizer's rate-limited LLM path. Nodes carry `tree_level`,
+    `node_id`, `child_ids` and the `chunk_ids` they cover, so a retriever
+    can search all levels at once and return broad nodes for broad
+    questions and leaf chunks for narrow ones.
+    """
+
+    def __init__(self, summarizer, embeddings, cluster_size: int = None, max_levels: int = None):
+        self.summarizer = summarizer
+        self.embeddings = embeddings
+        self.cluster_size = cluster_size or Config.SUMMARY_TREE_CLUSTER_SIZE
+        self.max_levels = max_levels or Config.SUMMARY_TREE_MAX_LEVELS
+
+    @staticmethod
+    def _node_id(doc: Document) -> str:
+        node_id = doc.metadata.get("node_id")
+        if node_id is None:
+            node_id = f"L0-{doc.metadata.get('original_chunk_id', doc.metadata.get('chunk_id'))}"
+        return node_id
+
+    @staticmethod
+    def _chunk_ids(doc: Document) -> List[int]:
+        if "chunk_ids" in doc.metadata:
+            return [int(i) for i in doc.metadata["chunk_ids"].split(",") if i]
+        return [doc.metadata.get("original_chunk_id", doc.metadata.get("chunk_id"))]
+
+    def _group(self, nodes: List[Document]) -> List[List[int]]:
+        """Cluster a level, keeping groups and their members in document order"""
+        vectors = np.asarray(self.embeddings.embed_documents([node.page_content for node in nodes]),
+                             dtype=np.float32)
+        groups = cluster_vectors(vectors, math.ceil(len(nodes) / self.cluster_size))
+
+        # Oversized clusters would overflow the combine prompt; split them in order
+        bounded = []
+        for members in groups:
+            members.sort()
+            step = self.cluster_size * 2
+            bounded.extend(members[i:i + step] for i in range(0, len(members), step))
+        return sorted(bounded, key=lambda members: members[0])
+
+    def _summarize_group(self, level: int, position: int, members: Sequence[Document]) -> Document:
+        chunk_ids = sorted({i for member in members for i in self._chunk_ids(member)})
+        summary = self.summarizer.combine_summaries([member.page_content for member in members])
+        return Document(
+            page_content=summary,
+            metadata={
+                "source": members[0].metadata.get("source"),
+                "type": "summary_node",
+                "is_summary": True,
+                "tree_level": level,
+                "node_id": f"L{level}-{position}",
+                "child_ids": ",".join(self._node_id(member) for member in members),
+                "chunk_ids": ",".join(str(i) for i in chunk_ids),
+            }
+        )
+
+    @timed("summary_tree")
+    def build(self, leaves: List[Document]) -> List[Document]:
+        """Return the nodes above `leaves`, level by level.
+
+        The last level is a single root unless `max_levels` was reached
+        first, in which case it may hold several top nodes.
+        """
+        nodes: List[Document] = []
+        current = leaves
+        level = 0
+        while len(current) > 1 and level < self.max_levels:
+            level += 1
+            if len(current) <= self.cluster_size:
+                groups = [list(range(len(current)))]
+            else:
+                groups = self._group(current)
+
+            below = current
+            with ThreadPoolExecutor(max_workers=self.summarizer.max_concurrency) as executor:
+                current = list(executor.map(
+                    bind_traces(lambda item: self._summarize_group(level, item[0], [below[i] for i in item[1]])),
+                    enumerate(groups)
+                ))
+            nodes.extend(current)
+        return nodes
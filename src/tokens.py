@@ -0,0 +1,29 @@
+from functools import lru_cache
+from typing import List
+import tiktoken
+from config import Config
+
+@lru_cache(maxsize=None)
+def get_encoder(encoding_name: str = Config.TOKENIZER_ENCODING):
+    """Load a tiktoken encoder once per process; None if it can't be loaded"""
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        # tiktoken downloads encodings on first use, which fails offline
+        return None
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text with the shared encoder"""
+    encoder = get_encoder()
+    if encoder is None:
+        return len(text) // 4 + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """Cut text into pieces of at most max_tokens tokens"""
+    encoder = get_encoder()
+    if encoder is None:
+        step = max_tokens * 4
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = encoder.encode(text, disallowed_special=())
+    return [encoder.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
@@ -1,6 +1,7 @@
 import streamlit as st
 from typing import List, Dict, Any
 from langchain.schema import Document
+from src.metrics import get_metrics
 
 def initialize_session_state():
     """Initialize Streamlit session state variables"""
@@ -8,12 +9,23 @@ def initialize_session_state():
         st.session_state.vector_store = None
     if 'rag_chain' not in st.session_state:
         st.session_state.rag_chain = None
+    if 'retriever' not in st.session_state:
+        st.session_state.retriever = None
+    if 'doc_hash' not in st.session_state:
+        st.session_state.doc_hash = None
+    if 'corpus_mode' not in st.session_state:
+        st.session_state.corpus_mode = False
+    if 'corpus_filters' not in st.session_state:
+        st.session_state.corpus_filters = {}
     if 'processed_docs' not in st.session_state:
         st.session_state.processed_docs = False
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
     if 'current_pdf' not in st.session_state:
         st.session_state.current_pdf = None
+    if 'last_runs' not in st.session_state:
+        # This session's last traced ingest and query, by kind
+        st.session_state.last_runs = {}
 
 def format_chat_message(role: str, content: str, sources: List[Document] = None):
     """Format chat message with sources"""
@@ -58,6 +70,31 @@ def display_chat_history():
                             """, unsafe_allow_html=True)
                         st.markdown('</div>', unsafe_allow_html=True)
 
+def display_metrics_panel(last_runs: Dict[str, Any] = None):
+    """Stage timings and LLM/cache counters of the last processed document and query.
+
+    `last_runs` maps "ingest" and "query" to this session's traces; without
+    it the process-wide last runs, of any session, are shown.
+    """
+    metrics = get_metrics()
+    last_runs = last_runs if last_runs is not None else {kind: metrics.last_run(kind) for kind in ("ingest", "query")}
+    runs = [(title, last_runs.get(kind)) for kind, title in (("ingest", "Last document"), ("query", "Last query"))]
+    if not any(run for _, run in runs):
+        st.caption("Process a document or ask a question to see where the time goes.")
+    for title, run in runs:
+        if run is None:
+            continue
+        st.write(f"**{title}:** {run['total_seconds']:.2f}s")
+        st.table([
+            {"stage": stage, "seconds": round(row["seconds"], 3), "calls": row["calls"]}
+            for stage, row in sorted(run["stages"].items(), key=lambda item: -item[1]["seconds"])
+        ])
+        if run["counters"]:
+            st.json(run["counters"], expanded=False)
+    st.caption("Stages overlap during streaming ingestion; rerank time is part of retrieve.")
+    st.download_button("Download Prometheus metrics", metrics.to_prometheus(), file_name="metrics.prom")
+    st.download_button("Download JSON metrics", metrics.to_json(), file_name="metrics.json")
+
 def validate_pdf_file(uploaded_file):
     """Validate uploaded PDF file"""
     if uploaded_file is None:
@@ -1,49 +1,303 @@
+import hashlib
+import json
 import os
-from typing import List, Dict, Any
+import pickle
+import re
+import time
+from typing import List, Dict, Any, Optional
+import chromadb
+import faiss
+import numpy as np
 from langchain.schema import Document
 from langchain_community.vectorstores import Chroma
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.embeddings import OpenAIEmbeddings
 from config import Config
+from src.embedding_cache import get_cached_embeddings, get_embedding_cache
+from src.document_processor import is_pdf_hash
+from src.embeddings import get_embedding_service
+from src.faiss_index import apply_search_params, build_index, index_type_of, rebuild_for_size
+from src.lexical_index import BM25Index
+from src.metrics import get_metrics, timed
+from src.reranker import get_reranker
+from src.retrievers import ChunkDocStore, HybridRetriever, SummaryParentRetriever
+from src.summarizer import BATCH_PROMPT, CHUNK_PROMPT, COMBINE_PROMPT
+from src.versioned_dir import current_version, publish_version
+
+def selection_settings() -> Dict[str, Any]:
+    """Threshold, adaptive-k and re-ranking options shared by every summary retriever"""
+    settings = dict(
+        score_threshold=Config.SIMILARITY_THRESHOLD,
+        score_drop_off=Config.SIMILARITY_DROP_OFF,
+        context_token_budget=Config.RETRIEVAL_CONTEXT_TOKEN_BUDGET,
+    )
+    if Config.RERANK_ENABLED:
+        settings.update(reranker=get_reranker(), rerank_candidates=Config.RERANK_CANDIDATES)
+    return settings
+
+def index_settings() -> Dict[str, Any]:
+    """Settings a saved document index was built with; it is rebuilt when any of them changes"""
+    prompts = "\0".join(prompt.template for prompt in (CHUNK_PROMPT, BATCH_PROMPT, COMBINE_PROMPT))
+    return {
+        "embedding_model": Config.EMBEDDING_MODEL,
+        "chunking_strategy": Config.CHUNKING_STRATEGY,
+        "chunk_size": Config.CHUNK_SIZE,
+        "chunk_overlap": Config.CHUNK_OVERLAP,
+        "chunk_token_budget": Config.CHUNK_TOKEN_BUDGET,
+        "chunk_overlap_tokens": Config.CHUNK_OVERLAP_TOKENS,
+        "llm_provider": Config.LLM_PROVIDER,
+        "summary_model": Config.GROQ_MODEL,
+        "summary_prompts": hashlib.sha256(prompts.encode("utf-8")).hexdigest(),
+        "summary_batch_mode": Config.SUMMARY_BATCH_MODE,
+        "summary_tree": Config.SUMMARY_TREE_ENABLED,
+        "summary_tree_cluster_size": Config.SUMMARY_TREE_CLUSTER_SIZE,
+        "summary_tree_max_levels": Config.SUMMARY_TREE_MAX_LEVELS,
+    }
 
 class MultiVectorStore:
     def __init__(self):
-        self.embedding_model = HuggingFaceEmbeddings(
-            model_name=Config.EMBEDDING_MODEL
-        )
+        # Shared by every session in the process instead of reloaded per document;
+        # unchanged chunks are served from the persistent embedding cache
+        self.embedding_model = get_cached_embeddings()
+        self.chroma_embedding_model = get_cached_embeddings(as_lists=True)
         self.chroma_store = None
+        self.chroma_client = None
+        self.chroma_collections = {}
+        self._chroma_pending_writes = 0
         self.memory_store = None
+        self.docstore = None
+        self.lexical_index = None
         self.current_stores = {}
     
     def initialize_chroma(self, persist_directory: str):
         """Initialize ChromaDB vector store"""
         self.chroma_store = Chroma(
             persist_directory=persist_directory,
-            embedding_function=self.embedding_model
+            embedding_function=self.chroma_embedding_model
         )
     
     def create_memory_store(self, documents: List[Document], store_id: str):
-        """Create in-memory vector store"""
-        self.memory_store = FAISS.from_documents(
-            documents, 
-            self.embedding_model
-        )
+        """Create in-memory vector store with the configured FAISS index type"""
+        texts = [doc.page_content for doc in documents]
+        with get_metrics().span("embed"):
+            vectors = np.asarray(self.embedding_model.embed_documents(texts), dtype=np.float32)
+        with get_metrics().span("index"):
+            self.memory_store = FAISS(self.embedding_model, build_index(vectors), InMemoryDocstore(), {})
+            self.memory_store.add_embeddings(zip(texts, vectors), [doc.metadata for doc in documents])
         self.current_stores[store_id] = self.memory_store
         return self.memory_store
     
-    def add_to_chroma(self, documents: List[Document], collection_name: str):
-        """Add documents to ChromaDB"""
-        if self.chroma_store is None:
-            self.chroma_store = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embedding_model,
-                persist_directory=Config.CHROMA_PERSIST_DIR
+    def optimize_index(self):
+        """Rebuild a flat index that has outgrown it as the type chosen for its size.
+
+        Streaming ingestion starts with a handful of vectors, so the index
+        type can only be picked properly once everything is in.
+        """
+        rebuilt = rebuild_for_size(self.memory_store.index)
+        if rebuilt is not None:
+            self.memory_store.index = rebuilt
+    
+    def _make_retriever(self) -> SummaryParentRetriever:
+        selection = selection_settings()
+        if Config.HYBRID_RETRIEVAL and self.lexical_index is not None:
+            return HybridRetriever(
+                vectorstore=self.memory_store,
+                docstore=self.docstore,
+                lexical_index=self.lexical_index,
+                dense_weight=Config.HYBRID_DENSE_WEIGHT,
+                lexical_weight=Config.HYBRID_LEXICAL_WEIGHT,
+                rrf_k=Config.HYBRID_RRF_K,
+                fetch_k=Config.HYBRID_FETCH_K,
+                lexical_min_score=Config.HYBRID_LEXICAL_MIN_SCORE,
+                search_kwargs={"k": Config.TOP_K_RETRIEVAL},
+                **selection
             )
+        return SummaryParentRetriever(
+            vectorstore=self.memory_store,
+            docstore=self.docstore,
+            search_kwargs={"k": Config.TOP_K_RETRIEVAL},
+            **selection
+        )
+    
+    def create_multi_vector_retriever(self, summaries: List[Document], originals: List[Document],
+                                      store_id: str = "summarized_chunks") -> SummaryParentRetriever:
+        """Index summaries in FAISS and keep originals in an id-indexed docstore"""
+        self.create_memory_store(summaries, store_id)
+        with get_metrics().span("index"):
+            self.docstore = ChunkDocStore(originals)
+            self.lexical_index = BM25Index()
+            self.lexical_index.add_documents(originals)
+        
+        return self._make_retriever()
+    
+    def add_summaries(self, summaries: List[Document], originals: List[Document],
+                      store_id: str = "summarized_chunks") -> SummaryParentRetriever:
+        """Add one group of summaries and originals, creating the stores on first use"""
+        if self.memory_store is None:
+            self.create_memory_store(summaries, store_id)
+            self.docstore = ChunkDocStore()
+            self.lexical_index = BM25Index()
         else:
-            self.chroma_store.add_documents(documents)
+            # Embeds and adds in one call
+            with get_metrics().span("embed"):
+                self.memory_store.add_documents(summaries)
+        with get_metrics().span("index"):
+            self.docstore.add_documents(originals)
+            self.lexical_index.add_documents(originals)
         
-        self.chroma_store.persist()
+        return self._make_retriever()
+    
+    def _index_dir(self, doc_hash: str) -> str:
+        # The id ends up in a path whose pickle is loaded: never let it leave FAISS_INDEX_DIR
+        if not is_pdf_hash(doc_hash):
+            raise ValueError(f"Not a document hash: {doc_hash!r}")
+        return os.path.join(Config.FAISS_INDEX_DIR, doc_hash)
+    
+    def has_document_index(self, doc_hash: str) -> bool:
+        return os.path.exists(os.path.join(self._index_dir(doc_hash), "manifest.json"))
+    
+    @timed("save")
+    def save_document_index(self, doc_hash: str):
+        """Persist the summary FAISS index, both docstores and the BM25 index under the PDF hash"""
+        if self.memory_store is None or self.docstore is None:
+            raise Exception("Vector store not initialized")
+        
+        self.optimize_index()
+        directory = self._index_dir(doc_hash)
+        tmp_dir = f"{directory}.tmp-{os.getpid()}-{time.time_ns()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        
+        faiss.write_index(self.memory_store.index, os.path.join(tmp_dir, "summaries.faiss"))
+        with open(os.path.join(tmp_dir, "docstores.pkl"), "wb") as f:
+            pickle.dump({
+                "summary_docstore": self.memory_store.docstore,
+                "index_to_docstore_id": self.memory_store.index_to_docstore_id,
+                "parents": self.docstore,
+                "lexical": self.lexical_index,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        
+        # Written last: its presence marks a complete index
+        with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+            json.dump({
+                "doc_hash": doc_hash,
+                "embedding_model": Config.EMBEDDING_MODEL,
+                "settings": index_settings(),
+                "summary_vectors": self.memory_store.index.ntotal,
+                "index_type": index_type_of(self.memory_store.index),
+                "original_chunks": len(self.docstore),
+                "created_at": time.time(),
+            }, f)
+        
+        publish_version(tmp_dir, directory)
+    
+    @timed("load")
+    def load_document_index(self, doc_hash: str) -> Optional[SummaryParentRetriever]:
+        """Reopen a saved index without re-summarizing; None if it doesn't exist"""
+        directory = current_version(self._index_dir(doc_hash))
+        if directory is None or not os.path.exists(os.path.join(directory, "manifest.json")):
+            return None
+        
+        with open(os.path.join(directory, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest.get("settings") != index_settings():
+            # Chunked, summarized or embedded differently than now configured
+            return None
+        
+        index_path = os.path.join(directory, "summaries.faiss")
+        try:
+            # Map the vectors instead of reading them into memory
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            index = faiss.read_index(index_path)
+        apply_search_params(index)
+        
+        with open(os.path.join(directory, "docstores.pkl"), "rb") as f:
+            stores = pickle.load(f)
+        
+        self.memory_store = FAISS(
+            self.embedding_model,
+            index,
+            stores["summary_docstore"],
+            stores["index_to_docstore_id"]
+        )
+        self.current_stores[doc_hash] = self.memory_store
+        self.docstore = stores["parents"]
+        self.lexical_index = stores.get("lexical")
+        if self.lexical_index is None:
+            # Indexes saved before BM25 existed
+            self.lexical_index = BM25Index()
+            self.lexical_index.add_documents(self.docstore.documents())
+        
+        return self._make_retriever()
+    
+    @staticmethod
+    def chunk_content_id(document: Document) -> str:
+        """Stable Chroma id for a chunk, derived from its text"""
+        return hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def chroma_collection_name(identity: str) -> str:
+        """Collection name for a document identity (filename, student/filename), stable across revisions"""
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "-", identity).strip("-_")[:40]
+        return f"doc-{slug}-{hashlib.sha256(identity.encode('utf-8')).hexdigest()[:12]}"
+    
+    def get_chroma_collection(self, collection_name: str) -> Chroma:
+        """Open (or create) a per-document Chroma collection"""
+        if collection_name not in self.chroma_collections:
+            if self.chroma_client is None:
+                self.chroma_client = chromadb.PersistentClient(path=Config.CHROMA_PERSIST_DIR)
+            self.chroma_collections[collection_name] = Chroma(
+                client=self.chroma_client,
+                collection_name=collection_name,
+                persist_directory=Config.CHROMA_PERSIST_DIR,
+                embedding_function=self.chroma_embedding_model
+            )
+        return self.chroma_collections[collection_name]
+    
+    @timed("chroma_add")
+    def add_to_chroma(self, documents: List[Document], collection_name: str) -> Dict[str, int]:
+        """Sync documents into their collection, embedding only new or changed chunks"""
+        store = self.get_chroma_collection(collection_name)
+        self.chroma_store = store
+        
+        # Identical chunks (repeated boilerplate) share one id and one vector
+        by_id = {}
+        for doc in documents:
+            by_id.setdefault(self.chunk_content_id(doc), doc)
+        ids = list(by_id)
+        
+        existing = set(store.get(include=[])["ids"])
+        new_ids = [chunk_id for chunk_id in ids if chunk_id not in existing]
+        kept_ids = [chunk_id for chunk_id in ids if chunk_id in existing]
+        stale_ids = list(existing - set(ids))
+        
+        for start in range(0, len(new_ids), Config.CHROMA_BATCH_SIZE):
+            batch = new_ids[start:start + Config.CHROMA_BATCH_SIZE]
+            store.add_documents([by_id[chunk_id] for chunk_id in batch], ids=batch)
+        
+        # Unchanged text may have moved (chunk_id shifts); refresh metadata without re-embedding
+        if kept_ids:
+            collection = self.chroma_client.get_collection(collection_name)
+            for start in range(0, len(kept_ids), Config.CHROMA_BATCH_SIZE):
+                batch = kept_ids[start:start + Config.CHROMA_BATCH_SIZE]
+                collection.update(ids=batch, metadatas=[by_id[chunk_id].metadata for chunk_id in batch])
+        if stale_ids:
+            store.delete(ids=stale_ids)
+        
+        self._chroma_pending_writes += len(new_ids) + len(kept_ids) + len(stale_ids)
+        if self._chroma_pending_writes >= Config.CHROMA_PERSIST_EVERY:
+            self.persist_chroma()
+        
+        return {"added": len(new_ids), "updated": len(kept_ids), "deleted": len(stale_ids)}
+    
+    @timed("chroma_persist")
+    def persist_chroma(self):
+        """Flush pending Chroma writes once instead of after every batch"""
+        if self._chroma_pending_writes:
+            for store in self.chroma_collections.values():
+                store.persist()
+            self._chroma_pending_writes = 0
     
     def similarity_search(self, query: str, k: int = 3, store_type: str = "memory"):
         """Search for similar documents"""
@@ -68,6 +322,14 @@ class MultiVectorStore:
         info = {
             "chroma_initialized": self.chroma_store is not None,
             "memory_initialized": self.memory_store is not None,
-            "current_stores": list(self.current_stores.keys())
+            "docstore_chunks": len(self.docstore) if self.docstore else 0,
+            "current_stores": list(self.current_stores.keys()),
+            "embedding_service": get_embedding_service().get_stats()
         }
+        if Config.RERANK_ENABLED:
+            info["reranker"] = get_reranker().get_stats()
+        if self.lexical_index is not None:
+            info["lexical_index"] = self.lexical_index.get_stats()
+        if Config.EMBEDDING_CACHE_ENABLED:
+            info["embedding_cache"] = get_embedding_cache().get_stats()
         return info
\ No newline at end of file
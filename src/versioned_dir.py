@@ -0,0 +1,54 @@
+import fcntl
+import glob
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+def current_version(path: str) -> Optional[str]:
+    """The directory `path` currently points at, or None if nothing was published.
+
+    Readers resolve it once and open every file from the result, so a
+    publish in the middle of a load cannot mix files of two versions.
+    """
+    if not os.path.exists(path):
+        return None
+    return os.path.realpath(path)
+
+def publish_version(tmp_dir: str, path: str) -> str:
+    """Make the complete directory `tmp_dir` visible at `path` in one rename.
+
+    `path` is a symlink to a versioned sibling directory and is swapped
+    with os.replace, so readers see either the old or the new version and
+    never a missing directory. The version it replaced is kept until the
+    next publish, for readers that resolved it just before the swap.
+    """
+    version = f"{path}.v{time.time_ns()}-{os.getpid()}"
+    os.rename(tmp_dir, version)
+    previous = current_version(path)
+    if previous is not None and not os.path.islink(path):
+        # A plain directory saved before versions existed: move it aside once
+        previous = f"{path}.v0-{os.getpid()}"
+        os.replace(path, previous)
+
+    link = f"{path}.link-{time.time_ns()}-{os.getpid()}"
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, path)
+
+    keep = {os.path.realpath(version), previous and os.path.realpath(previous)}
+    for stale in glob.glob(glob.escape(path) + ".v*"):
+        if os.path.realpath(stale) not in keep:
+            shutil.rmtree(stale, ignore_errors=True)
+    return version
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """Exclusive flock on `path`.lock, for a read-modify-write of `path` across processes"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from config import Config
+from src.lexical_index import query_terms
+
+class HashEmbeddings(Embeddings):
+    """Bag-of-words vectors: texts sharing content words are similar, others orthogonal.
+
+    Stopwords are left out, as a sentence model gives them little weight.
+    """
+
+    model_name = "hash-embeddings"
+    dimension = 256
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in query_terms(text):
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimension] += 1
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts):
+        return [self._vector(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text).tolist()
+
+@pytest.fixture(autouse=True)
+def isolated_stores(tmp_path, monkeypatch):
+    """Point every on-disk cache, index and queue at a per-test directory"""
+    monkeypatch.setattr(Config, "SUMMARY_CACHE_PATH", str(tmp_path / "summary_cache.sqlite3"))
+    monkeypatch.setattr(Config, "EMBEDDING_CACHE_DIR", str(tmp_path / "embedding_cache"))
+    monkeypatch.setattr(Config, "FAISS_INDEX_DIR", str(tmp_path / "faiss"))
+    monkeypatch.setattr(Config, "CHROMA_PERSIST_DIR", str(tmp_path / "chroma"))
+    monkeypatch.setattr(Config, "CORPUS_DIR", str(tmp_path / "corpus"))
+    monkeypatch.setattr(Config, "INGEST_QUEUE_PATH", str(tmp_path / "ingest_jobs.sqlite3"))
+    monkeypatch.setattr(Config, "RERANK_ENABLED", False)
+    return tmp_path
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    """HashEmbeddings in place of the sentence-transformers model"""
+    fake = HashEmbeddings()
+    monkeypatch.setattr("src.vector_store.get_cached_embeddings", lambda as_lists=False: fake)
+    monkeypatch.setattr("src.corpus_index.get_cached_embeddings", lambda as_lists=False: fake)
+    return fake
+
+def make_document(texts):
+    """(summaries, original chunks) of a document whose chunks are `texts`"""
+    originals = [Document(page_content=text, metadata={"chunk_id": i, "page_number": i + 1})
+                 for i, text in enumerate(texts)]
+    summaries = [Document(page_content=text, metadata={"chunk_id": i, "original_chunk_id": i, "is_summary": True})
+                 for i, text in enumerate(texts)]
+    return summaries, originals
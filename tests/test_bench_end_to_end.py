@@ -0,0 +1,20 @@
+import time
+import numpy as np
+from benchmarks.bench_end_to_end import _StageTimer, settings_mismatches
+
+def test_stage_peak_is_sampled_per_stage():
+    timer = _StageTimer()
+    with timer.stage("allocate"):
+        block = np.ones(64 * 2 ** 20, dtype=np.uint8)
+        time.sleep(0.2)
+        del block
+    with timer.stage("idle"):
+        pass
+    # ru_maxrss would still report the allocation's peak for the later stage
+    assert timer.stages["allocate"]["peak_rss_mb"] >= timer.stages["idle"]["peak_rss_mb"] + 32
+
+def test_baseline_with_other_settings_is_reported():
+    settings = {"pages": 300, "documents": 2, "latency": 0.05, "output": "a.json", "tolerance": 0.2}
+    changed = {**settings, "pages": 50, "output": "b.json", "tolerance": 0.5}
+    assert settings_mismatches({"settings": settings}, {"settings": dict(settings)}) == []
+    assert settings_mismatches({"settings": changed}, {"settings": settings}) == ["pages: 300 -> 50"]
@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import pytest
+from config import Config
+import src.corpus_index
+import src.vector_store
+from src.corpus_index import CorpusIndex, get_corpus_index, saved_documents
+from src.vector_store import MultiVectorStore
+from conftest import HashEmbeddings, make_document
+
+def build_store(number: int) -> MultiVectorStore:
+    store = MultiVectorStore()
+    store.create_multi_vector_retriever(*make_document([f"Report {number} covers topic{number} in depth.",
+                                                       f"Report {number} concludes with finding{number}."]))
+    return store
+
+def add_documents(corpus_dir: str, numbers):
+    """Runs in a separate process, as ingest.py or the API server would"""
+    Config.CORPUS_DIR = corpus_dir
+    Config.EMBEDDING_CACHE_ENABLED = False
+    fake = HashEmbeddings()
+    src.vector_store.get_cached_embeddings = lambda as_lists=False: fake
+    src.corpus_index.get_cached_embeddings = lambda as_lists=False: fake
+    corpus = CorpusIndex()
+    for number in numbers:
+        corpus.add_and_save(f"doc-{number}", build_store(number), student=f"student{number % 3}")
+
+def test_concurrent_processes_keep_each_others_documents():
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=add_documents, args=(Config.CORPUS_DIR, range(i, 12, 3))) for i in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=120)
+        assert worker.exitcode == 0
+
+    assert sorted(doc["doc_id"] for doc in saved_documents()) == sorted(f"doc-{i}" for i in range(12))
+    corpus = CorpusIndex(embeddings=HashEmbeddings())
+    assert corpus.load()
+    assert corpus.index.ntotal == 24
+
+def test_stale_instance_adds_on_top_of_newer_save(embeddings):
+    stale = CorpusIndex()
+    stale.load()
+    CorpusIndex().add_and_save("doc-1", build_store(1))
+
+    stale.add_and_save("doc-2", build_store(2))
+
+    assert [doc["doc_id"] for doc in saved_documents()] == ["doc-1", "doc-2"]
+    hits = stale.similarity_search("topic1", k=1, filter={"doc_id": "doc-1"})
+    assert "topic1" in hits[0].page_content
+
+def test_registry_is_read_without_the_embedding_model(embeddings, monkeypatch):
+    CorpusIndex().add_and_save("doc-1", build_store(1), student="Ada")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("embedding model loaded")
+    monkeypatch.setattr(src.corpus_index, "get_cached_embeddings", fail)
+    monkeypatch.setattr(src.corpus_index, "_shared_corpus", None)
+
+    assert [doc["student"] for doc in saved_documents()] == ["Ada"]
+    assert get_corpus_index().facets() == {"student": ["Ada"], "year": []}
+    with pytest.raises(AssertionError):
+        get_corpus_index().similarity_search("topic1")
+    assert os.path.islink(Config.CORPUS_DIR)
+
+def test_reopened_document_is_not_embedded_again(embeddings, monkeypatch):
+    store = build_store(1)
+    corpus = CorpusIndex()
+    assert corpus.add_and_save("doc-1", store)
+
+    def fail(texts):
+        raise AssertionError("summaries embedded again")
+    monkeypatch.setattr(embeddings, "embed_documents", fail)
+    assert not corpus.add_and_save("doc-1", store)
+    assert not CorpusIndex().add_and_save("doc-1", store)
+
+def test_revised_upload_replaces_the_earlier_revision(embeddings):
+    corpus = CorpusIndex()
+    corpus.add_and_save("doc-1", build_store(1), filename="report.pdf", student="Ada")
+    corpus.add_and_save("doc-3", build_store(3), filename="report.pdf", student="Bob")
+    corpus.add_and_save("doc-2", build_store(2), filename="report.pdf", student="Ada")
+
+    assert [doc["doc_id"] for doc in saved_documents()] == ["doc-3", "doc-2"]
+    assert "doc-1" not in {doc.metadata["doc_id"] for doc in corpus.similarity_search("topic1", k=10)}
+    assert corpus.similarity_search("topic1", k=1, filter={"student": "Ada"})[0].metadata["doc_id"] == "doc-2"
+
+    # Uploading the earlier revision again makes it current
+    assert corpus.add_and_save("doc-1", build_store(1), filename="report.pdf", student="Ada")
+    assert [doc["doc_id"] for doc in saved_documents()] == ["doc-1", "doc-3"]
@@ -0,0 +1,72 @@
+import io
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pytest
+from PyPDF2 import PdfReader
+from config import Config
+import src.document_processor
+from benchmarks.synthetic_pdf import make_pdf
+from src.document_processor import DocumentProcessor, _page_ranges, _pages_as_pdf, process_pool_context
+
+def test_workers_are_not_forked():
+    context = process_pool_context()
+
+    assert context.get_start_method() in ("forkserver", "spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        assert list(pool.map(abs, [-1, -2])) == [1, 2]
+
+def test_page_ranges_cover_every_page_once():
+    ranges = _page_ranges(95, 4, 10)
+
+    pages = [page for start, end in ranges for page in range(start, end)]
+    assert pages == list(range(95))
+    assert len(ranges) == 4
+
+class InlineExecutor(ThreadPoolExecutor):
+    """Stands in for the process pool, so the patched partitioner is used by its workers"""
+
+    created = 0
+
+    def __init__(self, max_workers, mp_context=None):
+        super().__init__(max_workers)
+        InlineExecutor.created += 1
+
+def fake_partition(data: bytes, start: int, end: int):
+    pages = len(PdfReader(io.BytesIO(data)).pages)
+    return [{"element_id": f"p{start + i + 1}-e0", "text": f"page {start + i + 1}", "type": "NarrativeText",
+             "page_number": start + i + 1} for i in range(pages)]
+
+@pytest.fixture
+def patched_pool(monkeypatch):
+    monkeypatch.setattr(src.document_processor, "ProcessPoolExecutor", InlineExecutor)
+    monkeypatch.setattr(src.document_processor, "_partition_page_pdf", fake_partition)
+    monkeypatch.setattr(src.document_processor, "_partition_pages",
+                        lambda reader, start, end: fake_partition(_pages_as_pdf(reader, start, end), start, end))
+    monkeypatch.setattr(Config, "PDF_MIN_PAGES_PER_WORKER", 20)
+    InlineExecutor.created = 0
+
+def test_page_batches_of_long_uploads_go_through_the_pool_in_order(patched_pool, tmp_path):
+    upload = io.BytesIO(open(make_pdf(str(tmp_path / "report.pdf"), 45), "rb").read())
+
+    batches = list(DocumentProcessor().iter_page_batches(upload, pages_per_batch=10, workers=2))
+
+    assert InlineExecutor.created == 1
+    assert [len(batch) for batch in batches] == [10, 10, 10, 10, 5]
+    elements = [elem for batch in batches for elem in batch]
+    assert [elem["page_number"] for elem in elements] == list(range(1, 46))
+    assert [elem["id"] for elem in elements] == list(range(45))
+
+def test_short_uploads_are_partitioned_in_process(patched_pool, tmp_path):
+    upload = io.BytesIO(open(make_pdf(str(tmp_path / "report.pdf"), 15), "rb").read())
+
+    batches = list(DocumentProcessor().iter_page_batches(upload, pages_per_batch=10, workers=2))
+
+    assert InlineExecutor.created == 0
+    assert [len(batch) for batch in batches] == [10, 5]
+
+def test_in_memory_upload_is_extracted_by_the_pool(patched_pool, tmp_path):
+    upload = io.BytesIO(open(make_pdf(str(tmp_path / "report.pdf"), 45), "rb").read())
+
+    elements = DocumentProcessor().extract_text_from_pdf(upload, workers=2)
+
+    assert InlineExecutor.created == 1
+    assert [elem["page_number"] for elem in elements] == list(range(1, 46))
@@ -0,0 +1,84 @@
+import hashlib
+import os
+import numpy as np
+from src.embedding_cache import INDEX_RECORD, CachedEmbeddings, EmbeddingCache
+
+DIMENSION = 8
+
+def vector_for(text: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "little")
+    return np.random.default_rng(seed).standard_normal(DIMENSION).astype(np.float32)
+
+class FakeEmbeddings:
+    model_name = "fake-model"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_array(self, texts):
+        self.embedded.extend(texts)
+        return np.stack([vector_for(text) for text in texts])
+
+    def embed_query(self, text):
+        return vector_for(text).tolist()
+
+def make_cached(tmp_path, capacity: int):
+    inner = FakeEmbeddings()
+    cache = EmbeddingCache(inner.model_name, DIMENSION, directory=str(tmp_path / "cache"), capacity=capacity)
+    return inner, cache, CachedEmbeddings(inner, cache)
+
+def test_mixed_batch_on_full_ring_returns_its_own_vectors(tmp_path):
+    inner, cache, embeddings = make_cached(tmp_path, capacity=4)
+    embeddings.embed_documents(["a", "b", "c", "d"])
+
+    # The misses are written over the ring slots the hits were read from
+    texts = ["a", "e", "b", "f", "g", "h"]
+    vectors = embeddings.embed_documents(texts)
+
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_array_equal(vector, vector_for(text))
+    assert inner.embedded[4:] == ["e", "f", "g", "h"]
+
+def test_hits_survive_wrap_around(tmp_path):
+    _, cache, embeddings = make_cached(tmp_path, capacity=4)
+    embeddings.embed_documents(["a", "b", "c", "d"])
+
+    # "a" is the oldest entry; using it again keeps it over the unused "b"
+    embeddings.embed_documents(["a"])
+    embeddings.embed_documents(["e"])
+
+    assert set(cache.get_many([cache.make_key("a")])) == {0}
+    assert cache.get_many([cache.make_key("b")]) == {}
+
+def test_returned_vectors_are_copies(tmp_path):
+    _, cache, embeddings = make_cached(tmp_path, capacity=2)
+    embeddings.embed_documents(["a", "b"])
+    hit = cache.get_many([cache.make_key("a")])[0]
+
+    cache.put_many([cache.make_key("x"), cache.make_key("y")], np.stack([vector_for("x"), vector_for("y")]))
+
+    np.testing.assert_array_equal(hit, vector_for("a"))
+
+def test_entries_are_shared_with_a_reopened_cache(tmp_path):
+    _, _, embeddings = make_cached(tmp_path, capacity=4)
+    embeddings.embed_documents(["a", "b"])
+
+    inner, _, reopened = make_cached(tmp_path, capacity=4)
+    vectors = reopened.embed_documents(["b", "a", "c"])
+
+    assert inner.embedded == ["c"]
+    np.testing.assert_array_equal(vectors[0], vector_for("b"))
+
+def test_index_is_compacted_while_running_and_other_instances_follow(tmp_path):
+    _, cache, embeddings = make_cached(tmp_path, capacity=4)
+    _, other, _ = make_cached(tmp_path, capacity=4)
+    texts = [f"text {i}" for i in range(40)]
+    for start in range(0, len(texts), 2):
+        embeddings.embed_documents(texts[start:start + 2])
+        assert os.path.getsize(cache.index_path) <= 2 * 4 * INDEX_RECORD.itemsize
+
+    # The second instance read the index before any compaction
+    hits = other.get_many([other.make_key(text) for text in texts])
+    assert sorted(hits) == [36, 37, 38, 39]
+    for position, vector in hits.items():
+        np.testing.assert_array_equal(vector, vector_for(texts[position]))
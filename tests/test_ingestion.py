@@ -0,0 +1,27 @@
+import io
+import src.document_processor
+from benchmarks.synthetic_pdf import make_pdf
+from src.document_processor import DocumentProcessor
+from src.fakes import FakeChatGroq
+from src.ingestion import IngestionPipeline
+from src.rate_limiter import RateLimiter
+from src.summarizer import Summarizer
+from src.vector_store import MultiVectorStore
+
+def partition_lines(reader, start, end):
+    """One element per page, without the Unstructured models"""
+    return [{"element_id": f"p{page + 1}-e0", "text": f"Page {page + 1} discusses evaluation of model {page}.",
+             "type": "NarrativeText", "page_number": page + 1} for page in range(start, min(end, len(reader.pages)))]
+
+def test_streamed_upload_reports_its_size_and_memory(embeddings, monkeypatch, tmp_path):
+    monkeypatch.setattr(src.document_processor, "_partition_pages", partition_lines)
+    data = open(make_pdf(str(tmp_path / "report.pdf"), 12), "rb").read()
+    summarizer = Summarizer(llm=FakeChatGroq(latency=0), rate_limiter=RateLimiter(10 ** 6, 10 ** 9), use_cache=False)
+    pipeline = IngestionPipeline(DocumentProcessor(), summarizer, MultiVectorStore())
+
+    retriever = pipeline.run(io.BytesIO(data))
+
+    assert retriever is not None and pipeline.stats["chunks"] > 0
+    assert pipeline.stats["mode"] == "stream"
+    assert pipeline.stats["upload_mb"] == round(len(data) / 2 ** 20, 2)
+    assert 0 < pipeline.stats["rss_before_mb"] <= pipeline.stats["rss_peak_mb"]
@@ -0,0 +1,64 @@
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+from src.job_queue import DONE, FAILED, PENDING, RUNNING, JobQueue
+
+def claim_as(queue: JobQueue, pid: int, host: str = None, started: str = None) -> int:
+    job = queue.claim()
+    queue._conn.execute("UPDATE jobs SET worker_pid = ?, worker_host = ?, worker_started = ? WHERE id = ?",
+                        (pid, host or socket.gethostname(), started, job["id"]))
+    return job["id"]
+
+def test_claim_records_the_worker(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite3"))
+    queue.enqueue(str(tmp_path / "a.pdf"))
+    job = queue.claim()
+    row = queue._conn.execute("SELECT * FROM jobs WHERE id = ?", (job["id"],)).fetchone()
+    assert (row["status"], row["worker_pid"], row["worker_host"]) == (RUNNING, os.getpid(), socket.gethostname())
+    assert queue.recover() == 0
+
+def test_recover_requeues_job_of_dead_worker(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite3"))
+    queue.enqueue(str(tmp_path / "a.pdf"))
+    worker = subprocess.Popen([sys.executable, "-c", "pass"])
+    worker.wait()
+    claim_as(queue, worker.pid)
+    assert queue.recover() == 1
+    assert queue.counts()[PENDING] == 1
+
+def test_recover_requeues_job_whose_pid_was_reused(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite3"))
+    queue.enqueue(str(tmp_path / "a.pdf"))
+    # A live pid whose start time is not the one recorded at claim time
+    claim_as(queue, os.getpid(), started="1")
+    assert queue.recover() == 1
+    assert queue.counts()[PENDING] == 1
+
+def test_recover_leaves_jobs_claimed_on_other_hosts(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite3"))
+    queue.enqueue(str(tmp_path / "a.pdf"))
+    claim_as(queue, 2 ** 22 + 1, host="other-host", started="1")
+    assert queue.recover() == 0
+    assert queue.counts()[RUNNING] == 1
+
+def test_opens_queue_created_before_worker_columns(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT UNIQUE NOT NULL, status TEXT NOT NULL, "
+        "student TEXT, year TEXT, doc_hash TEXT, attempts INTEGER NOT NULL DEFAULT 0, worker_pid INTEGER, "
+        "error TEXT, chunks INTEGER, summaries INTEGER, seconds REAL, created_at REAL NOT NULL, "
+        "started_at REAL, finished_at REAL)"
+    )
+    conn.execute("INSERT INTO jobs (path, status, worker_pid, created_at) VALUES ('a.pdf', ?, ?, 0)",
+                 (RUNNING, os.getpid()))
+    conn.execute("INSERT INTO jobs (path, status, created_at) VALUES ('b.pdf', ?, 0)", (DONE,))
+    conn.commit()
+    conn.close()
+
+    queue = JobQueue(path)
+    # Only the pid is known for the old row, and it is alive
+    assert queue.recover() == 0
+    assert queue.counts() == {PENDING: 0, RUNNING: 1, DONE: 1, FAILED: 0}
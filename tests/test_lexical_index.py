@@ -0,0 +1,31 @@
+import pickle
+from langchain.schema import Document
+from src.lexical_index import BM25Index
+
+def chunks(*texts):
+    return [Document(page_content=text, metadata={"chunk_id": i}) for i, text in enumerate(texts)]
+
+def test_re_added_chunks_are_not_counted_twice():
+    documents = chunks("resnet-50 baseline accuracy", "survey of students", "transformer attention layers")
+    once = BM25Index()
+    once.add_documents(documents)
+    twice = BM25Index()
+    twice.add_documents(documents)
+    twice.add_documents(documents[:2])
+
+    assert len(twice) == 3
+    assert twice.get_stats()["postings"] == once.get_stats()["postings"]
+    assert twice.search("resnet-50 accuracy", k=3) == once.search("resnet-50 accuracy", k=3)
+
+def test_reloaded_index_still_skips_indexed_chunks():
+    index = BM25Index()
+    index.add_documents(chunks("resnet-50 baseline accuracy", "survey of students"))
+    state = index.__getstate__()
+    del state["_indexed"]
+    reloaded = pickle.loads(pickle.dumps(index))
+    legacy = BM25Index.__new__(BM25Index)
+    legacy.__setstate__(state)
+
+    for restored in (reloaded, legacy):
+        restored.add_documents(chunks("resnet-50 baseline accuracy"))
+        assert restored.get_stats()["postings"] == index.get_stats()["postings"]
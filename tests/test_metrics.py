@@ -0,0 +1,127 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from langchain.schema import Document
+from config import Config
+import src.metrics
+from src.fakes import FakeChatGroq, FakeMessage, FakeRateLimitError, FakeServerError
+from src.metrics import MetricsRegistry, bind_traces
+from src.rag_chain import SummarizedRAGChain
+
+@pytest.fixture
+def metrics(monkeypatch):
+    registry = MetricsRegistry(enabled=True)
+    monkeypatch.setattr(src.metrics, "_shared_metrics", registry)
+    monkeypatch.setattr(Config, "LLM_RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(Config, "LLM_RETRY_MAX_DELAY", 0.001)
+    return registry
+
+def counter(registry: MetricsRegistry, name: str, **labels) -> float:
+    rows = registry.snapshot()["counters"].get(name, [])
+    return sum(row["value"] for row in rows if row["labels"] == {key: str(value) for key, value in labels.items()})
+
+class StaticRetriever:
+    def get_relevant_documents(self, question):
+        return [Document(page_content="The survey reached 120 students.", metadata={"chunk_id": 0})]
+
+class FlakyLLM(FakeChatGroq):
+    """Raises `errors` in turn before streaming normally"""
+
+    def __init__(self, errors):
+        super().__init__(latency=0)
+        self.errors = list(errors)
+
+    def stream(self, prompt, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        yield from super().stream(prompt, **kwargs)
+
+class BrokenMidStreamLLM(FakeChatGroq):
+    def stream(self, prompt, **kwargs):
+        yield FakeMessage("The")
+        raise FakeServerError("Connection dropped")
+
+def test_overlapping_traces_from_two_threads_record_only_their_own_work():
+    registry = MetricsRegistry(enabled=True)
+    ingest_open, query_done = threading.Event(), threading.Event()
+
+    def ingest():
+        with registry.trace("ingest"):
+            ingest_open.set()
+            with registry.span("summarize"):
+                registry.inc("llm_requests_total", purpose="summary")
+                query_done.wait(5)
+
+    worker = threading.Thread(target=ingest)
+    worker.start()
+    ingest_open.wait(5)
+    with registry.trace("query"):
+        with registry.span("retrieve"):
+            registry.inc("llm_requests_total", purpose="answer")
+    query_done.set()
+    worker.join()
+
+    assert set(registry.last_run("query")["stages"]) == {"retrieve"}
+    assert registry.last_run("query")["counters"] == {'llm_requests_total{purpose="answer"}': 1}
+    assert set(registry.last_run("ingest")["stages"]) == {"summarize"}
+    assert registry.last_run("ingest")["counters"] == {'llm_requests_total{purpose="summary"}': 1}
+
+def test_work_handed_to_threads_counts_toward_the_callers_trace():
+    registry = MetricsRegistry(enabled=True)
+
+    def summarize(number):
+        with registry.span("summarize"):
+            registry.inc("llm_requests_total")
+
+    with registry.trace("ingest"):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(bind_traces(summarize), range(3)))
+        # Not bound: runs outside the trace
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(summarize, 3).result()
+
+    run = registry.last_run("ingest")
+    assert run["stages"]["summarize"]["calls"] == 3
+    assert run["counters"] == {"llm_requests_total": 3}
+
+def test_nested_trace_is_also_counted_in_the_outer_one():
+    registry = MetricsRegistry(enabled=True)
+    with registry.trace("ingest"):
+        with registry.trace("query"):
+            with registry.span("retrieve"):
+                pass
+        with registry.span("index"):
+            pass
+    assert set(registry.last_run("query")["stages"]) == {"retrieve"}
+    assert set(registry.last_run("ingest")["stages"]) == {"retrieve", "index"}
+
+def test_streamed_answer_is_retried_and_timed(metrics):
+    chain = SummarizedRAGChain(llm=FlakyLLM([FakeRateLimitError("Rate limit reached")]))
+    events = list(chain.stream_query("How many students were surveyed?", StaticRetriever()))
+
+    assert events[-1]["success"]
+    assert counter(metrics, "llm_requests_total", purpose="answer") == 2
+    assert counter(metrics, "llm_retries_total", purpose="answer") == 1
+    assert counter(metrics, "llm_failures_total", purpose="answer") == 0
+    latency = metrics.snapshot()["histograms"]["llm_request_seconds"]
+    assert latency == [{**latency[0], "labels": {"purpose": "answer"}, "count": 2}]
+
+def test_answer_failing_after_retries_is_counted(metrics, monkeypatch):
+    monkeypatch.setattr(Config, "LLM_MAX_RETRIES", 1)
+    chain = SummarizedRAGChain(llm=FlakyLLM([FakeServerError("Service unavailable")] * 2))
+    events = list(chain.stream_query("How many students were surveyed?", StaticRetriever()))
+
+    assert not events[-1]["success"]
+    assert counter(metrics, "llm_requests_total", purpose="answer") == 2
+    assert counter(metrics, "llm_retries_total", purpose="answer") == 1
+    assert counter(metrics, "llm_failures_total", purpose="answer") == 1
+
+def test_answer_broken_mid_stream_is_a_failure_not_a_retry(metrics):
+    chain = SummarizedRAGChain(llm=BrokenMidStreamLLM(latency=0))
+    events = list(chain.stream_query("How many students were surveyed?", StaticRetriever()))
+
+    assert events[0] == {"type": "token", "content": "The"}
+    assert not events[-1]["success"]
+    assert counter(metrics, "llm_requests_total", purpose="answer") == 1
+    assert counter(metrics, "llm_retries_total", purpose="answer") == 0
+    assert counter(metrics, "llm_failures_total", purpose="answer") == 1
@@ -0,0 +1,43 @@
+import threading
+import time
+from langchain.schema import Document
+import src.reranker
+from src.reranker import CrossEncoderReranker
+
+class SlowCrossEncoder:
+    """Scores by word overlap, taking `delay` seconds per batch"""
+
+    delay = 0.0
+
+    def __init__(self, model_name, **kwargs):
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def predict(self, pairs, **kwargs):
+        time.sleep(self.delay)
+        with self._lock:
+            self.batches += 1
+        return [len(set(q.lower().split()) & set(d.lower().split())) for q, d in pairs]
+
+def make_reranker(monkeypatch, delay: float, budget_ms: float) -> CrossEncoderReranker:
+    monkeypatch.setattr(SlowCrossEncoder, "delay", delay)
+    monkeypatch.setattr(src.reranker, "CrossEncoder", SlowCrossEncoder)
+    return CrossEncoderReranker(model_name="fake", batch_size=1, max_workers=1, latency_budget_ms=budget_ms)
+
+DOCUMENTS = [Document(page_content=text) for text in
+             ("nothing relevant", "dense retrieval", "dense retrieval with summaries", "other", "more", "words")]
+
+def test_reranks_by_score_within_budget(monkeypatch):
+    reranker = make_reranker(monkeypatch, delay=0.0, budget_ms=5000)
+
+    assert reranker.rerank("dense retrieval with summaries", DOCUMENTS)[:2] == [2, 1]
+
+def test_timeout_cancels_queued_batches(monkeypatch):
+    reranker = make_reranker(monkeypatch, delay=0.1, budget_ms=50)
+
+    assert reranker.rerank("dense retrieval", DOCUMENTS) is None
+    time.sleep(0.3)
+
+    # Only the batch already running when the budget ran out was scored
+    assert reranker.model.batches == 1
+    assert reranker.get_stats()["fallbacks"] == 1
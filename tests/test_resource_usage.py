@@ -0,0 +1,13 @@
+import time
+import numpy as np
+from src.resource_usage import RSSSampler
+
+def test_sampler_sees_memory_freed_before_the_block_ends():
+    with RSSSampler(interval=0.01) as sampler:
+        block = np.ones(64 * 2 ** 20, dtype=np.uint8)
+        time.sleep(0.1)
+        del block
+
+    stats = sampler.to_stats()
+    assert stats["rss_peak_mb"] >= stats["rss_before_mb"] + 48
+    assert stats["rss_peak_mb"] >= stats["rss_after_mb"] + 48
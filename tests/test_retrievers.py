@@ -0,0 +1,68 @@
+from langchain.schema import Document
+from src.fakes import FakeChatGroq
+from src.lexical_index import BM25Index
+from src.rag_chain import NOT_FOUND_ANSWER, SummarizedRAGChain
+from src.vector_store import MultiVectorStore
+from conftest import make_document
+
+CHUNKS = [
+    "Transformers use attention over token sequences to model long range context.",
+    "The survey sampled two hundred students across four faculties in 2021.",
+    "Gradient descent minimizes the training loss with a decaying learning rate.",
+    "Results on CIFAR-10 reach 94.1 percent accuracy with the ResNet-50 baseline.",
+]
+# Summaries word their chunks differently, as an LLM would
+SUMMARIES = [
+    "Describes attention based sequence models.",
+    "Explains how participants were selected for the questionnaire.",
+    "Covers the optimisation procedure.",
+    "Reports image classification accuracy of the baseline network.",
+]
+
+def make_retriever(**overrides):
+    summaries, originals = make_document(CHUNKS)
+    for summary, text in zip(summaries, SUMMARIES):
+        summary.page_content = text
+    store = MultiVectorStore()
+    retriever = store.create_multi_vector_retriever(summaries, originals)
+    for name, value in overrides.items():
+        setattr(retriever, name, value)
+    return retriever
+
+def answer(question: str, retriever):
+    llm = FakeChatGroq(latency=0)
+    events = list(SummarizedRAGChain(llm=llm).stream_query(question, retriever))
+    return events[-1], llm
+
+def test_off_topic_question_is_not_found_without_calling_the_llm(embeddings):
+    done, llm = answer("What is the boiling point of mercury at sea level?", make_retriever())
+
+    assert done["answer"] == NOT_FOUND_ANSWER
+    assert llm.calls == 0
+
+def test_stopwords_alone_make_no_lexical_hit(embeddings):
+    retriever = make_retriever()
+
+    assert retriever.lexical_index.search("what is the of with", 10) == []
+    assert retriever.get_relevant_documents("What is the weather like on the moon?") == []
+
+def test_exact_term_only_in_the_chunk_is_found(embeddings):
+    documents = make_retriever().get_relevant_documents("CIFAR-10")
+
+    assert documents[0].page_content == CHUNKS[3]
+
+def test_weak_lexical_match_keeps_the_dense_similarity(embeddings):
+    # One of three key terms matches the chunk; its summary's similarity decides
+    retriever = make_retriever(score_threshold=0.99)
+    assert retriever.get_relevant_documents("attention mercury boiling") == []
+
+    retriever = make_retriever(score_threshold=0.2)
+    assert retriever.get_relevant_documents("attention mercury boiling")[0].page_content == CHUNKS[0]
+
+def test_best_possible_score_bounds_every_score():
+    index = BM25Index()
+    index.add_documents([Document(page_content=text, metadata={"chunk_id": i}) for i, text in enumerate(CHUNKS)])
+
+    for query in ("ResNet-50 accuracy", "students survey 2021", "attention mercury"):
+        bound = index.best_possible_score(query)
+        assert all(0 < score < bound for _, score in index.search(query, 10))
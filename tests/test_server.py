@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from config import Config
+import server
+from server import ConcurrencyLimiter, QueryRequest, _Flight
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def make_request(body_chunks, headers=()):
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in body_chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+    scope = {"type": "http", "method": "POST", "path": "/documents", "query_string": b"",
+             "headers": [(key.encode(), value.encode()) for key, value in headers]}
+    return Request(scope, receive)
+
+def test_limiter_rejects_beyond_queue_and_after_timeout():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_waiting=1, timeout=0.05)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+
+        with pytest.raises(HTTPException) as full:
+            await limiter.acquire()
+        assert full.value.status_code == 503 and full.value.headers["Retry-After"] == "1"
+        with pytest.raises(HTTPException) as timed_out:
+            await waiter
+        assert timed_out.value.status_code == 503
+
+        limiter.release()
+        await limiter.acquire()
+        return limiter.get_stats()
+    assert run(scenario()) == {"limit": 1, "active": 1, "waiting": 0, "rejected": 2}
+
+@pytest.mark.parametrize("spec_version", ["2.0", "2.4"])
+def test_stream_releases_slot_when_client_leaves_before_first_event(monkeypatch, spec_version):
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_waiting=0, timeout=1)
+        monkeypatch.setattr(server, "query_limiter", limiter)
+        # An answer that never produces an event
+        monkeypatch.setattr(server, "_join_flight", lambda request: (_Flight(), False))
+        response = await server.query_stream(QueryRequest(question="What was measured?"))
+        assert limiter.active == 1
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            raise OSError("client went away")
+        scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+        with pytest.raises(Exception):
+            await asyncio.wait_for(response(scope, receive, send), 5)
+        return limiter
+    limiter = run(scenario())
+    assert limiter.active == 0
+    assert not limiter._semaphore.locked()
+
+def test_upload_over_content_length_limit_is_rejected_without_a_slot(monkeypatch):
+    monkeypatch.setattr(Config, "SERVER_MAX_UPLOAD_MB", 1)
+    limiter = ConcurrencyLimiter(limit=1, max_waiting=0, timeout=1)
+    monkeypatch.setattr(server, "ingest_limiter", limiter)
+    request = make_request([], headers=[("content-length", str(2 * 2 ** 20))])
+
+    with pytest.raises(HTTPException) as rejected:
+        run(server.ingest_document(request))
+    assert rejected.value.status_code == 413
+    assert limiter.active == 0 and limiter.rejected == 0
+
+def test_streamed_upload_is_cut_off_at_the_limit(monkeypatch):
+    monkeypatch.setattr(Config, "SERVER_MAX_UPLOAD_MB", 1)
+    limiter = ConcurrencyLimiter(limit=1, max_waiting=0, timeout=1)
+    monkeypatch.setattr(server, "ingest_limiter", limiter)
+    request = make_request([b"%PDF" + b"x" * 2 ** 19] * 3)
+
+    with pytest.raises(HTTPException) as rejected:
+        run(server.ingest_document(request))
+    assert rejected.value.status_code == 413
+    assert limiter.active == 0 and not limiter._semaphore.locked()
+
+def test_query_for_a_path_instead_of_a_document_hash_is_not_found(monkeypatch):
+    def fail(doc_id):
+        raise AssertionError(f"looked up {doc_id}")
+    monkeypatch.setattr(server.open_documents, "get", fail)
+
+    with pytest.raises(HTTPException) as rejected:
+        server._scope(QueryRequest(question="What?", doc_id="../../some/dir"))
+    assert rejected.value.status_code == 404
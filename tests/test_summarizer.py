@@ -0,0 +1,35 @@
+from langchain.schema import Document
+from config import Config
+from src.fakes import FakeChatGroq
+from src.summarizer import Summarizer
+
+class RecordingRateLimiter:
+    def __init__(self):
+        self.reserved = []
+
+    def acquire(self, token_count: int):
+        self.reserved.append(token_count)
+
+def make_chunks(count: int):
+    return [Document(page_content=f"Chunk {i} discusses topic {i} in some detail.", metadata={"chunk_id": i})
+            for i in range(count)]
+
+def test_batch_prompt_reserves_one_summary_per_chunk():
+    limiter = RecordingRateLimiter()
+    summarizer = Summarizer(llm=FakeChatGroq(latency=0), rate_limiter=limiter, use_cache=False)
+    batch = list(enumerate(make_chunks(4)))
+
+    summaries = summarizer._summarize_batch(batch)
+
+    assert len(summaries) == 4
+    assert len(limiter.reserved) == 1
+    prompt_tokens = summarizer.usage["prompt_tokens"]
+    assert limiter.reserved[0] == prompt_tokens + 4 * Config.SUMMARY_LENGTH
+
+def test_single_chunk_prompt_reserves_one_summary():
+    limiter = RecordingRateLimiter()
+    summarizer = Summarizer(llm=FakeChatGroq(latency=0), rate_limiter=limiter, use_cache=False)
+
+    summarizer._summarize_chunk(0, make_chunks(1)[0])
+
+    assert limiter.reserved == [summarizer.usage["prompt_tokens"] + Config.SUMMARY_LENGTH]
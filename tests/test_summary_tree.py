@@ -0,0 +1,31 @@
+from langchain.schema import Document
+from src.fakes import FakeChatGroq
+from src.summarizer import Summarizer
+from src.summary_tree import SummaryTreeBuilder
+from conftest import HashEmbeddings
+
+class UnlimitedRateLimiter:
+    def acquire(self, token_count: int):
+        pass
+
+def make_leaves(count: int):
+    return [Document(page_content=f"Summary of chunk {i} about subject {i % 5}.",
+                     metadata={"original_chunk_id": i, "is_summary": True})
+            for i in range(count)]
+
+def make_builder(max_levels: int) -> SummaryTreeBuilder:
+    summarizer = Summarizer(llm=FakeChatGroq(latency=0), rate_limiter=UnlimitedRateLimiter(), use_cache=False)
+    return SummaryTreeBuilder(summarizer, HashEmbeddings(), cluster_size=4, max_levels=max_levels)
+
+def test_tree_ends_with_a_root_covering_every_chunk():
+    nodes = make_builder(max_levels=4).build(make_leaves(40))
+
+    top = [node for node in nodes if node.metadata["tree_level"] == nodes[-1].metadata["tree_level"]]
+    assert len(top) == 1
+    assert top[0].metadata["chunk_ids"] == ",".join(str(i) for i in range(40))
+
+def test_level_limit_leaves_several_top_nodes():
+    nodes = make_builder(max_levels=1).build(make_leaves(40))
+
+    assert {node.metadata["tree_level"] for node in nodes} == {1}
+    assert len(nodes) > 1
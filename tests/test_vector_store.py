@@ -0,0 +1,72 @@
+import hashlib
+import os
+import pytest
+from langchain.schema import Document
+from config import Config
+from src.vector_store import MultiVectorStore
+from conftest import make_document
+
+DOC_HASH = hashlib.sha256(b"report").hexdigest()
+
+TEXTS = ["Transformers use attention over token sequences.",
+         "The survey sampled two hundred students in 2021.",
+         "Gradient descent minimizes the training loss."]
+
+def build_and_save(doc_hash: str = DOC_HASH) -> MultiVectorStore:
+    store = MultiVectorStore()
+    store.create_multi_vector_retriever(*make_document(TEXTS))
+    store.save_document_index(doc_hash)
+    return store
+
+def test_saved_index_reloads(embeddings):
+    build_and_save()
+
+    retriever = MultiVectorStore().load_document_index(DOC_HASH)
+
+    assert retriever is not None
+    assert retriever.get_relevant_documents("attention over token sequences")[0].page_content == TEXTS[0]
+
+def test_index_built_with_other_settings_is_rebuilt(embeddings, monkeypatch):
+    build_and_save()
+
+    monkeypatch.setattr(Config, "CHUNK_SIZE", Config.CHUNK_SIZE * 2)
+    assert MultiVectorStore().load_document_index(DOC_HASH) is None
+    monkeypatch.setattr(Config, "CHUNK_SIZE", Config.CHUNK_SIZE // 2)
+    monkeypatch.setattr(Config, "SUMMARY_TREE_ENABLED", not Config.SUMMARY_TREE_ENABLED)
+    assert MultiVectorStore().load_document_index(DOC_HASH) is None
+
+def test_resaving_never_leaves_the_index_missing(embeddings):
+    store = build_and_save()
+    path = os.path.join(Config.FAISS_INDEX_DIR, DOC_HASH)
+
+    store.save_document_index(DOC_HASH)
+
+    assert os.path.islink(path)
+    assert MultiVectorStore().has_document_index(DOC_HASH)
+
+def test_chroma_collection_name_is_stable_and_valid():
+    name = MultiVectorStore.chroma_collection_name("Jane Doe/Final report (v2).pdf")
+
+    assert name == MultiVectorStore.chroma_collection_name("Jane Doe/Final report (v2).pdf")
+    assert name != MultiVectorStore.chroma_collection_name("Jane Doe/Final report (v3).pdf")
+    assert 3 <= len(name) <= 63 and name[0].isalnum() and name[-1].isalnum()
+
+def test_revised_document_syncs_into_its_collection(embeddings):
+    store = MultiVectorStore()
+    name = store.chroma_collection_name("report.pdf")
+    _, originals = make_document(TEXTS)
+    assert store.add_to_chroma(originals, name) == {"added": 3, "updated": 0, "deleted": 0}
+
+    # The revision drops the second chunk, inserts a new one and moves the third
+    revised = [Document(page_content=text, metadata={"chunk_id": i})
+               for i, text in enumerate([TEXTS[0], "A new results section.", "Appendix.", TEXTS[2]])]
+
+    assert store.add_to_chroma(revised, name) == {"added": 2, "updated": 2, "deleted": 1}
+    stored = store.get_chroma_collection(name).get(include=["metadatas", "documents"])
+    chunk_ids = {text: metadata["chunk_id"] for text, metadata in zip(stored["documents"], stored["metadatas"])}
+    assert chunk_ids == {TEXTS[0]: 0, "A new results section.": 1, "Appendix.": 2, TEXTS[2]: 3}
+
+def test_index_paths_only_accept_document_hashes():
+    for doc_id in ("../../etc", "abc", DOC_HASH.upper(), DOC_HASH + "/.."):
+        with pytest.raises(ValueError):
+            MultiVectorStore().load_document_index(doc_id)
@@ -0,0 +1,33 @@
+import os
+from src.versioned_dir import current_version, publish_version
+
+def write_version(tmp_path, name: str, content: str) -> str:
+    directory = tmp_path / name
+    directory.mkdir()
+    (directory / "data.txt").write_text(content)
+    return str(directory)
+
+def test_nothing_published(tmp_path):
+    assert current_version(str(tmp_path / "index")) is None
+
+def test_publish_swaps_the_link_and_keeps_one_previous_version(tmp_path):
+    path = str(tmp_path / "index")
+    versions = []
+    for i in range(3):
+        versions.append(publish_version(write_version(tmp_path, f"tmp{i}", str(i)), path))
+        assert open(os.path.join(path, "data.txt")).read() == str(i)
+
+    assert os.path.islink(path)
+    assert current_version(path) == os.path.realpath(versions[-1])
+    assert not os.path.exists(versions[0])
+    # A reader that resolved the previous version before the swap can still finish
+    assert open(os.path.join(versions[1], "data.txt")).read() == "1"
+
+def test_plain_directory_is_replaced(tmp_path):
+    path = str(tmp_path / "index")
+    write_version(tmp_path, "index", "old")
+
+    publish_version(write_version(tmp_path, "tmp", "new"), path)
+
+    assert os.path.islink(path)
+    assert open(os.path.join(path, "data.txt")).read() == "new"